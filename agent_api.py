@@ -0,0 +1,163 @@
+"""Headless puzzle API for agents.
+
+An agent needs two calls per puzzle instead of driving the web UI:
+
+1. get a puzzle together with its images, either embedded (base64) or
+   referenced by content digest (fetch them from /api/asset/<digest>)
+2. submit the answer; the server checks it and records the result
+
+Over HTTP these are /api/agent/puzzle and /api/agent/submit. CaptchaEnv
+offers the same loop in-process, without a server:
+
+    env = CaptchaEnv('captcha_data', seed=42, model='my-agent')
+    puzzle = env.next_puzzle()          # images as bytes in puzzle['assets']
+    result = env.submit(answer=7)       # {'correct': ..., 'correct_answer': ...}
+"""
+import base64
+import hashlib
+from datetime import datetime
+
+from assets import AssetStore, asset_url
+from captcha_store import GroundTruthStore, CaptchaCatalog, build_puzzle_payload, puzzle_assets, parse_rotation_frame
+from checkers import score_answer
+from rotation import RotationRenderer
+from sampling import SamplingState
+
+
+def rendered_frame(catalog, renderer, relpath):
+    """(digest, PNG bytes) of a Rotation_Match frame rendered from its object image, None if it has none"""
+    frame = parse_rotation_frame(relpath)
+    object_image = frame and catalog.rotation_objects.get(frame[0])
+    if renderer is None or not object_image:
+        return None
+    try:
+        _, data = renderer.render('Rotation_Match', object_image, frame[1])
+    except OSError:
+        return None
+    return hashlib.sha256(data).hexdigest(), data
+
+
+def agent_puzzle_payload(catalog, asset_store, puzzle_type, puzzle_id, embed=None, renderer=None):
+    """get_puzzle's payload plus an `assets` map describing every image it references.
+
+    `assets` maps each image URL of the payload to its digest, content type and
+    either its data (embed='base64' or 'bytes') or the content-addressed URL to
+    fetch it from (embed=None). Rotation_Match frames that aren't on disk are
+    rendered by `renderer` (a RotationRenderer); without embedding, their URL
+    is the /captcha_data one that renders them. Returns (payload, status).
+    """
+    entry = catalog.ground_truth[puzzle_type][puzzle_id]
+    payload, status = build_puzzle_payload(puzzle_type, puzzle_id, entry)
+    if status != 200:
+        return payload, status
+
+    assets = {}
+    for relpath in puzzle_assets(puzzle_type, puzzle_id, entry):
+        if relpath is None:
+            continue
+        digest = asset_store.digest(puzzle_type, relpath)
+        rendered = None
+        if digest is None and puzzle_type == 'Rotation_Match':
+            rendered = rendered_frame(catalog, renderer, relpath)
+            if rendered is not None:
+                digest = rendered[0]
+        if digest is None:
+            return {'error': f'Missing asset: {puzzle_type}/{relpath}'}, 500
+        asset = {'sha256': digest, 'content_type': asset_store.content_type(relpath)}
+        if embed in ('bytes', 'base64'):
+            data = rendered[1] if rendered is not None else asset_store.read(puzzle_type, relpath)
+            asset['data'] = data if embed == 'bytes' else base64.b64encode(data).decode('ascii')
+        elif rendered is not None:
+            asset['url'] = asset_url(puzzle_type, relpath)
+        else:
+            asset['url'] = f'/api/asset/{digest}'
+        assets[asset_url(puzzle_type, relpath)] = asset
+    payload['assets'] = assets
+    return payload, 200
+
+
+def check_and_record(checker, data, record):
+    """Check one answer and, if it could be checked, pass the result to `record`.
+
+    Returns (payload, status) like /api/check_answer.
+    """
+    payload, status = score_answer(checker, data)
+    if status == 200:
+        result = {
+            'puzzle_type': data.get('puzzle_type'),
+            'puzzle_id': data.get('puzzle_id'),
+            'user_answer': payload['user_answer'],
+            'correct_answer': payload['correct_answer'],
+            'correct': payload['correct'],
+            'timestamp': data.get('timestamp') or datetime.now().isoformat()
+        }
+        for key in ('elapsed_time', 'model', 'session'):
+            if data.get(key) is not None:
+                result[key] = data[key]
+        record(result)
+    return payload, status
+
+
+class CaptchaEnv:
+    """In-process puzzle loop over a data directory, for high-throughput evaluation.
+
+    Puzzles are sampled like get_puzzle?random=true does for a session with
+    the same seed, over the types that have puzzles. Results go to `record` (e.g. a BatchWriter's submit) if given,
+    and are always kept in `results`.
+    """
+
+    def __init__(self, data_dir='captcha_data', seed=None, types=None, model=None, record=None,
+                 max_recent=5):
+        self.catalog = CaptchaCatalog.build(GroundTruthStore(data_dir))
+        self.assets = AssetStore(data_dir)
+        # Renders the Rotation_Match frames the data directory doesn't have
+        self.renderer = RotationRenderer(self.assets)
+        self.types = [t for t in (types or self.catalog.types) if self.catalog.puzzle_ids.get(t)]
+        if not self.types:
+            raise ValueError(f'No puzzles found in {data_dir}')
+        self.model = model
+        self.record = record
+        self.max_recent = max_recent
+        self.state = SamplingState(seed)
+        self.results = []
+        self.current = None
+
+    def next_puzzle(self, puzzle_type=None):
+        """Sample the next puzzle (of a random type unless one is given), images embedded as bytes"""
+        if puzzle_type is None:
+            puzzle_type = self.state.next_random_type(self.types, self.max_recent)
+        puzzle_id = self.state.next_puzzle(puzzle_type, self.catalog.sampler)
+        if puzzle_id is None:
+            raise ValueError(f'No puzzles found for type: {puzzle_type}')
+
+        payload, status = agent_puzzle_payload(self.catalog, self.assets, puzzle_type, puzzle_id,
+                                               embed='bytes', renderer=self.renderer)
+        if status != 200:
+            raise ValueError(payload['error'])
+        self.current = payload
+        return payload
+
+    def submit(self, answer, elapsed_time=None, puzzle=None):
+        """Check an answer to the current (or the given) puzzle and record the result"""
+        puzzle = puzzle or self.current
+        if puzzle is None:
+            raise ValueError('No puzzle to answer, call next_puzzle() first')
+        data = {
+            'puzzle_type': puzzle['puzzle_type'],
+            'puzzle_id': puzzle['puzzle_id'],
+            'answer': answer,
+            'elapsed_time': elapsed_time,
+            'model': self.model
+        }
+        if elapsed_time is None:
+            del data['elapsed_time']
+
+        def record(result):
+            self.results.append(result)
+            if self.record is not None:
+                self.record(result)
+
+        payload, status = check_and_record(self.catalog.checkers.get(puzzle['puzzle_type']), data, record)
+        if status != 200:
+            raise ValueError(payload['error'])
+        return payload
@@ -1,14 +1,44 @@
 import os
-import json
-import random
-from flask import Flask, render_template, request, jsonify, send_from_directory
+import sys
+import time
+import hmac
+import signal
+import hashlib
+from datetime import datetime
+
+
+def run_production_server():
+    """Replace this process with gunicorn configured by gunicorn.conf.py, if gunicorn is installed"""
+    try:
+        import gunicorn  # noqa: F401
+    except ImportError:
+        return
+    app_dir = os.path.dirname(os.path.abspath(__file__))
+    os.execvp(sys.executable, [sys.executable, '-m', 'gunicorn',
+                               '-c', os.path.join(app_dir, 'gunicorn.conf.py'),
+                               '--pythonpath', app_dir, 'app:app'])
+
+# For production (e.g. on Hugging Face Spaces), `python app.py` runs several gunicorn workers, see
+# gunicorn.conf.py. gunicorn imports this module itself, so exec it before the setup below runs twice.
+if __name__ == '__main__' and not os.environ.get('DEVELOPMENT'):
+    run_production_server()
+
+from flask import Flask, Response, render_template, request, jsonify, abort, g
+from captcha_store import GroundTruthStore, CaptchaCatalog, ASSET_VERSION_LENGTH, parse_rotation_frame
+from checkers import find_checker, score_answer
+from sampling import create_session_store, build_episode, make_manifest, EpisodeStore
+from results_store import BatchWriter, SQLiteResultsSink, create_sinks
+from leaderboard import Leaderboard
+from assets import AssetStore, AssetCache, asset_url, pack_bundle, multipart_bundle
+from agent_api import agent_puzzle_payload, check_and_record
+from image_variants import VariantStore, SOURCE_CONTENT_TYPES
+from rotation import RotationRenderer
+from dataset_source import open_source
+from metrics import REGISTRY
+from profiling import Profiler, install_signal_handler
 
 app = Flask(__name__, static_folder='static', template_folder='templates')
 
-# Dictionary to track which puzzles have been shown for each CAPTCHA type
-seen_puzzles = {}
-# List to track recently used CAPTCHA types to avoid repetition
-recent_types = []
 # How many types to remember before allowing repetition
 MAX_RECENT_TYPES = 5
 
@@ -34,465 +64,546 @@ PUZZLE_TYPE_SEQUENCE = [
     'Misleading_Click',
     'Pick_Area'
 ]
-sequential_index = 0
+
+# Directory holding one subdirectory per CAPTCHA type, or a pack of it built by pack_dataset.py
+DATA_DIR = os.environ.get('CAPTCHA_DATA_DIR', 'captcha_data')
+# Opened once and shared by the stores below; a pack is memory-mapped
+dataset = open_source(DATA_DIR)
+# Seconds between automatic catalog refreshes (0 disables them, use /api/reload_catalog or SIGHUP instead)
+CATALOG_REFRESH_INTERVAL = float(os.environ.get('CATALOG_REFRESH_INTERVAL', 0))
+
+# Bytes of recently served images are kept in memory, up to this many bytes (0 disables the cache)
+ASSET_CACHE_MAX_BYTES = int(os.environ.get('ASSET_CACHE_MAX_BYTES', 128 * 1024 * 1024))
+# Comma-separated types whose images are loaded into the cache at startup ('*' for all)
+ASSET_CACHE_WARM_TYPES = os.environ.get('ASSET_CACHE_WARM_TYPES', '')
+
+# Content digests (and cached bytes) of the images in DATA_DIR
+asset_store = AssetStore(dataset, AssetCache(ASSET_CACHE_MAX_BYTES) if ASSET_CACHE_MAX_BYTES else None)
+
+# Maximum widths (?w=) images may be downscaled to; each is rendered at most once per image
+IMAGE_VARIANT_WIDTHS = [int(width) for width in os.environ.get('IMAGE_VARIANT_WIDTHS', '256,512').split(',')
+                        if width.strip()]
+# Re-encoded/downscaled images, cached on disk in IMAGE_VARIANT_DIR (see image_variants.py)
+variant_store = VariantStore(asset_store, os.environ.get('IMAGE_VARIANT_DIR', 'image_variants'),
+                             IMAGE_VARIANT_WIDTHS)
+# Opt-in: serve lossless WebP instead of PNG/JPEG to clients that accept it, when it is smaller
+# and was built ahead of time (python image_variants.py); the original is served until then
+IMAGE_VARIANT_NEGOTIATION = os.environ.get('IMAGE_VARIANT_NEGOTIATION', '0') == '1'
+
+# Rotation_Match objects rendered at any angle, for datasets without (all) pre-rotated frames
+rotation_renderer = RotationRenderer(asset_store, int(os.environ.get('ROTATION_CACHE_MAX_BYTES', 32 * 1024 * 1024)))
+
+# Parsed ground truth files, shared by every request in this process
+ground_truth_store = GroundTruthStore(dataset)
+
+# Request, result and cache metrics served by /metrics (see metrics.py)
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') == '1'
+REQUESTS = REGISTRY.counter('captcha_http_requests_total', 'HTTP requests handled',
+                            ('route', 'method', 'status', 'puzzle_type'))
+REQUEST_DURATION = REGISTRY.histogram('captcha_http_request_duration_seconds', 'Time spent handling a request',
+                                      ('route', 'method', 'puzzle_type'))
+RESPONSE_BYTES = REGISTRY.counter('captcha_http_response_bytes_total',
+                                  'Response body bytes sent (images: the /captcha_data and /api/asset routes)',
+                                  ('route', 'puzzle_type'))
+BENCHMARK_RESULTS = REGISTRY.counter('captcha_benchmark_results_total', 'Benchmark results recorded',
+                                     ('puzzle_type', 'correct'))
+CATALOG_BUILD_DURATION = REGISTRY.histogram('captcha_catalog_build_duration_seconds',
+                                            'Time to scan the dataset and build the puzzle catalog',
+                                            buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0))
+
+def cache_stats():
+    stats = {'rotation': rotation_renderer.cache.stats()}
+    if asset_store.cache is not None:
+        stats['asset'] = asset_store.cache.stats()
+    return stats
+
+for _counter in ('hits', 'misses', 'evictions'):
+    REGISTRY.collected_counter(f'captcha_cache_{_counter}_total', f'Cache {_counter} by cache', ('cache',),
+                               lambda counter=_counter: {(name,): stats[counter]
+                                                         for name, stats in cache_stats().items()})
+REGISTRY.gauge('captcha_cache_bytes', 'Bytes held by each cache', ('cache',),
+               lambda: {(name,): stats['bytes'] for name, stats in cache_stats().items()})
+REGISTRY.gauge('captcha_cache_entries', 'Entries held by each cache', ('cache',),
+               lambda: {(name,): stats['entries'] for name, stats in cache_stats().items()})
+REGISTRY.collected_counter('captcha_ground_truth_lookups_total',
+                           'Ground truth lookups: served from memory (hit), parsed (miss) or re-parsed (reload)',
+                           ('result',),
+                           lambda: {('hit',): ground_truth_store.hits, ('miss',): ground_truth_store.misses,
+                                    ('reload',): ground_truth_store.reloads})
+
+def build_catalog():
+    started = time.perf_counter()
+    built = CaptchaCatalog.build(ground_truth_store, asset_store)
+    CATALOG_BUILD_DURATION.observe(time.perf_counter() - started)
+    return built
+
+# Index of types, puzzle IDs and ground truth, built once at startup
+catalog = build_catalog()
+catalog_built_at = time.monotonic()
+
+def warm_asset_cache(current_catalog):
+    """Load the images of the ASSET_CACHE_WARM_TYPES types into the asset cache, in that order"""
+    if ASSET_CACHE_WARM_TYPES.strip() == '*':
+        warm_types = current_catalog.types
+    else:
+        warm_types = [t.strip() for t in ASSET_CACHE_WARM_TYPES.split(',') if t.strip()]
+    return asset_store.warm((puzzle_type, relpath)
+                            for puzzle_type in warm_types
+                            for puzzle_id in current_catalog.puzzle_ids.get(puzzle_type, [])
+                            for relpath in current_catalog.bundle_assets(puzzle_type, puzzle_id))
+
+warm_asset_cache(catalog)
+
+def reload_catalog():
+    """Rebuild the catalog; only ground truth files that changed on disk are re-parsed"""
+    global catalog, catalog_built_at
+    # A pack may have been replaced by a newer one, and cached images on disk
+    dataset.refresh()
+    asset_store.invalidate()
+    catalog = build_catalog()
+    catalog_built_at = time.monotonic()
+    warm_asset_cache(catalog)
+    return catalog
+
+def get_catalog():
+    if CATALOG_REFRESH_INTERVAL and time.monotonic() - catalog_built_at > CATALOG_REFRESH_INTERVAL:
+        return reload_catalog()
+    return catalog
 
 # Load ground truth data for a specific type
 def load_ground_truth(captcha_type):
-    path = os.path.join('captcha_data', captcha_type, 'ground_truth.json')
-    try:
-        with open(path, 'r') as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        return {}
+    return get_catalog().ground_truth.get(captcha_type, {})
 
 # Get available CAPTCHA types
 def get_captcha_types():
-    base_dir = 'captcha_data'
-    if not os.path.exists(base_dir):
-        return []
-    return [d for d in os.listdir(base_dir) 
-            if os.path.isdir(os.path.join(base_dir, d))]
+    return get_catalog().types
+
+# Per-session sampling state (seen puzzles, recent types, sequence position).
+# Use SESSION_BACKEND=sqlite to share sessions between several worker processes.
+session_store = create_session_store(
+    backend=os.environ.get('SESSION_BACKEND', 'memory'),
+    path=os.environ.get('SESSION_DB_PATH', 'sessions.db'),
+    max_sessions=int(os.environ.get('MAX_SESSIONS', 10000)),
+    ttl=float(os.environ.get('SESSION_TTL', 3600))
+)
+
+# Episode manifests (fixed puzzle sequences), shared by workers through EPISODE_DIR
+episode_store = EpisodeStore(os.environ.get('EPISODE_DIR', 'episodes'))
+# Longest episode /api/episode will generate or accept as an upload
+MAX_EPISODE_LENGTH = 100000
+
+def get_session_token():
+    """Identify the agent: an explicit session token if given, else the client address"""
+    token = (request.args.get('session')
+             or request.headers.get('X-Session-Token')
+             or request.cookies.get('captcha_session'))
+    if token:
+        return token[:128]
+    return f'addr:{request.remote_addr}'
+
+# Admin endpoints (/api/admin/*) require this value in the X-Admin-Token header; unset disables them
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN', '')
+# Profile captures (see profiling.py) are written to PROFILE_DIR
+profiler = Profiler(os.environ.get('PROFILE_DIR', 'profiles'))
+# Length of the capture started by `kill -USR2 <worker pid>`
+PROFILE_SIGNAL_SECONDS = float(os.environ.get('PROFILE_SIGNAL_SECONDS', 30))
+# Longest capture /api/admin/profile will start
+MAX_PROFILE_SECONDS = 3600
+
+def is_admin():
+    token = request.headers.get('X-Admin-Token', '')
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(token.encode('utf-8'), ADMIN_TOKEN.encode('utf-8'))
+
+def install_profile_signal():
+    """Profile this process for PROFILE_SIGNAL_SECONDS whenever it receives SIGUSR2"""
+    if hasattr(signal, 'SIGUSR2'):
+        install_signal_handler(profiler, signal.SIGUSR2, PROFILE_SIGNAL_SECONDS)
+
+def metric_puzzle_type(puzzle_type):
+    """Label value for a puzzle type; unknown types would let clients create unbounded label values"""
+    return puzzle_type if isinstance(puzzle_type, str) and puzzle_type in catalog.type_set else ''
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.before_request
+def start_request_profile():
+    # `X-Profile: 1` (with the admin token) profiles just this request
+    single = request.headers.get('X-Profile') == '1' and is_admin()
+    token = profiler.begin_request(single)
+    if token is not None:
+        g.profile = token
+
+@app.after_request
+def finish_request_profile(response):
+    token = g.pop('profile', None)
+    if token is not None:
+        paths = profiler.end_request(token)
+        if paths:
+            response.headers['X-Profile-Output'] = ', '.join(paths)
+    return response
+
+@app.teardown_request
+def discard_request_profile(exc):
+    # Requests that failed with an unhandled exception skip after_request
+    token = g.pop('profile', None)
+    if token is not None:
+        profiler.end_request(token)
+
+@app.after_request
+def record_request_metrics(response):
+    if not METRICS_ENABLED or 'request_started' not in g:
+        return response
+    elapsed = time.perf_counter() - g.request_started
+    route = request.url_rule.rule if request.url_rule is not None else '<unmatched>'
+    # The type a request is about: chosen by the view, in the URL, the query or the JSON body
+    puzzle_type = (g.get('puzzle_type') or (request.view_args or {}).get('captcha_type')
+                   or request.args.get('puzzle_type') or request.args.get('type'))
+    if puzzle_type is None and request.is_json:
+        data = request.get_json(silent=True)
+        if isinstance(data, dict):
+            puzzle_type = data.get('puzzle_type')
+    puzzle_type = metric_puzzle_type(puzzle_type)
+    
+    REQUESTS.inc(route, request.method, str(response.status_code), puzzle_type)
+    REQUEST_DURATION.observe(elapsed, route, request.method, puzzle_type)
+    RESPONSE_BYTES.inc(route, puzzle_type, amount=response.content_length or 0)
+    REGISTRY.start_dumping()
+    return response
 
 @app.route('/')
 def index():
     return render_template('index.html')
 
+# Cache lifetime of assets requested by content version (or digest), which never change
+IMMUTABLE_MAX_AGE = 31536000
+
+def send_asset(puzzle_type, relpath):
+    """Send an image with its content digest as a strong ETag.
+
+    When the request names the current content version (?v=...), the
+    response may be cached forever.
+    """
+    try:
+        # Served from the asset cache when possible, without touching the disk
+        digest, data = asset_store.load(puzzle_type, relpath)
+    except OSError:
+        if puzzle_type == 'Rotation_Match':
+            # `<object_base>_<angle>.png` frames that aren't on disk are rendered
+            response = send_rotation_frame(relpath)
+            if response is not None:
+                return response
+        abort(404)
+    
+    version = request.args.get('v')
+    immutable = version is not None and version == digest[:ASSET_VERSION_LENGTH]
+    content_type = asset_store.content_type(relpath)
+    if content_type not in SOURCE_CONTENT_TYPES:
+        return make_asset_response(data, content_type, digest, immutable)
+    
+    # An explicit ?format= and/or ?w= (maximum width) picks a variant, else the Accept header may
+    variant = request.args.get('format')
+    width = request.args.get('w')
+    negotiated = variant is None and width is None
+    if negotiated:
+        accepted = [value for value, quality in request.accept_mimetypes if quality > 0]
+        if IMAGE_VARIANT_NEGOTIATION and 'image/webp' in accepted:
+            variant = 'webp-lossless'
+    elif variant is None or variant == 'original':
+        variant = 'png'
+    if variant is None or (variant == 'png' and width is None):
+        response = make_asset_response(data, content_type, digest, immutable)
+    else:
+        try:
+            # Only explicitly requested variants are rendered on the request thread
+            etag, variant_data, variant_type = variant_store.get(puzzle_type, relpath, variant, width,
+                                                                 render=not negotiated)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        # Until the variant is built, and when re-encoding doesn't pay off, the original is served
+        if negotiated and (variant_data is None or len(variant_data) >= len(data)):
+            response = make_asset_response(data, content_type, digest, immutable)
+        else:
+            response = make_asset_response(variant_data, variant_type, etag, immutable)
+    if negotiated:
+        response.vary.add('Accept')
+    return response
+
+def send_rotation_frame(relpath):
+    frame = parse_rotation_frame(relpath)
+    object_image = frame and get_catalog().rotation_objects.get(frame[0])
+    if not object_image:
+        return None
+    try:
+        etag, data = rotation_renderer.render('Rotation_Match', object_image, frame[1])
+    except OSError:
+        return None
+    return make_asset_response(data, 'image/png', etag)
+
+def make_asset_response(data, content_type, etag, immutable=False):
+    response = Response(data, mimetype=content_type)
+    response.set_etag(etag)
+    if immutable:
+        response.cache_control.public = True
+        response.cache_control.max_age = IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
 @app.route('/captcha_data/<captcha_type>/<filename>')
 def serve_captcha(captcha_type, filename):
-    return send_from_directory(os.path.join('captcha_data', captcha_type), filename)
+    return send_asset(captcha_type, filename)
 
 @app.route('/captcha_data/<captcha_type>/<subdir>/<filename>')
 def serve_captcha_subdir(captcha_type, subdir, filename):
-    return send_from_directory(os.path.join('captcha_data', captcha_type, subdir), filename)
+    return send_asset(captcha_type, f'{subdir}/{filename}')
 
-@app.route('/api/get_puzzle', methods=['GET'])
-def get_puzzle():
-    global recent_types
-    
+def select_puzzle(current_catalog):
+    """Pick the puzzle a get_puzzle-style request asks for, per its query parameters.
+
+    Returns (puzzle_type, puzzle_id, episode step or None, error response or None).
+    """
     # Check if we should return a random puzzle from any type
     is_random = request.args.get('random', 'false').lower() == 'true'
     
     # Get all available CAPTCHA types
-    captcha_types = get_captcha_types()
+    captcha_types = current_catalog.types
     if not captcha_types:
-        return jsonify({'error': 'No CAPTCHA types found'}), 404
+        return None, None, None, (jsonify({'error': 'No CAPTCHA types found'}), 404)
     
     # Check if we're in debug mode for a specific type
     debug_type = request.args.get('debug_type')
 
     mode = request.args.get('mode', '').lower()
+    # Optional seed making the session's sequence of puzzles reproducible
+    seed = request.args.get('seed')
 
-    if debug_type and debug_type in captcha_types:
-        puzzle_type = debug_type
-    elif not is_random and mode == 'sequential':
-        global sequential_index
-        puzzle_type = PUZZLE_TYPE_SEQUENCE[sequential_index % len(PUZZLE_TYPE_SEQUENCE)]
-        sequential_index += 1
-    elif is_random:
-        # Select a random CAPTCHA type, avoiding recently used types if possible
-        available_types = [t for t in captcha_types if t not in recent_types]
-        
-        # If all types have been used recently, reset the tracking
-        if not available_types:
-            recent_types = []
-            available_types = captcha_types
-        
-        puzzle_type = random.choice(available_types)
-        
-        # Add to recent types and maintain maximum length
-        recent_types.append(puzzle_type)
-        if len(recent_types) > MAX_RECENT_TYPES:
-            recent_types.pop(0)
-    else:
-        # Get puzzle type from query parameter
-        puzzle_type = request.args.get('type', 'Dice_Count')
-        # Check if puzzle type exists
-        if puzzle_type not in captcha_types:
-            return jsonify({'error': f'Invalid puzzle type: {puzzle_type}'}), 400
+    # Pick the type and puzzle using (and updating) this session's sampling state
+    def select(state):
+        if seed is not None and str(state.seed) != seed:
+            state.reset(seed)
+        
+        if debug_type and debug_type in current_catalog.type_set:
+            puzzle_type = debug_type
+        elif not is_random and mode == 'sequential':
+            puzzle_type = state.next_sequential_type(PUZZLE_TYPE_SEQUENCE)
+        elif is_random:
+            # Select a random CAPTCHA type, avoiding recently used types if possible
+            puzzle_type = state.next_random_type(captcha_types, MAX_RECENT_TYPES)
+        else:
+            # Get puzzle type from query parameter
+            puzzle_type = request.args.get('type', 'Dice_Count')
+            # Check if puzzle type exists
+            if puzzle_type not in current_catalog.type_set:
+                return puzzle_type, None, ({'error': f'Invalid puzzle type: {puzzle_type}'}, 400)
+        
+        puzzle_files = current_catalog.puzzle_ids.get(puzzle_type)
+        if not puzzle_files:
+            return puzzle_type, None, ({'error': f'No puzzles found for type: {puzzle_type}'}, 404)
+        
+        # Select the next puzzle of this session's shuffled order, without repetition
+        return puzzle_type, state.next_puzzle(puzzle_type, current_catalog.sampler), None
+    
+    # Replaying an episode: the puzzle comes from its manifest instead of the sampler
+    episode_id = request.args.get('episode_id')
+    step = request.args.get('step')
+    if episode_id:
+        manifest = episode_store.get(episode_id)
+        if manifest is None:
+            return None, None, None, (jsonify({'error': f'Unknown episode: {episode_id}'}), 404)
+        if step is None:
+            step = session_store.update(get_session_token(),
+                                        lambda state: state.next_episode_step(episode_id))
+        else:
+            try:
+                step = int(step)
+            except ValueError:
+                return None, None, None, (jsonify({'error': 'Invalid step'}), 400)
+        if not 0 <= step < manifest['length']:
+            return None, None, None, (jsonify({'error': 'Episode finished', 'length': manifest['length']}), 404)
+        puzzle_type, selected_puzzle = manifest['puzzles'][step]
+        if selected_puzzle not in current_catalog.ground_truth.get(puzzle_type, {}):
+            return None, None, None, (jsonify({'error': f'Puzzle not found: {puzzle_type}/{selected_puzzle}'}), 404)
+        g.puzzle_type = puzzle_type
+        return puzzle_type, selected_puzzle, step, None
+    
+    puzzle_type, selected_puzzle, error = session_store.update(get_session_token(), select)
+    if error:
+        payload, status = error
+        return None, None, None, (jsonify(payload), status)
+    g.puzzle_type = puzzle_type
+    return puzzle_type, selected_puzzle, None, None
+
+def add_episode_headers(response, step):
+    if step is not None:
+        response.headers['X-Episode-Id'] = request.args.get('episode_id')
+        response.headers['X-Episode-Step'] = str(step)
+    return response
+
+@app.route('/api/get_puzzle', methods=['GET'])
+def get_puzzle():
+    current_catalog = get_catalog()
+    puzzle_type, selected_puzzle, step, error = select_puzzle(current_catalog)
+    if error:
+        return error
+    
+    # The response for every puzzle was serialized when the catalog was built
+    body, status = current_catalog.puzzle_response(puzzle_type, selected_puzzle)
+    response = Response(body, status=status, mimetype='application/json')
+    return add_episode_headers(response, step)
+
+@app.route('/api/agent/puzzle', methods=['GET'])
+def get_agent_puzzle():
+    """Like get_puzzle, plus the puzzle's images: embedded with embed=true, else by digest"""
+    current_catalog = get_catalog()
+    puzzle_type, selected_puzzle, step, error = select_puzzle(current_catalog)
+    if error:
+        return error
+    
+    embed = 'base64' if request.args.get('embed', 'false').lower() == 'true' else None
+    payload, status = agent_puzzle_payload(current_catalog, asset_store, puzzle_type, selected_puzzle, embed,
+                                           rotation_renderer)
+    return add_episode_headers(jsonify(payload), step), status
+
+@app.route('/api/agent/submit', methods=['POST'])
+def submit_agent_answer():
+    """Check an answer and record it as a benchmark result in one call"""
+    data = request.json
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Expected a JSON object'}), 400
+    if 'session' not in data:
+        data['session'] = get_session_token()
+    
+    checker = find_checker(get_catalog().checkers, data.get('puzzle_type', 'Dice_Count'))
+    payload, status = check_and_record(checker, data, record_result)
+    return jsonify(payload), status
+
+@app.route('/api/puzzle_bundle', methods=['GET'])
+def get_puzzle_bundle():
+    """Every image of a puzzle in one response: a packed bundle (see assets.py) or multipart/mixed"""
+    puzzle_type = request.args.get('puzzle_type')
+    puzzle_id = request.args.get('puzzle_id')
+    bundle_format = request.args.get('format', 'packed').lower()
+    if bundle_format not in ('packed', 'multipart'):
+        return jsonify({'error': f'Unknown bundle format: {bundle_format}'}), 400
+    
+    current_catalog = get_catalog()
+    if not isinstance(current_catalog.ground_truth.get(puzzle_type, {}).get(puzzle_id), dict):
+        return jsonify({'error': 'Invalid puzzle ID'}), 400
     
-    # Load ground truth for the selected type
-    ground_truth = load_ground_truth(puzzle_type)
-    if not ground_truth:
-        return jsonify({'error': f'No puzzles found for type: {puzzle_type}'}), 404
-    
-    puzzle_files = list(ground_truth.keys())
-    
-    # Select a random puzzle, avoiding repetition if possible
-    if puzzle_type not in seen_puzzles:
-        seen_puzzles[puzzle_type] = set()
-    
-    # Get unseen puzzles
-    unseen_puzzles = [p for p in puzzle_files if p not in seen_puzzles[puzzle_type]]
-    
-    # If all puzzles have been seen, reset the tracking
-    if not unseen_puzzles:
-        seen_puzzles[puzzle_type] = set()
-        unseen_puzzles = puzzle_files
-    
-    # Select a random puzzle from unseen ones
-    selected_puzzle = random.choice(unseen_puzzles)
-    
-    # Mark this puzzle as seen
-    seen_puzzles[puzzle_type].add(selected_puzzle)
-    
-    # Get the appropriate question prompt based on puzzle type
-    if puzzle_type == "Dice_Count":
-        prompt = ground_truth[selected_puzzle].get('prompt', "Sum up the numbers on all the dice")
-    elif puzzle_type == "Geometry_Click":
-        prompt = ground_truth[selected_puzzle].get("question", "Click on the geometric shape")
-    elif puzzle_type == "Rotation_Match":
-        prompt = ground_truth[selected_puzzle].get("prompt", "Use the arrows to rotate the object to match the reference direction")
-    elif puzzle_type == "Slide_Puzzle":
-        prompt = ground_truth[selected_puzzle].get("prompt", "Drag the slider component to the correct position")
-    elif puzzle_type == "Unusual_Detection":
-        prompt = ground_truth[selected_puzzle].get("prompt", "Select the unusual items in the image")
-    elif puzzle_type == "Image_Recognition":
-        prompt = ground_truth[selected_puzzle].get("prompt", "Select all images matching the description")
-    elif puzzle_type == "Bingo":
-        prompt = ground_truth[selected_puzzle].get("prompt", "Please click two images to exchange their position to line up the same images to a line")
-    elif puzzle_type == "Image_Matching":
-        prompt = ground_truth[selected_puzzle].get("prompt", "Using the arrows, match the animal in the left and right image.")
-    elif puzzle_type == "Patch_Select":
-        prompt = ground_truth[selected_puzzle].get("prompt", "Select all squares with the specified objects")
-    elif puzzle_type == "Dart_Count":
-        prompt = ground_truth[selected_puzzle].get("prompt", "Use the arrows to pick the image where all the darts add up to the number in the left image.")
-    elif puzzle_type == "Object_Match":
-        prompt = ground_truth[selected_puzzle].get("prompt", "Use the arrows to change the number of objects until it matches the left image.")
-    elif puzzle_type == "Select_Animal":
-        prompt = ground_truth[selected_puzzle].get("prompt", "Pick a fox")
-    elif puzzle_type == "Coordinates":
-        prompt = ground_truth[selected_puzzle].get("prompt", "Using the arrows, move Jerry to the indicated seat")
-    elif puzzle_type == "Path_Finder":
-        prompt = ground_truth[selected_puzzle].get("prompt", "Use the arrows to move the duck to the spot indicated by the cross")
-    elif puzzle_type == "Place_Dot":
-        prompt = ground_truth[selected_puzzle].get("prompt", "Click to place a Dot at the end of the car's path")
-    elif puzzle_type == "Connect_icon":
-        prompt = ground_truth[selected_puzzle].get("prompt", "Using the arrows, connect the same two icons with the dotted line as shown on the left.")
-    elif puzzle_type == "Click_Order":
-        prompt = ground_truth[selected_puzzle].get("prompt", "Click the icons in order as shown in the reference image.")
-    elif puzzle_type == "Hold_Button":
-        prompt = ground_truth[selected_puzzle].get("prompt", "Hold the button until it finishes loading.")
-    elif puzzle_type == "Misleading_Click":
-        prompt = ground_truth[selected_puzzle].get("prompt", "Click the image to continue.")
-    elif puzzle_type == "Pick_Area":
-        prompt = ground_truth[selected_puzzle].get("prompt", "Click on the largest area outlined by the dotted line")
-    else:
-        prompt = ground_truth[selected_puzzle].get("prompt", "Solve the CAPTCHA puzzle")
-    
-    # Add input_type to tell the frontend what kind of input to show
-    input_type = "text"
-    if puzzle_type == "Dice_Count":
-        input_type = "number"
-    elif puzzle_type == "Geometry_Click":
-        input_type = "click"
-    elif puzzle_type == "Rotation_Match":
-        input_type = "rotation"
-    elif puzzle_type == "Slide_Puzzle":
-        input_type = "slide"
-    elif puzzle_type == "Unusual_Detection":
-        input_type = "multiselect"
-    elif puzzle_type == "Image_Recognition":
-        input_type = "image_grid"
-    elif puzzle_type == "Bingo":
-        input_type = "bingo_swap"
-    elif puzzle_type == "Image_Matching":
-        input_type = "image_matching"
-    elif puzzle_type == "Patch_Select":
-        input_type = "patch_select"
-    elif puzzle_type == "Dart_Count":
-        input_type = "dart_count"
-    elif puzzle_type == "Object_Match":
-        input_type = "object_match"
-    elif puzzle_type == "Select_Animal":
-        input_type = "select_animal"
-    elif puzzle_type == "Coordinates":
-        input_type = "image_matching"
-    elif puzzle_type == "Path_Finder":
-        input_type = "image_matching"
-    elif puzzle_type == "Place_Dot":
-        input_type = "place_dot"
-    elif puzzle_type == "Connect_icon":
-        input_type = "connect_icon"
-    elif puzzle_type == "Click_Order":
-        input_type = "click_order"
-    elif puzzle_type == "Hold_Button":
-        input_type = "hold_button"
-    elif puzzle_type == "Misleading_Click":
-        input_type = "click"
-    elif puzzle_type == "Pick_Area":
-        input_type = "click"
-    
-    # For Rotation_Match, include additional data needed for the interface
-    additional_data = {}
-    if puzzle_type == "Rotation_Match":
-        # Get reference image and object base name
-        reference_image = ground_truth[selected_puzzle].get("reference_image")
-        object_base_image = ground_truth[selected_puzzle].get("object_base_image")
-        
-        if not reference_image or not object_base_image:
-            # If missing required fields, try another puzzle or fall back
-            return jsonify({'error': f'Invalid rotation puzzle data: {selected_puzzle}'}), 500
-        
-        # Format paths for these images
-        ref_path = f'/captcha_data/{puzzle_type}/{reference_image}'
-        
-        # Get object base name without extension to construct rotated image paths
-        object_base = os.path.splitext(object_base_image)[0]
-        
-        # Construct the initial object image path (0 degrees rotation)
-        object_path = f'/captcha_data/{puzzle_type}/{object_base}_0.png'
-        
-        additional_data = {
-            "reference_image": ref_path,
-            "object_image": object_path,
-            "object_base": object_base,
-            "current_angle": 0
-        }
-    # For Slide_Puzzle, include the component image path and target position data
-    elif puzzle_type == "Slide_Puzzle":
-        # Get component image name
-        component_image = ground_truth[selected_puzzle].get("component_image")
-        
-        if not component_image:
-            # If missing required fields, try another puzzle or fall back
-            return jsonify({'error': f'Invalid slide puzzle data: {selected_puzzle}'}), 500
-        
-        # Format path for the component image
-        component_path = f'/captcha_data/{puzzle_type}/{component_image}'
-        
-        additional_data = {
-            "component_image": component_path,
-            "background_image": f'/captcha_data/{puzzle_type}/{selected_puzzle}'
-        }
-    # For Unusual_Detection, include the grid size
-    elif puzzle_type == "Unusual_Detection":
-        # Get grid size from ground truth
-        grid_size = ground_truth[selected_puzzle].get("grid_size", [2, 3])  # Default to 2x3 grid if not specified
-        
-        additional_data = {
-            "grid_size": grid_size
-        }
-    # For Image_Recognition, include the grid images
-    elif puzzle_type == "Image_Recognition":
-        # Get images array from ground truth
-        images = ground_truth[selected_puzzle].get("images", [])
-        grid_size = [3, 3]  # Default grid size for image recognition (3x3)
-        
-        # Get the subfolder name from the puzzle_id or use a specific subfolder field
-        subfolder = ground_truth[selected_puzzle].get("subfolder", selected_puzzle)
-        
-        # Include image paths in response - dynamically use the subfolder
-        image_paths = [f'/captcha_data/{puzzle_type}/{subfolder}/{img}' for img in images]
-        
-        additional_data = {
-            "images": image_paths,
-            "grid_size": grid_size,
-            "question": ground_truth[selected_puzzle].get("question", "Select matching images")
-        }
-    # For Bingo, include the grid size
-    elif puzzle_type == "Bingo":
-        # Get grid size from ground truth
-        grid_size = ground_truth[selected_puzzle].get("grid_size", [3, 3])  # Default to 3x3 grid if not specified
-        
-        additional_data = {
-            "grid_size": grid_size,
-            "solution_line": ground_truth[selected_puzzle].get("solution_line", {}),
-            "answer": ground_truth[selected_puzzle].get("answer", [])
-        }
-    # For Image_Matching, include the reference image and options
-    elif puzzle_type == "Image_Matching":
-        # Get the reference image and option images
-        reference_image = ground_truth[selected_puzzle].get("reference_image")
-        option_images = ground_truth[selected_puzzle].get("option_images", [])
-        correct_option_index = ground_truth[selected_puzzle].get("correct_option_index", 0)
-        
-        if not reference_image or not option_images:
-            return jsonify({'error': f'Invalid image matching data: {selected_puzzle}'}), 500
-        
-        # Format paths for these images
-        ref_path = f'/captcha_data/{puzzle_type}/{reference_image}'
-        option_paths = [f'/captcha_data/{puzzle_type}/{img}' for img in option_images]
-        
-        additional_data = {
-            "reference_image": ref_path,
-            "option_images": option_paths,
-            "current_option_index": 0,
-            "correct_option_index": correct_option_index
-        }
-    # For Patch_Select, include the grid size and target object
-    elif puzzle_type == "Patch_Select":
-        # Get grid size from ground truth, default to 6x6 grid
-        grid_size = ground_truth[selected_puzzle].get("grid_size", [5, 5])
-        target_object = ground_truth[selected_puzzle].get("target_object", "moon")
-        correct_patches = ground_truth[selected_puzzle].get("correct_patches", [])
-        
-        additional_data = {
-            "grid_size": grid_size,
-            "target_object": target_object,
-            "correct_patches": correct_patches
-        }
-    # For Dart_Count, include the reference image and options
-    elif puzzle_type == "Dart_Count":
-        # Get the reference image and option images
-        reference_image = ground_truth[selected_puzzle].get("reference_image")
-        option_images = ground_truth[selected_puzzle].get("option_images", [])
-        correct_option_index = ground_truth[selected_puzzle].get("correct_option_index", 0)
-        reference_number = ground_truth[selected_puzzle].get("reference_number", 0)
-        
-        if not reference_image or not option_images:
-            return jsonify({'error': f'Invalid dart count data: {selected_puzzle}'}), 500
-        
-        # Format paths for these images
-        ref_path = f'/captcha_data/{puzzle_type}/{reference_image}'
-        option_paths = [f'/captcha_data/{puzzle_type}/{img}' for img in option_images]
-        
-        additional_data = {
-            "reference_image": ref_path,
-            "option_images": option_paths,
-            "current_option_index": 0,
-            "correct_option_index": correct_option_index,
-            "reference_number": reference_number
-        }
-    # For Object_Match, include the reference image and options
-    elif puzzle_type == "Object_Match":
-        # Get the reference image and option images
-        reference_image = ground_truth[selected_puzzle].get("reference_image")
-        option_images = ground_truth[selected_puzzle].get("option_images", [])
-        correct_option_index = ground_truth[selected_puzzle].get("correct_option_index", 0)
-        
-        if not reference_image or not option_images:
-            return jsonify({'error': f'Invalid object match data: {selected_puzzle}'}), 500
-        
-        # Format paths for these images
-        ref_path = f'/captcha_data/{puzzle_type}/{reference_image}'
-        option_paths = [f'/captcha_data/{puzzle_type}/{img}' for img in option_images]
-        
-        additional_data = {
-            "reference_image": ref_path,
-            "option_images": option_paths,
-            "current_option_index": 0,
-            "correct_option_index": correct_option_index
-        }
-    # For Select_Animal, include the grid size and target object
-    elif puzzle_type == "Select_Animal":
-        # Get grid size from ground truth, default to 2x3 grid
-        grid_size = ground_truth[selected_puzzle].get("grid_size", [2, 3])
-        target_object = ground_truth[selected_puzzle].get("target_object", "fox")
-        correct_patches = ground_truth[selected_puzzle].get("correct_patches", [])
-        
-        additional_data = {
-            "grid_size": grid_size,
-            "target_object": target_object,
-            "correct_patches": correct_patches
-        }
-    # For Coordinates, include the reference image and options
-    elif puzzle_type == "Coordinates":
-        # Get the reference image and option images
-        reference_image = ground_truth[selected_puzzle].get("reference_image")
-        option_images = ground_truth[selected_puzzle].get("option_images", [])
-        correct_option_index = ground_truth[selected_puzzle].get("correct_option_index", 0)
-        
-        if not reference_image or not option_images:
-            return jsonify({'error': f'Invalid coordinates data: {selected_puzzle}'}), 500
-        
-        # Format paths for these images
-        ref_path = f'/captcha_data/{puzzle_type}/{reference_image}'
-        option_paths = [f'/captcha_data/{puzzle_type}/{img}' for img in option_images]
-        
-        additional_data = {
-            "reference_image": ref_path,
-            "option_images": option_paths,
-            "current_option_index": 0,
-            "correct_option_index": correct_option_index
-        }
-    # For Path_Finder, include the reference image and options
-    elif puzzle_type == "Path_Finder":
-        # Get the reference image and option images
-        reference_image = ground_truth[selected_puzzle].get("reference_image")
-        options = ground_truth[selected_puzzle].get("options", [])
-        correct_option = ground_truth[selected_puzzle].get("correct_option", 0)
-        
-        if not reference_image or not options:
-            return jsonify({'error': f'Invalid path finder data: {selected_puzzle}'}), 500
-        
-        # Format paths for these images
-        ref_path = f'/captcha_data/{puzzle_type}/{reference_image}'
-        option_paths = [f'/captcha_data/{puzzle_type}/{img}' for img in options]
-        
-        additional_data = {
-            "reference_image": ref_path,
-            "option_images": option_paths,
-            "current_option_index": 0,
-            "correct_option_index": correct_option
-        }
-    # For Connect_icon, include the reference image and options
-    elif puzzle_type == "Connect_icon":
-        # Get the reference image and option images
-        reference_image = ground_truth[selected_puzzle].get("reference_image")
-        options = ground_truth[selected_puzzle].get("options", [])
-        correct_option = ground_truth[selected_puzzle].get("correct_option", 0)
-        
-        if not reference_image or not options:
-            return jsonify({'error': f'Invalid connect icons data: {selected_puzzle}'}), 500
-        
-        # Format paths for these images
-        ref_path = f'/captcha_data/{puzzle_type}/{reference_image}'
-        option_paths = [f'/captcha_data/{puzzle_type}/{img}' for img in options]
-        
-        additional_data = {
-            "reference_image": ref_path,
-            "option_images": option_paths,
-            "current_option_index": 0,
-            "correct_option_index": correct_option
-        }
-    # For Click_Order, include the order image path
-    elif puzzle_type == "Click_Order":
-        # Get the order image from ground truth
-        order_image = ground_truth[selected_puzzle].get("order_image")
-        
-        if not order_image:
-            return jsonify({'error': f'Invalid click order data: {selected_puzzle}'}), 500
-        
-        # Format path for the order image
-        order_path = f'/captcha_data/{puzzle_type}/{order_image}'
-        
-        additional_data = {
-            "order_image": order_path,
-            "tolerance": ground_truth[selected_puzzle].get("tolerance", 20)
-        }
-    # For Hold_Button, include the hold time
-    elif puzzle_type == "Hold_Button":
-        # Get the required hold time from ground truth
-        hold_time = ground_truth[selected_puzzle].get("hold_time", 3)  # Default to 3 seconds if not specified
-        
-        additional_data = {
-            "hold_time": hold_time
-        }
-    # For Misleading_Click, include the area to avoid
-    elif puzzle_type == "Misleading_Click":
-        # Get the area to avoid from ground truth
-        avoid_area = ground_truth[selected_puzzle].get("avoid_area", {"x": 0, "y": 0, "width": 0, "height": 0})
-        
-        additional_data = {
-            "avoid_area": avoid_area
-        }
+    assets = []
+    for relpath in current_catalog.bundle_assets(puzzle_type, puzzle_id):
+        try:
+            digest, data = asset_store.load(puzzle_type, relpath)
+        except OSError:
+            return jsonify({'error': f'Missing asset: {puzzle_type}/{relpath}'}), 500
+        assets.append((asset_url(puzzle_type, relpath), digest, asset_store.content_type(relpath), data))
+    
+    if bundle_format == 'multipart':
+        # Derive the boundary from the contents so identical bundles are identical bytes
+        boundary = hashlib.sha256(''.join(digest for _, digest, _, _ in assets).encode()).hexdigest()[:32]
+        response = Response(multipart_bundle(assets, boundary),
+                            content_type=f'multipart/mixed; boundary={boundary}')
     else:
-        prompt = ground_truth[selected_puzzle].get("prompt", "Solve the CAPTCHA puzzle")
-    
-    response_data = {
-        'puzzle_type': puzzle_type,
-        'image_path': f'/captcha_data/{puzzle_type}/{selected_puzzle}' if puzzle_type != "Rotation_Match" else None,
-        'puzzle_id': selected_puzzle,
-        'prompt': prompt,
-        'input_type': input_type,
-        'debug_info': f"Type: {puzzle_type}, Input: {input_type}, Puzzle: {selected_puzzle}"
-    }
-    
-    # Add any additional data for specific puzzle types
-    if additional_data:
-        response_data.update(additional_data)
+        response = Response(pack_bundle(assets), mimetype='application/octet-stream')
+    response.set_etag(hashlib.sha256(response.get_data()).hexdigest())
+    return response.make_conditional(request)
+
+@app.route('/api/rotation_sprite', methods=['GET'])
+def get_rotation_sprite():
+    """All rotations of a Rotation_Match object in one image, a frame every `step` degrees"""
+    puzzle_id = request.args.get('puzzle_id')
+    entry = get_catalog().ground_truth.get('Rotation_Match', {}).get(puzzle_id)
+    if not isinstance(entry, dict) or not entry.get('object_base_image'):
+        return jsonify({'error': 'Invalid puzzle ID'}), 400
+    step = request.args.get('step', '45')
+    if not (step.isascii() and step.isdecimal()):
+        return jsonify({'error': 'step must be a positive integer'}), 400
+    step = int(step)
+    try:
+        etag, data, frames = rotation_renderer.sprite('Rotation_Match', entry['object_base_image'], step)
+    except ValueError:
+        return jsonify({'error': 'step must be a divisor of 360'}), 400
+    except OSError:
+        return jsonify({'error': f"Missing asset: Rotation_Match/{entry['object_base_image']}"}), 500
+    
+    response = make_asset_response(data, 'image/png', etag)
+    # Frame i (left to right) shows the object rotated clockwise by i * step degrees
+    response.headers['X-Frame-Count'] = str(frames)
+    response.headers['X-Angle-Step'] = str(step)
+    return response
+
+@app.route('/api/asset/<digest>')
+def serve_asset(digest):
+    """Serve an image by the content digest given out by /api/agent/puzzle"""
+    key = asset_store.lookup(digest)
+    if key is None:
+        return jsonify({'error': 'Unknown asset'}), 404
+    try:
+        current_digest, data = asset_store.load(*key)
+    except OSError:
+        return jsonify({'error': 'Unknown asset'}), 404
+    if current_digest != digest:
+        return jsonify({'error': 'Unknown asset'}), 404
+    return make_asset_response(data, asset_store.content_type(key[1]), digest, immutable=True)
+
+@app.route('/api/episode', methods=['GET'])
+def create_episode():
+    """Generate (or fetch the cached) episode manifest for a seed"""
+    seed = request.args.get('seed')
+    mode = request.args.get('mode', 'random').lower()
+    types = request.args.get('types')
+    try:
+        length = int(request.args.get('length', 100))
+    except ValueError:
+        return jsonify({'error': 'Invalid length'}), 400
+    if seed is None:
+        return jsonify({'error': 'Missing seed'}), 400
+    if not 0 < length <= MAX_EPISODE_LENGTH:
+        return jsonify({'error': f'length must be between 1 and {MAX_EPISODE_LENGTH}'}), 400
     
-    return jsonify(response_data)
+    try:
+        manifest = build_episode(get_catalog().sampler, seed, length, mode,
+                                 types=types.split(',') if types else None,
+                                 sequence=PUZZLE_TYPE_SEQUENCE,
+                                 max_recent=MAX_RECENT_TYPES)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if not manifest['puzzles']:
+        return jsonify({'error': 'No puzzles found for this episode'}), 404
+    
+    return jsonify(episode_store.save(manifest))
+
+@app.route('/api/episode/<episode_id>', methods=['GET'])
+def get_episode(episode_id):
+    """Export an episode manifest"""
+    manifest = episode_store.get(episode_id)
+    if manifest is None:
+        return jsonify({'error': f'Unknown episode: {episode_id}'}), 404
+    return jsonify(manifest)
+
+@app.route('/api/episode', methods=['POST'])
+def upload_episode():
+    """Register an exported manifest so it can be replayed on this server"""
+    data = request.json
+    puzzles = data.get('puzzles') if isinstance(data, dict) else None
+    if not isinstance(puzzles, list) or not puzzles:
+        return jsonify({'error': 'Expected a manifest with a list of puzzles'}), 400
+    if len(puzzles) > MAX_EPISODE_LENGTH:
+        return jsonify({'error': f'Episodes have at most {MAX_EPISODE_LENGTH} puzzles'}), 400
+    
+    ground_truth = get_catalog().ground_truth
+    for entry in puzzles:
+        if (not isinstance(entry, list) or len(entry) != 2
+                or not all(isinstance(part, str) for part in entry)
+                or entry[1] not in ground_truth.get(entry[0], {})):
+            return jsonify({'error': f'Unknown puzzle in manifest: {entry}'}), 400
+    
+    # Only the puzzles (and the mode they were drawn in) are kept; other keys aren't stored or echoed
+    info = {'mode': data['mode']} if data.get('mode') in ('random', 'sequential') else {}
+    return jsonify(episode_store.save(make_manifest(puzzles, **info)))
 
 @app.route('/api/get_ground_truth', methods=['POST'])
 def get_ground_truth():
@@ -541,464 +652,163 @@ def get_ground_truth():
 @app.route('/api/check_answer', methods=['POST'])
 def check_answer():
     data = request.json
-    puzzle_type = data.get('puzzle_type', 'Dice_Count')
-    puzzle_id = data.get('puzzle_id')
-    user_answer = data.get('answer')
-    elapsed_time = float(data.get('elapsed_time', 0))
-
-    
-    # Validate input
-    if not puzzle_id or user_answer is None:
-        return jsonify({'error': 'Missing puzzle_id or answer'}), 400
-    
-    ground_truth = load_ground_truth(puzzle_type)
-    
-    if puzzle_id not in ground_truth:
-        return jsonify({'error': 'Invalid puzzle ID'}), 400
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Expected a JSON object'}), 400
     
-    # Get correct answer based on puzzle type
-    is_correct = False
-    
-    if puzzle_type == 'Dice_Count':
-        # For dice count, ensure we're comparing numbers
-        try:
-            correct_answer = ground_truth[puzzle_id].get('sum')
-            is_correct = int(user_answer) == int(correct_answer)
-        except ValueError:
-            return jsonify({'error': 'Invalid answer format'}), 400
-            
-    elif puzzle_type == 'Geometry_Click':
-        # For geometry click, check if click is within the correct area
-        try:
-            # Get the area boundaries from ground truth
-            correct_answer = ground_truth[puzzle_id].get('answer')
-            
-            # Extract coordinates
-            user_x, user_y = user_answer
-            
-            # Check if the new format is used (with area)
-            if isinstance(correct_answer, dict) and 'area' in correct_answer:
-                # Get area coordinates (top-left and bottom-right corners)
-                top_left, bottom_right = correct_answer['area']
-                min_x, min_y = top_left
-                max_x, max_y = bottom_right
-                
-                # Check if click is within the defined area
-                is_correct = (min_x <= user_x <= max_x) and (min_y <= user_y <= max_y)
-                
-                # Return the shape type as part of the correct answer
-                shape_type = correct_answer.get('type', 'shape')
-                correct_answer_info = {
-                    'type': shape_type,
-                    'area': correct_answer['area']
-                }
-            else:
-                # Fall back to the old format with distance calculation
-                correct_x, correct_y = correct_answer
-                
-                # Calculate distance and check if within tolerance (25 pixels)
-                tolerance = 25
-                distance = ((user_x - correct_x) ** 2 + (user_y - correct_y) ** 2) ** 0.5
-                is_correct = distance <= tolerance
-                correct_answer_info = correct_answer
-        except (ValueError, TypeError, KeyError):
-            return jsonify({'error': 'Invalid answer format for Geometry_Click'}), 400
-    
-    elif puzzle_type == 'Rotation_Match':
-        # For rotation match, check if the angle matches the correct answer
-        try:
-            # Get the correct angle from ground truth
-            correct_angle = ground_truth[puzzle_id].get('correct_angle')
-            
-            # User answer should be the current rotation angle
-            user_angle = int(user_answer)
-            
-            # Check if angles match (using modulo to handle full rotations)
-            is_correct = user_angle % 360 == correct_angle % 360
-            correct_answer_info = correct_angle
-        except (ValueError, TypeError):
-            return jsonify({'error': 'Invalid answer format for Rotation_Match'}), 400
-    
-    elif puzzle_type == 'Slide_Puzzle':
-        # For slide puzzle, check if the component is positioned correctly
-        try:
-            # Get the target position from ground truth
-            target_position = ground_truth[puzzle_id].get('target_position')
-            tolerance = ground_truth[puzzle_id].get('tolerance', 10)
-            
-            # User answer should be the final position coordinates [x, y]
-            user_x, user_y = user_answer
-            target_x, target_y = target_position
-            
-            # Calculate distance from target position
-            distance = ((user_x - target_x) ** 2 + (user_y - target_y) ** 2) ** 0.5
-            
-            # Check if within tolerance
-            is_correct = distance <= tolerance
-            correct_answer_info = target_position
-        except (ValueError, TypeError):
-            return jsonify({'error': 'Invalid answer format for Slide_Puzzle'}), 400
-    
-    elif puzzle_type == 'Unusual_Detection':
-        # For unusual detection, check if the selected grid cells match the unusual ones
-        try:
-            # Get the expected unusual cells from ground truth
-            correct_cells = ground_truth[puzzle_id].get('answer', [])
-            
-            # User answer should be a list of selected grid cell indices
-            user_cells = user_answer
-            
-            # Check if the selected cells match exactly
-            is_correct = set(user_cells) == set(correct_cells)
-            correct_answer_info = correct_cells
-        except (ValueError, TypeError):
-            return jsonify({'error': 'Invalid answer format for Unusual_Detection'}), 400
-    
-    elif puzzle_type == 'Image_Recognition':
-        # For image recognition, check if the selected images match the expected ones
-        try:
-            # Get the expected correct image indices from ground truth
-            correct_selections = ground_truth[puzzle_id].get('correct_selections', [])
-            
-            # User answer should be a list of selected image indices
-            user_selections = user_answer
-            
-            # Check if the selected images match exactly
-            is_correct = set(user_selections) == set(correct_selections)
-            correct_answer_info = correct_selections
-        except (ValueError, TypeError):
-            return jsonify({'error': 'Invalid answer format for Image_Recognition'}), 400
-    
-    elif puzzle_type == 'Bingo':
-        # For Bingo, check if the swapped positions would create a line of matching images
-        try:
-            # Get the expected correct swap options from ground truth
-            correct_swaps = ground_truth[puzzle_id].get('answer', [])
-            
-            # User answer should be a list of two indices to swap
-            user_swaps = user_answer
-            
-            # Check if the swaps match any of the possible correct swaps
-            # For this puzzle, there can be multiple correct solutions
-            is_correct = False
-            
-            # Go through each possible solution
-            for correct_swap in correct_swaps:
-                # Check if user's swap matches this solution (order doesn't matter)
-                if (set(user_swaps) == set(correct_swap) or 
-                    (set(user_swaps) == set(correct_swap[::-1]) if len(correct_swap) == 2 else False)):
-                    is_correct = True
-                    break
-                    
-            correct_answer_info = correct_swaps
-        except (ValueError, TypeError):
-            return jsonify({'error': 'Invalid answer format for Bingo'}), 400
-    
-    elif puzzle_type == 'Image_Matching':
-        # For Image Matching, check if the selected option index matches the correct one
-        try:
-            # Get the correct option index from ground truth
-            correct_index = ground_truth[puzzle_id].get('correct_option_index')
-            
-            # User answer should be the selected option index
-            user_index = int(user_answer)
-            
-            # Check if indices match
-            is_correct = user_index == correct_index
-            correct_answer_info = correct_index
-        except (ValueError, TypeError):
-            return jsonify({'error': 'Invalid answer format for Image_Matching'}), 400
-    
-    elif puzzle_type == 'Patch_Select':
-        # For Patch_Select, check if the selected patches match the correct ones
-        try:
-            # Get the correct patches from ground truth
-            correct_patches = ground_truth[puzzle_id].get('correct_patches', [])
-            
-            # User answer should be a list of selected patch indices
-            user_patches = user_answer
-            
-            # Check if the selected patches match exactly
-            is_correct = set(user_patches) == set(correct_patches)
-            correct_answer_info = correct_patches
-        except (ValueError, TypeError):
-            return jsonify({'error': 'Invalid answer format for Patch_Select'}), 400
-    
-    elif puzzle_type == 'Dart_Count':
-        # For Dart_Count, check if the selected option index matches the correct one
-        try:
-            # Get the correct option index from ground truth
-            correct_index = ground_truth[puzzle_id].get('correct_option_index')
-            
-            # User answer should be the selected option index
-            user_index = int(user_answer)
-            
-            # Check if indices match
-            is_correct = user_index == correct_index
-            correct_answer_info = correct_index
-        except (ValueError, TypeError):
-            return jsonify({'error': 'Invalid answer format for Dart_Count'}), 400
-    
-    elif puzzle_type == 'Place_Dot':
-        # For Place_Dot, check if the dot is placed at the end of the car's path
-        try:
-            # Get the target position from ground truth
-            target_position = ground_truth[puzzle_id].get('target_position')
-            tolerance = ground_truth[puzzle_id].get('tolerance', 15)  # Default tolerance of 15 pixels
-            
-            # Extract coordinates from user's answer (click position)
-            user_x, user_y = user_answer
-            target_x, target_y = target_position
-            
-            # Calculate distance from target position
-            distance = ((user_x - target_x) ** 2 + (user_y - target_y) ** 2) ** 0.5
-            
-            # Check if within tolerance
-            is_correct = distance <= tolerance
-            correct_answer_info = target_position
-        except (ValueError, TypeError, KeyError):
-            return jsonify({'error': 'Invalid answer format for Place_Dot'}), 400
-    
-    elif puzzle_type == 'Object_Match':
-        # For Object_Match, check if the selected option index matches the correct one
-        try:
-            # Get the correct option index from ground truth
-            correct_index = ground_truth[puzzle_id].get('correct_option_index')
-            
-            # User answer should be the selected option index
-            user_index = int(user_answer)
-            
-            # Check if indices match
-            is_correct = user_index == correct_index
-            correct_answer_info = correct_index
-        except (ValueError, TypeError):
-            return jsonify({'error': 'Invalid answer format for Object_Match'}), 400
-    
-    elif puzzle_type == 'Select_Animal':
-        # For Select_Animal, check if the selected patches match the correct ones
-        try:
-            # Get the correct patches from ground truth
-            correct_patches = ground_truth[puzzle_id].get('correct_patches', [])
-            
-            # User answer should be a list of selected patch indices
-            user_patches = user_answer
-            
-            # Check if the selected patches match exactly
-            is_correct = set(user_patches) == set(correct_patches)
-            correct_answer_info = correct_patches
-        except (ValueError, TypeError):
-            return jsonify({'error': 'Invalid answer format for Select_Animal'}), 400
-    
-    elif puzzle_type == 'Coordinates':
-        # For Coordinates, check if the selected option index matches the correct one
-        try:
-            # Get the correct option index from ground truth
-            correct_index = ground_truth[puzzle_id].get('correct_option_index')
-            
-            # User answer should be the selected option index
-            user_index = int(user_answer)
-            
-            # Check if indices match
-            is_correct = user_index == correct_index
-            correct_answer_info = correct_index
-        except (ValueError, TypeError):
-            return jsonify({'error': 'Invalid answer format for Coordinates'}), 400
-    
-    elif puzzle_type == 'Path_Finder':
-        # For Path_Finder, check if the selected option index matches the correct one
-        try:
-            # Get the correct option index from ground truth
-            correct_index = ground_truth[puzzle_id].get('correct_option')
-            
-            # User answer should be the selected option index
-            user_index = int(user_answer)
-            
-            # Check if indices match
-            is_correct = user_index == correct_index
-            correct_answer_info = correct_index
-        except (ValueError, TypeError):
-            return jsonify({'error': 'Invalid answer format for Path_Finder'}), 400
-    
-    elif puzzle_type == 'Connect_icon':
-        # For Connect_icon, check if the selected option index matches the correct one
-        try:
-            # Get the correct option index from ground truth
-            correct_index = ground_truth[puzzle_id].get('correct_option')
-            
-            # User answer should be the selected option index
-            user_index = int(user_answer)
-            
-            # Check if indices match
-            is_correct = user_index == correct_index
-            correct_answer_info = correct_index
-        except (ValueError, TypeError):
-            return jsonify({'error': 'Invalid answer format for Connect_icon'}), 400
-    
-    elif puzzle_type == 'Click_Order':
-        # For Click_Order, check if the clicked positions match the expected order
-        try:
-            # Get the correct coordinates and tolerance from ground truth
-            correct_positions = ground_truth[puzzle_id].get('answer', [])
-            tolerance = ground_truth[puzzle_id].get('tolerance', 20)  # Default tolerance of 20 pixels
-            
-            # User answer should be a list of clicked positions in order
-            user_positions = user_answer
-            
-            # Check if the number of clicks matches
-            if len(user_positions) != len(correct_positions):
-                is_correct = False
-            else:
-                # Check each position with tolerance
-                is_correct = True
-                for i, (user_pos, correct_pos) in enumerate(zip(user_positions, correct_positions)):
-                    user_x, user_y = user_pos
-                    correct_x, correct_y = correct_pos
-                    
-                    # Calculate distance
-                    distance = ((user_x - correct_x) ** 2 + (user_y - correct_y) ** 2) ** 0.5
-                    
-                    # If any position is outside tolerance, the answer is incorrect
-                    if distance > tolerance:
-                        is_correct = False
-                        break
-            
-            correct_answer_info = correct_positions
-        except (ValueError, TypeError, KeyError):
-            return jsonify({'error': 'Invalid answer format for Click_Order'}), 400
-    
-    elif puzzle_type == 'Hold_Button':
-        # For Hold_Button, check if the hold time is within the allowed range
-        try:
-            # Get the required hold time from ground truth
-            hold_time = ground_truth[puzzle_id].get("hold_time", 3)  # Default to 3 seconds if not specified
-            
-            # User answer should be a number representing the hold time in seconds
-            user_hold_time = float(user_answer)
-            
-            if elapsed_time > 8 and user_hold_time < hold_time:
-                is_correct = False
-                correct_answer_info = f"Timeout ({elapsed_time:.2f}s)"
-            else:
-                is_correct = hold_time >= user_hold_time >= 0
-                correct_answer_info = hold_time
-
-        except (ValueError, TypeError):
-            return jsonify({'error': 'Invalid answer format for Hold_Button'}), 400
-    
-    elif puzzle_type == 'Misleading_Click':
-        # For Misleading_Click, check if the click is NOT within the area to avoid
-        try:
-            # Get the area to avoid from ground truth
-            avoid_area = ground_truth[puzzle_id].get("avoid_area", {"x": 0, "y": 0, "width": 0, "height": 0})
-            
-            # Extract coordinates from user's answer (click position)
-            user_x, user_y = user_answer
-            
-            # Check if click is outside the area to avoid
-            area_x = avoid_area["x"]
-            area_y = avoid_area["y"]
-            area_width = avoid_area["width"]
-            area_height = avoid_area["height"]
-            
-            # Click should be outside the avoid area to be correct
-            is_inside_avoid_area = (
-                area_x <= user_x <= area_x + area_width and 
-                area_y <= user_y <= area_y + area_height
-            )
-            
-            # User is correct if they clicked outside the avoid area
-            is_correct = not is_inside_avoid_area
-            correct_answer_info = "Click outside the red bear area"
-        except (ValueError, TypeError, KeyError):
-            return jsonify({'error': 'Invalid answer format for Misleading_Click'}), 400
-    
-    elif puzzle_type == 'Pick_Area':
-        # For Pick_Area, check if click is within the correct area
-        try:
-            # Get the area boundaries from ground truth
-            correct_answer = ground_truth[puzzle_id].get('answer')
-            
-            # Extract coordinates
-            user_x, user_y = user_answer
-            
-            # Check if the correct area is defined
-            if isinstance(correct_answer, dict) and 'area' in correct_answer:
-                # Get area coordinates (top-left and bottom-right corners)
-                top_left, bottom_right = correct_answer['area']
-                min_x, min_y = top_left
-                max_x, max_y = bottom_right
-                
-                # Check if click is within the defined area
-                is_correct = (min_x <= user_x <= max_x) and (min_y <= user_y <= max_y)
-                
-                # Return the area type as part of the correct answer
-                area_type = correct_answer.get('type', 'largest region')
-                correct_answer_info = {
-                    'type': area_type,
-                    'area': correct_answer['area']
-                }
-            else:
-                # Fall back if area is not properly defined
-                is_correct = False
-                correct_answer_info = correct_answer
-        except (ValueError, TypeError, KeyError):
-            return jsonify({'error': 'Invalid answer format for Pick_Area'}), 400
-    
-    else:
-        # For other types, compare as strings (case insensitive)
-        correct_answer = ground_truth[puzzle_id].get('answer')
-        is_correct = str(user_answer).lower() == str(correct_answer).lower()
-        correct_answer_info = correct_answer
-    
-    # Get the appropriate answer field based on puzzle type
-    if puzzle_type == 'Dice_Count':
-        answer_key = 'sum'
-    elif puzzle_type == 'Patch_Select':
-        answer_key = 'correct_patches'
-    elif puzzle_type == 'Select_Animal':
-        answer_key = 'correct_patches'
-    elif puzzle_type == 'Coordinates':
-        answer_key = 'correct_option_index'
-    elif puzzle_type == 'Path_Finder':
-        answer_key = 'correct_option'
-    elif puzzle_type == 'Connect_icon':
-        answer_key = 'correct_option'
-    elif puzzle_type == 'Click_Order':
-        answer_key = 'answer'
-    elif puzzle_type == 'Hold_Button':
-        answer_key = 'hold_time'
-    elif puzzle_type == 'Misleading_Click':
-        answer_key = 'answer'
-    elif puzzle_type == 'Pick_Area':
-        answer_key = 'answer'
-    else:
-        answer_key = 'answer'
+    # Each type has one checker holding its precomputed ground truth
+    checker = find_checker(get_catalog().checkers, data.get('puzzle_type', 'Dice_Count'))
+    payload, status = score_answer(checker, data)
+    return jsonify(payload), status
+
+@app.route('/api/check_answers', methods=['POST'])
+def check_answers():
+    """Check a list of answers in one request, results come back in the same order"""
+    data = request.json
+    records = data.get('answers') if isinstance(data, dict) else data
+    if not isinstance(records, list):
+        return jsonify({'error': 'Expected a list of answers'}), 400
+    
+    # Group records by type so each type's checker is looked up once per batch
+    results = [None] * len(records)
+    indices_by_type = {}
+    for i, record in enumerate(records):
+        if not isinstance(record, dict) or not isinstance(record.get('puzzle_type', 'Dice_Count'), str):
+            results[i] = {'error': 'Invalid answer record'}
+            continue
+        indices_by_type.setdefault(record.get('puzzle_type', 'Dice_Count'), []).append(i)
+    
+    checkers = get_catalog().checkers
+    for puzzle_type, indices in indices_by_type.items():
+        checker = find_checker(checkers, puzzle_type)
+        for i in indices:
+            results[i], _ = score_answer(checker, records[i])
     
     return jsonify({
-        'correct': is_correct,
-        'user_answer': user_answer,
-        'correct_answer': ground_truth[puzzle_id].get(answer_key)
+        'results': results,
+        'total': len(results),
+        'correct': sum(1 for result in results if result.get('correct'))
     })
 
+# Running per-model, per-type aggregates of every result, snapshotted to LEADERBOARD_PATH
+leaderboard = Leaderboard(os.environ.get('LEADERBOARD_PATH', 'leaderboard.json'),
+                          snapshot_interval=float(os.environ.get('LEADERBOARD_SNAPSHOT_INTERVAL', 10)))
+
+# Benchmark results are queued and written in batches by a background thread, to
+# RESULTS_PATH (jsonl), RESULTS_DB_PATH (sqlite) or both, as selected by RESULTS_BACKEND,
+# and folded into the leaderboard
+benchmark_writer = BatchWriter(
+    [leaderboard] + create_sinks(os.environ.get('RESULTS_BACKEND', 'jsonl'),
+                 path=os.environ.get('RESULTS_PATH', 'benchmark_results.json'),
+                 db_path=os.environ.get('RESULTS_DB_PATH', 'benchmark_results.db'),
+                 max_bytes=int(os.environ.get('RESULTS_MAX_BYTES', 0)),
+                 rotate_daily=bool(os.environ.get('RESULTS_ROTATE_DAILY'))),
+    batch_size=int(os.environ.get('RESULTS_BATCH_SIZE', 500)),
+    flush_interval=float(os.environ.get('RESULTS_FLUSH_INTERVAL', 1.0))
+)
+# The SQLite sink, if enabled, also answers /api/benchmark_summary
+results_db = next((sink for sink in benchmark_writer.sinks if isinstance(sink, SQLiteResultsSink)), None)
+
+def record_result(result):
+    """Queue a benchmark result for the sinks and count it in the metrics"""
+    correct = result.get('correct')
+    BENCHMARK_RESULTS.inc(metric_puzzle_type(result.get('puzzle_type')),
+                          'unknown' if correct is None else str(bool(correct)).lower())
+    benchmark_writer.submit(result)
+
 @app.route('/api/benchmark_results', methods=['POST'])
 def record_benchmark():
     data = request.json
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Expected a JSON object'}), 400
+    # These fields are indexed and aggregated on, so they must be plain values
+    for field in ('model', 'session', 'puzzle_type', 'puzzle_id', 'timestamp'):
+        if isinstance(data.get(field), (dict, list)):
+            return jsonify({'error': f'{field} must be a string or number'}), 400
     
     # Add timestamp if not provided
     if 'timestamp' not in data:
-        from datetime import datetime
         data['timestamp'] = datetime.now().isoformat()
+    # Group results by agent session unless the client names one
+    if 'session' not in data:
+        data['session'] = get_session_token()
     
-    # In a real system, you would save this data to a database
-    # For this example, we'll just print it to the console
-    print(f"Benchmark results: {data}")
-    
-    # You could store this in a log file as well
-    with open('benchmark_results.json', 'a') as f:
-        f.write(json.dumps(data) + '\n')
+    app.logger.debug('Benchmark results: %s', data)
+    record_result(data)
     
     return jsonify({'status': 'success'})
 
+@app.route('/api/benchmark_summary', methods=['GET'])
+def get_benchmark_summary():
+    """Per-type accuracy and elapsed_time statistics of the recorded results"""
+    if results_db is None:
+        return jsonify({'error': 'Benchmark summaries require RESULTS_BACKEND=sqlite or both'}), 404
+    
+    # Optional filters: model, session, puzzle_type and a [since, until) timestamp range
+    filters = {key: request.args.get(key) for key in ('model', 'session', 'puzzle_type', 'since', 'until')}
+    return jsonify(results_db.summary(**filters))
+
+@app.route('/api/leaderboard', methods=['GET'])
+def get_leaderboard():
+    """Models ranked by accuracy, with per-type accuracy and solve time statistics"""
+    standings = leaderboard.standings(model=request.args.get('model'),
+                                      puzzle_type=request.args.get('puzzle_type'))
+    return jsonify({'leaderboard': standings})
+
+@app.route('/api/ground_truth_stats', methods=['GET'])
+def get_ground_truth_stats():
+    """Get hit/miss/reload counters of the ground truth cache"""
+    return jsonify(ground_truth_store.stats())
+
+@app.route('/api/asset_cache_stats', methods=['GET'])
+def get_asset_cache_stats():
+    """Get size and hit/miss/eviction counters of the in-memory asset cache"""
+    if asset_store.cache is None:
+        return jsonify({'error': 'Asset cache is disabled'}), 404
+    return jsonify(asset_store.cache.stats())
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus metrics of this server (and of its sibling workers if METRICS_DIR is set)"""
+    return Response(REGISTRY.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@app.route('/api/admin/profile', methods=['GET', 'POST', 'DELETE'])
+def admin_profile():
+    """Start (POST), inspect (GET) or stop (DELETE) a profile capture of this worker process"""
+    if not is_admin():
+        return jsonify({'error': 'Admin token required (set ADMIN_TOKEN and send X-Admin-Token)'}), 403
+    
+    if request.method == 'GET':
+        return jsonify(profiler.capture.info() if profiler.capture else {'active': False})
+    if request.method == 'DELETE':
+        info = profiler.stop()
+        if info is None:
+            return jsonify({'error': 'No profile capture has run'}), 404
+        return jsonify(info)
+    
+    # Capture for `seconds` and/or `requests`, whichever ends first
+    params = request.get_json(silent=True) or request.args
+    try:
+        seconds = float(params['seconds']) if params.get('seconds') is not None else None
+        requests_limit = int(params['requests']) if params.get('requests') is not None else None
+    except (TypeError, ValueError):
+        return jsonify({'error': 'seconds and requests must be numbers'}), 400
+    if seconds is not None and not 0 < seconds <= MAX_PROFILE_SECONDS:
+        return jsonify({'error': f'seconds must be between 0 and {MAX_PROFILE_SECONDS}'}), 400
+    if requests_limit is not None and requests_limit <= 0:
+        return jsonify({'error': 'requests must be positive'}), 400
+    if seconds is None and requests_limit is None:
+        seconds = PROFILE_SIGNAL_SECONDS
+    
+    capture = profiler.start(seconds, requests_limit)
+    if capture is None:
+        return jsonify({'error': 'A profile capture is already running', **profiler.capture.info()}), 409
+    return jsonify(capture.info())
+
+@app.route('/api/reload_catalog', methods=['POST'])
+def reload_catalog_endpoint():
+    """Rescan captcha_data and rebuild the puzzle catalog"""
+    return jsonify(reload_catalog().summary())
+
 @app.route('/api/types', methods=['GET'])
 def get_types():
     """Get available CAPTCHA types"""
@@ -1009,7 +819,11 @@ def get_types():
 if __name__ == '__main__':
     # For local development
     if os.environ.get('DEVELOPMENT'):
+        # Let operators refresh the catalog with `kill -HUP <pid>` without restarting
+        if hasattr(signal, 'SIGHUP'):
+            signal.signal(signal.SIGHUP, lambda signum, frame: reload_catalog())
+        install_profile_signal()
         app.run(debug=True)
     else:
-        # For production on Hugging Face Spaces
-        app.run(host='0.0.0.0', port=7860) 
\ No newline at end of file
+        # run_production_server() returned, so gunicorn doesn't run here (e.g. Windows): use Flask's server
+        app.run(host='0.0.0.0', port=7860)
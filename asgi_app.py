@@ -0,0 +1,166 @@
+"""Asynchronous (ASGI) serving mode for Open CaptchaWorld.
+
+    pip install uvicorn
+    python asgi_app.py
+    # or: gunicorn -c gunicorn.conf.py -k uvicorn.workers.UvicornWorker asgi_app:application
+
+Serves exactly the routes of app.py, but connections are handled by an
+asyncio event loop instead of one worker thread each, so a process can keep
+thousands of agent connections open (idle keep-alive, slow uploads and
+downloads) for the memory of a coroutine each.
+
+Every request runs the Flask view in a pool of ASGI_THREADS threads, so the
+event loop never blocks on a view (file reads, SQLite) and a
+connection only holds a thread while its view runs.
+"""
+import os
+import io
+import sys
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import app as captcha_app
+
+# Threads running views that may block (file reads, SQLite)
+ASGI_THREADS = int(os.environ.get('ASGI_THREADS', 32))
+# Larger request bodies are rejected with 413 before a view runs
+ASGI_MAX_BODY_BYTES = int(os.environ.get('ASGI_MAX_BODY_BYTES', 16 * 1024 * 1024))
+
+executor = ThreadPoolExecutor(max_workers=ASGI_THREADS, thread_name_prefix='asgi')
+
+
+def _latin1(value):
+    # WSGI carries bytes as latin-1 strings (PEP 3333)
+    return value.encode('utf-8').decode('latin-1')
+
+
+def build_environ(scope, body):
+    """WSGI environ of an ASGI HTTP request"""
+    root_path = scope.get('root_path', '')
+    path = scope['path']
+    if root_path and path.startswith(root_path):
+        path = path[len(root_path):]
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': _latin1(root_path),
+        'PATH_INFO': _latin1(path),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': str(server[0]),
+        'SERVER_PORT': str(server[1]) if server[1] is not None else '80',
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        # The body is already buffered, so its length is always known
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name == 'CONTENT_LENGTH':
+            continue
+        if name == 'CONTENT_TYPE':
+            environ[name] = value
+            continue
+        key = f'HTTP_{name}'
+        environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+
+def call_wsgi(wsgi_app, environ):
+    """Run a WSGI app to completion: (status code, [(name, value), ...], body)"""
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started['status'] = int(status.split(' ', 1)[0])
+        started['headers'] = [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                              for name, value in headers]
+
+    result = wsgi_app(environ, start_response)
+    try:
+        body = b''.join(result)
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+    return started['status'], started['headers'], body
+
+
+async def read_body(receive):
+    """The request body, or None if it exceeds ASGI_MAX_BODY_BYTES"""
+    chunks = []
+    size = 0
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return b''.join(chunks)
+        chunk = message.get('body', b'')
+        size += len(chunk)
+        if size > ASGI_MAX_BODY_BYTES:
+            return None
+        chunks.append(chunk)
+        if not message.get('more_body', False):
+            return b''.join(chunks)
+
+
+async def send_response(send, status, headers, body):
+    await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            # Write out queued benchmark results before the process exits
+            await asyncio.get_running_loop().run_in_executor(executor, captcha_app.benchmark_writer.close)
+            executor.shutdown(wait=False)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    """ASGI 3 entry point wrapping app.app"""
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+    if scope['type'] != 'http':
+        raise ValueError(f"Unsupported ASGI scope type: {scope['type']}")
+
+    body = await read_body(receive)
+    if body is None:
+        return await send_response(send, 413, [(b'content-type', b'application/json')],
+                                   b'{"error": "Request body too large"}')
+
+    environ = build_environ(scope, body)
+    status, headers, response_body = await asyncio.get_running_loop().run_in_executor(
+        executor, call_wsgi, captcha_app.app.wsgi_app, environ)
+    await send_response(send, status, headers, response_body)
+
+
+def main():
+    try:
+        import uvicorn
+    except ImportError:
+        sys.exit('The ASGI serving mode needs an ASGI server: pip install uvicorn')
+    workers = int(os.environ.get('WEB_CONCURRENCY', 1))
+    # Workers only see each other's sampling state and metrics through shared files
+    if workers > 1:
+        os.environ.setdefault('SESSION_BACKEND', 'sqlite')
+        os.environ.setdefault('METRICS_DIR', 'metrics_data')
+    uvicorn.run('asgi_app:application', host=os.environ.get('HOST', '0.0.0.0'),
+                port=int(os.environ.get('PORT', 7860)), workers=workers,
+                backlog=int(os.environ.get('ASGI_BACKLOG', 2048)),
+                timeout_keep_alive=int(os.environ.get('ASGI_KEEPALIVE', 5)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,232 @@
+"""Content-addressed access to the images in captcha_data.
+
+Every asset is identified by the SHA-256 of its bytes. Digests are computed
+the first time an asset is needed and cached by the file's (mtime_ns, size),
+so a changed file gets a new digest while unchanged files are hashed once.
+A dataset pack already stores every digest, so nothing is hashed at all.
+The reverse index lets clients fetch any asset by digest alone.
+
+An optional AssetCache keeps the bytes (and digests) of recently served
+assets in memory, bounded by total size, so serving the hot set does no
+filesystem work at all. Cached entries are trusted until the cache is
+invalidated, which happens whenever the catalog is reloaded.
+
+Several assets can be sent in one response as a packed bundle:
+
+    4 bytes   big-endian length N of the manifest
+    N bytes   JSON manifest: {"assets": [{"url", "sha256", "content_type",
+              "offset", "length"}, ...]}, offsets relative to the end of it
+    ...       the asset bytes, back to back
+
+or as a standard multipart/mixed body with one part per asset.
+"""
+import json
+import struct
+import hashlib
+import mimetypes
+import threading
+from collections import OrderedDict
+
+from dataset_source import open_source
+
+
+class AssetCache:
+    """LRU cache of asset bytes, bounded by their total size"""
+
+    def __init__(self, max_bytes=128 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        # key -> (digest, bytes), least recently used first
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, digest, data):
+        # Assets larger than the whole cache are never kept
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old[1])
+            self._entries[key] = (digest, data)
+            self.size += len(data)
+            while self.size > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+                self.evictions += 1
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'bytes': self.size,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
+
+
+class AssetStore:
+    """Hashes and reads the asset files of a data directory or dataset pack"""
+
+    def __init__(self, base_dir='captcha_data', cache=None):
+        self.source = open_source(base_dir)
+        self.base_dir = self.source.base_dir
+        # Optional AssetCache of recently loaded assets
+        self.cache = cache
+        # (type, relative path) -> (signature, digest)
+        self._digests = {}
+        # digest -> (type, relative path)
+        self._paths = {}
+        self._lock = threading.Lock()
+
+    def read(self, puzzle_type, relpath):
+        return self.load(puzzle_type, relpath)[1]
+
+    def load(self, puzzle_type, relpath):
+        """(digest, bytes) of an asset, from the cache or by reading the file once"""
+        key = (puzzle_type, relpath)
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+        digest, data = self._load_file(puzzle_type, relpath)
+        if self.cache is not None:
+            self.cache.put(key, digest, data)
+        return digest, data
+
+    def _remember(self, key, signature, digest):
+        with self._lock:
+            self._digests[key] = (signature, digest)
+            self._paths[digest] = key
+
+    def _load_file(self, puzzle_type, relpath):
+        signature, data = self.source.read(f'{puzzle_type}/{relpath}')
+        key = (puzzle_type, relpath)
+        cached = self._digests.get(key)
+        if cached is not None and cached[0] == signature:
+            return cached[1], data
+        digest = self.source.digest(f'{puzzle_type}/{relpath}') or hashlib.sha256(data).hexdigest()
+        self._remember(key, signature, digest)
+        return digest, data
+
+    def digest(self, puzzle_type, relpath):
+        """SHA-256 hex digest of an asset, or None if the file does not exist"""
+        path = f'{puzzle_type}/{relpath}'
+        signature = self.source.signature(path)
+        if signature is None:
+            return None
+        key = (puzzle_type, relpath)
+        cached = self._digests.get(key)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+
+        digest = self.source.digest(path)
+        if digest is None:
+            try:
+                signature, data = self.source.read(path)
+            except OSError:
+                return None
+            digest = hashlib.sha256(data).hexdigest()
+        self._remember(key, signature, digest)
+        return digest
+
+    def warm(self, assets):
+        """Load [(type, relative path), ...] into the cache until it is full"""
+        if self.cache is None:
+            return 0
+        loaded = 0
+        for puzzle_type, relpath in assets:
+            if (puzzle_type, relpath) in self.cache:
+                continue
+            try:
+                digest, data = self._load_file(puzzle_type, relpath)
+            except OSError:
+                continue
+            if self.cache.size + len(data) > self.cache.max_bytes:
+                break
+            self.cache.put((puzzle_type, relpath), digest, data)
+            loaded += 1
+        return loaded
+
+    def invalidate(self):
+        """Forget cached bytes, e.g. after the data directory changed"""
+        if self.cache is not None:
+            self.cache.clear()
+
+    def lookup(self, digest):
+        """(type, relative path) of an asset by digest, None if no such asset was hashed"""
+        key = self._paths.get(digest)
+        # The file may have changed since it was hashed
+        if key is None or self.digest(*key) != digest:
+            return None
+        return key
+
+    @staticmethod
+    def content_type(relpath):
+        return mimetypes.guess_type(relpath)[0] or 'application/octet-stream'
+
+
+def asset_url(puzzle_type, relpath):
+    """URL of an asset under /captcha_data, as used in get_puzzle responses"""
+    return f'/captcha_data/{puzzle_type}/{relpath}'
+
+
+def pack_bundle(assets):
+    """Pack [(url, sha256, content_type, data), ...] into one bundle (see module docstring)"""
+    manifest = []
+    offset = 0
+    for url, digest, content_type, data in assets:
+        manifest.append({'url': url, 'sha256': digest, 'content_type': content_type,
+                         'offset': offset, 'length': len(data)})
+        offset += len(data)
+    header = json.dumps({'assets': manifest}, separators=(',', ':')).encode('utf-8')
+    return b''.join([struct.pack('>I', len(header)), header] + [data for _, _, _, data in assets])
+
+
+def unpack_bundle(bundle):
+    """Inverse of pack_bundle: returns {url: (content_type, data)}"""
+    (header_length,) = struct.unpack_from('>I', bundle)
+    start = 4 + header_length
+    manifest = json.loads(bundle[4:start])
+    return {asset['url']: (asset['content_type'],
+                           bundle[start + asset['offset']:start + asset['offset'] + asset['length']])
+            for asset in manifest['assets']}
+
+
+def multipart_bundle(assets, boundary):
+    """Encode [(url, sha256, content_type, data), ...] as a multipart/mixed body"""
+    parts = []
+    for url, digest, content_type, data in assets:
+        parts.append(f'--{boundary}\r\n'
+                     f'Content-Type: {content_type}\r\n'
+                     f'Content-Location: {url}\r\n'
+                     f'Content-Length: {len(data)}\r\n'
+                     f'ETag: "{digest}"\r\n\r\n'.encode('utf-8'))
+        parts.append(data)
+        parts.append(b'\r\n')
+    parts.append(f'--{boundary}--\r\n'.encode('utf-8'))
+    return b''.join(parts)
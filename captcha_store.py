@@ -0,0 +1,678 @@
+import os
+import json
+import time
+import threading
+
+from assets import asset_url
+from dataset_source import open_source
+from metrics import REGISTRY
+from checkers import build_checkers
+from sampling import PuzzleSampler
+
+
+GROUND_TRUTH_LOAD_DURATION = REGISTRY.histogram('captcha_ground_truth_load_duration_seconds',
+                                                'Time to read and parse a ground_truth.json file',
+                                                ('puzzle_type',))
+
+
+class GroundTruthStore:
+    """Process-wide cache of parsed ground_truth.json files, one entry per CAPTCHA type.
+
+    A type is parsed the first time it is requested and kept in memory. Later
+    requests only check the file's signature (mtime and size, or its pack
+    index entry) and re-parse it when that changed.
+
+    `base_dir` is a data directory, a dataset pack file or an already opened
+    dataset source (see dataset_source.py).
+    """
+
+    def __init__(self, base_dir='captcha_data'):
+        self.source = open_source(base_dir)
+        self.base_dir = self.source.base_dir
+        # captcha_type -> (signature, parsed ground truth)
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+
+    @staticmethod
+    def path_for(captcha_type):
+        """Path of a type's ground truth inside the dataset"""
+        return f'{captcha_type}/ground_truth.json'
+
+    def get(self, captcha_type):
+        """Return the ground truth dict for a type, or {} if it is missing or invalid"""
+        path = self.path_for(captcha_type)
+        signature = self.source.signature(path)
+        if signature is None:
+            # File was removed (or never existed), forget any cached copy
+            self._entries.pop(captcha_type, None)
+            return {}
+
+        entry = self._entries.get(captcha_type)
+        if entry is not None and entry[0] == signature:
+            self.hits += 1
+            return entry[1]
+
+        with self._lock:
+            # Another thread may have reloaded the file while we waited for the lock
+            entry = self._entries.get(captcha_type)
+            if entry is not None and entry[0] == signature:
+                self.hits += 1
+                return entry[1]
+
+            started = time.perf_counter()
+            try:
+                signature, raw = self.source.read(path)
+                data = json.loads(raw)
+            except (OSError, ValueError):
+                data = {}
+            GROUND_TRUTH_LOAD_DURATION.observe(time.perf_counter() - started, captcha_type)
+
+            if entry is None:
+                self.misses += 1
+            else:
+                self.reloads += 1
+            self._entries[captcha_type] = (signature, data)
+            return data
+
+    def types(self):
+        """List the CAPTCHA types (subdirectories) of the dataset"""
+        return self.source.types()
+
+    def load_all(self):
+        """Return {type: ground truth} for every type in the data directory"""
+        return {captcha_type: self.get(captcha_type) for captcha_type in self.types()}
+
+    def invalidate(self, captcha_type=None):
+        """Drop one cached type, or every cached type when none is given"""
+        with self._lock:
+            if captcha_type is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(captcha_type, None)
+
+    def stats(self):
+        return {
+            'cached_types': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'reloads': self.reloads
+        }
+
+
+# Hex digits of the content digest used as an asset URL's version
+ASSET_VERSION_LENGTH = 16
+
+# Ground truth fields that name a single image inside the type directory
+IMAGE_FIELDS = ('reference_image', 'component_image', 'order_image')
+# Ground truth fields that hold a list of images inside the type directory
+IMAGE_LIST_FIELDS = ('option_images', 'options')
+
+
+def puzzle_assets(puzzle_type, puzzle_id, entry):
+    """Return the image paths a puzzle needs, relative to its type directory.
+
+    The first element is the main puzzle image (None for types without one).
+    """
+    if puzzle_type == 'Rotation_Match':
+        main_image = None
+    elif puzzle_type == 'Image_Recognition':
+        # The puzzle ID names a subfolder of grid images rather than a file
+        main_image = None
+    else:
+        main_image = puzzle_id
+
+    assets = [main_image]
+    for field in IMAGE_FIELDS:
+        if entry.get(field):
+            assets.append(entry[field])
+    for field in IMAGE_LIST_FIELDS:
+        value = entry.get(field)
+        if isinstance(value, list):
+            assets.extend(img for img in value if isinstance(img, str))
+
+    if puzzle_type == 'Rotation_Match' and entry.get('object_base_image'):
+        object_base = os.path.splitext(entry['object_base_image'])[0]
+        assets.append(f'{object_base}_0.png')
+    elif puzzle_type == 'Image_Recognition':
+        subfolder = entry.get('subfolder', puzzle_id)
+        assets.extend(f'{subfolder}/{img}' for img in entry.get('images', []))
+    return assets
+
+
+class CaptchaCatalog:
+    """Snapshot of every CAPTCHA type, its puzzle IDs and its ground truth.
+
+    Built once at startup (and on explicit reloads) so that serving a puzzle
+    does no filesystem work. A catalog is never mutated after it is built;
+    reloading builds a new one.
+    """
+
+    def __init__(self, base_dir, types, ground_truth, puzzle_ids, missing_assets, rotation_frames=None,
+                 asset_versions=None, rotation_objects=None):
+        self.base_dir = base_dir
+        self.types = types
+        self.type_set = frozenset(types)
+        self.ground_truth = ground_truth
+        self.puzzle_ids = puzzle_ids
+        self.missing_assets = missing_assets
+        # Rotation_Match object base -> every `<base>_<angle>.png` frame on disk, by angle
+        self.rotation_frames = rotation_frames or {}
+        # Rotation_Match object base -> its object image, from which any angle can be rendered
+        self.rotation_objects = rotation_objects or {}
+        # Asset URL -> content digest, appended to the URLs in get_puzzle responses as ?v=
+        self.asset_versions = asset_versions or {}
+        # One answer checker per type, see checkers.py
+        self.checkers = build_checkers(ground_truth)
+        # Shuffled puzzle orders for sampling without replacement, see sampling.py
+        self.sampler = PuzzleSampler(puzzle_ids)
+        # Serialized /api/get_puzzle responses: type -> puzzle_id -> (JSON bytes, status)
+        self.responses = {
+            puzzle_type: {puzzle_id: self._render_response(puzzle_type, puzzle_id)
+                          for puzzle_id in ids}
+            for puzzle_type, ids in puzzle_ids.items()
+        }
+
+    @classmethod
+    def build(cls, store, asset_store=None):
+        """Scan the data directory through a GroundTruthStore and index every puzzle.
+
+        With an AssetStore, every referenced image is hashed so that responses
+        can use content-versioned URLs (unchanged files are not re-hashed).
+        """
+        base_dir = store.base_dir
+        types = store.types()
+        ground_truth = {}
+        puzzle_ids = {}
+        missing_assets = {}
+        rotation_frames = {}
+        rotation_objects = {}
+        asset_versions = {}
+        for captcha_type in types:
+            data = store.get(captcha_type)
+            ground_truth[captcha_type] = data
+
+            # List each directory once instead of stat-ing every referenced file
+            listings = {'': store.source.listdir(captcha_type) or set()}
+            valid_ids = []
+            for puzzle_id, entry in data.items():
+                if not isinstance(entry, dict):
+                    missing_assets[f'{captcha_type}/{puzzle_id}'] = ['<invalid ground truth entry>']
+                    continue
+                missing = []
+                for asset in puzzle_assets(captcha_type, puzzle_id, entry):
+                    if asset is None:
+                        continue
+                    subdir, _, filename = asset.rpartition('/')
+                    if subdir not in listings:
+                        listings[subdir] = store.source.listdir(f'{captcha_type}/{subdir}') or set()
+                    if filename not in listings[subdir]:
+                        missing.append(asset)
+                if captcha_type == 'Rotation_Match' and entry.get('object_base_image') in listings['']:
+                    # Missing rotation frames are rendered from the object image on demand
+                    object_base = os.path.splitext(entry['object_base_image'])[0]
+                    rotation_objects[object_base] = entry['object_base_image']
+                    missing = [asset for asset in missing if not is_rotation_frame(asset, object_base)]
+                if missing:
+                    missing_assets[f'{captcha_type}/{puzzle_id}'] = missing
+                    continue
+                valid_ids.append(puzzle_id)
+                if asset_store is not None:
+                    for asset in puzzle_assets(captcha_type, puzzle_id, entry):
+                        url = asset_url(captcha_type, asset) if asset else None
+                        if asset and url not in asset_versions:
+                            asset_versions[url] = asset_store.digest(captcha_type, asset)
+            puzzle_ids[captcha_type] = valid_ids
+
+            if captcha_type == 'Rotation_Match':
+                rotation_frames.update(_rotation_frames(listings['']))
+
+        return cls(base_dir, types, ground_truth, puzzle_ids, missing_assets, rotation_frames,
+                   asset_versions, rotation_objects)
+
+    def _render_response(self, puzzle_type, puzzle_id):
+        payload, status = build_puzzle_payload(puzzle_type, puzzle_id,
+                                               self.ground_truth[puzzle_type][puzzle_id])
+        if self.asset_versions and status == 200:
+            payload = self.versioned_payload(payload)
+        # Same bytes as jsonify() produces outside of debug mode
+        body = json.dumps(payload, separators=(',', ':'), sort_keys=True).encode('utf-8') + b'\n'
+        return body, status
+
+    def versioned_url(self, url):
+        """Append the asset's content version to its URL (unknown URLs are returned as is)"""
+        digest = self.asset_versions.get(url)
+        return f'{url}?v={digest[:ASSET_VERSION_LENGTH]}' if digest else url
+
+    def versioned_payload(self, payload):
+        """Replace the asset URLs in a get_puzzle payload by content-versioned ones"""
+        versioned = {}
+        for key, value in payload.items():
+            if isinstance(value, str):
+                value = self.versioned_url(value)
+            elif isinstance(value, list):
+                value = [self.versioned_url(item) if isinstance(item, str) else item for item in value]
+            versioned[key] = value
+        return versioned
+
+    def puzzle_response(self, puzzle_type, puzzle_id):
+        """Return the serialized get_puzzle response (bytes, status) for a puzzle"""
+        cached = self.responses.get(puzzle_type, {}).get(puzzle_id)
+        if cached is not None:
+            return cached
+        # Puzzles left out of sampling (e.g. missing images) can still be requested by episodes
+        return self._render_response(puzzle_type, puzzle_id)
+
+    def bundle_assets(self, puzzle_type, puzzle_id):
+        """Every image a client needs to render a puzzle, relative to its type directory.
+
+        Like puzzle_assets(), plus all rotation frames of a Rotation_Match object
+        (or, if it has none on disk, the object image they are rendered from).
+        """
+        entry = self.ground_truth[puzzle_type][puzzle_id]
+        assets = [asset for asset in puzzle_assets(puzzle_type, puzzle_id, entry) if asset is not None]
+        if puzzle_type == 'Rotation_Match' and entry.get('object_base_image'):
+            object_base = os.path.splitext(entry['object_base_image'])[0]
+            frames = self.rotation_frames.get(object_base, [])
+            assets = [asset for asset in assets if not is_rotation_frame(asset, object_base)]
+            assets.extend(frames or [self.rotation_objects.get(object_base, entry['object_base_image'])])
+        return assets
+
+    def summary(self):
+        return {
+            'types': {t: len(self.puzzle_ids[t]) for t in self.types},
+            'total_puzzles': sum(len(ids) for ids in self.puzzle_ids.values()),
+            'missing_assets': self.missing_assets
+        }
+
+
+def parse_rotation_frame(filename):
+    """Split `<object_base>_<angle>.png` into (object_base, angle), None for other names"""
+    stem, ext = os.path.splitext(filename)
+    object_base, _, angle = stem.rpartition('_')
+    # ASCII digits only: isdigit() also accepts characters like '²' that int() rejects
+    digits = angle[1:] if angle.startswith('-') else angle
+    if ext == '.png' and object_base and digits.isascii() and digits.isdecimal():
+        return object_base, int(angle)
+    return None
+
+
+def is_rotation_frame(filename, object_base):
+    frame = parse_rotation_frame(filename)
+    return frame is not None and frame[0] == object_base
+
+
+def _rotation_frames(filenames):
+    """Group `<base>_<angle>.png` files by base, each list ordered by angle"""
+    frames = {}
+    for filename in filenames:
+        frame = parse_rotation_frame(filename)
+        if frame is not None:
+            object_base, angle = frame
+            frames.setdefault(object_base, []).append((angle, filename))
+    return {object_base: [filename for _, filename in sorted(angles)]
+            for object_base, angles in frames.items()}
+
+
+def build_puzzle_payload(puzzle_type, selected_puzzle, entry):
+    """Build the /api/get_puzzle response for one puzzle, returns (payload, status)"""
+    # Get the appropriate question prompt based on puzzle type
+    if puzzle_type == "Dice_Count":
+        prompt = entry.get('prompt', "Sum up the numbers on all the dice")
+    elif puzzle_type == "Geometry_Click":
+        prompt = entry.get("question", "Click on the geometric shape")
+    elif puzzle_type == "Rotation_Match":
+        prompt = entry.get("prompt", "Use the arrows to rotate the object to match the reference direction")
+    elif puzzle_type == "Slide_Puzzle":
+        prompt = entry.get("prompt", "Drag the slider component to the correct position")
+    elif puzzle_type == "Unusual_Detection":
+        prompt = entry.get("prompt", "Select the unusual items in the image")
+    elif puzzle_type == "Image_Recognition":
+        prompt = entry.get("prompt", "Select all images matching the description")
+    elif puzzle_type == "Bingo":
+        prompt = entry.get("prompt", "Please click two images to exchange their position to line up the same images to a line")
+    elif puzzle_type == "Image_Matching":
+        prompt = entry.get("prompt", "Using the arrows, match the animal in the left and right image.")
+    elif puzzle_type == "Patch_Select":
+        prompt = entry.get("prompt", "Select all squares with the specified objects")
+    elif puzzle_type == "Dart_Count":
+        prompt = entry.get("prompt", "Use the arrows to pick the image where all the darts add up to the number in the left image.")
+    elif puzzle_type == "Object_Match":
+        prompt = entry.get("prompt", "Use the arrows to change the number of objects until it matches the left image.")
+    elif puzzle_type == "Select_Animal":
+        prompt = entry.get("prompt", "Pick a fox")
+    elif puzzle_type == "Coordinates":
+        prompt = entry.get("prompt", "Using the arrows, move Jerry to the indicated seat")
+    elif puzzle_type == "Path_Finder":
+        prompt = entry.get("prompt", "Use the arrows to move the duck to the spot indicated by the cross")
+    elif puzzle_type == "Place_Dot":
+        prompt = entry.get("prompt", "Click to place a Dot at the end of the car's path")
+    elif puzzle_type == "Connect_icon":
+        prompt = entry.get("prompt", "Using the arrows, connect the same two icons with the dotted line as shown on the left.")
+    elif puzzle_type == "Click_Order":
+        prompt = entry.get("prompt", "Click the icons in order as shown in the reference image.")
+    elif puzzle_type == "Hold_Button":
+        prompt = entry.get("prompt", "Hold the button until it finishes loading.")
+    elif puzzle_type == "Misleading_Click":
+        prompt = entry.get("prompt", "Click the image to continue.")
+    elif puzzle_type == "Pick_Area":
+        prompt = entry.get("prompt", "Click on the largest area outlined by the dotted line")
+    else:
+        prompt = entry.get("prompt", "Solve the CAPTCHA puzzle")
+
+    # Add input_type to tell the frontend what kind of input to show
+    input_type = "text"
+    if puzzle_type == "Dice_Count":
+        input_type = "number"
+    elif puzzle_type == "Geometry_Click":
+        input_type = "click"
+    elif puzzle_type == "Rotation_Match":
+        input_type = "rotation"
+    elif puzzle_type == "Slide_Puzzle":
+        input_type = "slide"
+    elif puzzle_type == "Unusual_Detection":
+        input_type = "multiselect"
+    elif puzzle_type == "Image_Recognition":
+        input_type = "image_grid"
+    elif puzzle_type == "Bingo":
+        input_type = "bingo_swap"
+    elif puzzle_type == "Image_Matching":
+        input_type = "image_matching"
+    elif puzzle_type == "Patch_Select":
+        input_type = "patch_select"
+    elif puzzle_type == "Dart_Count":
+        input_type = "dart_count"
+    elif puzzle_type == "Object_Match":
+        input_type = "object_match"
+    elif puzzle_type == "Select_Animal":
+        input_type = "select_animal"
+    elif puzzle_type == "Coordinates":
+        input_type = "image_matching"
+    elif puzzle_type == "Path_Finder":
+        input_type = "image_matching"
+    elif puzzle_type == "Place_Dot":
+        input_type = "place_dot"
+    elif puzzle_type == "Connect_icon":
+        input_type = "connect_icon"
+    elif puzzle_type == "Click_Order":
+        input_type = "click_order"
+    elif puzzle_type == "Hold_Button":
+        input_type = "hold_button"
+    elif puzzle_type == "Misleading_Click":
+        input_type = "click"
+    elif puzzle_type == "Pick_Area":
+        input_type = "click"
+
+    # For Rotation_Match, include additional data needed for the interface
+    additional_data = {}
+    if puzzle_type == "Rotation_Match":
+        # Get reference image and object base name
+        reference_image = entry.get("reference_image")
+        object_base_image = entry.get("object_base_image")
+
+        if not reference_image or not object_base_image:
+            # If missing required fields, try another puzzle or fall back
+            return {'error': f'Invalid rotation puzzle data: {selected_puzzle}'}, 500
+
+        # Format paths for these images
+        ref_path = f'/captcha_data/{puzzle_type}/{reference_image}'
+
+        # Get object base name without extension to construct rotated image paths
+        object_base = os.path.splitext(object_base_image)[0]
+
+        # Construct the initial object image path (0 degrees rotation)
+        object_path = f'/captcha_data/{puzzle_type}/{object_base}_0.png'
+
+        additional_data = {
+            "reference_image": ref_path,
+            "object_image": object_path,
+            "object_base": object_base,
+            "current_angle": 0
+        }
+    # For Slide_Puzzle, include the component image path and target position data
+    elif puzzle_type == "Slide_Puzzle":
+        # Get component image name
+        component_image = entry.get("component_image")
+
+        if not component_image:
+            # If missing required fields, try another puzzle or fall back
+            return {'error': f'Invalid slide puzzle data: {selected_puzzle}'}, 500
+
+        # Format path for the component image
+        component_path = f'/captcha_data/{puzzle_type}/{component_image}'
+
+        additional_data = {
+            "component_image": component_path,
+            "background_image": f'/captcha_data/{puzzle_type}/{selected_puzzle}'
+        }
+    # For Unusual_Detection, include the grid size
+    elif puzzle_type == "Unusual_Detection":
+        # Get grid size from ground truth
+        grid_size = entry.get("grid_size", [2, 3])  # Default to 2x3 grid if not specified
+
+        additional_data = {
+            "grid_size": grid_size
+        }
+    # For Image_Recognition, include the grid images
+    elif puzzle_type == "Image_Recognition":
+        # Get images array from ground truth
+        images = entry.get("images", [])
+        grid_size = [3, 3]  # Default grid size for image recognition (3x3)
+
+        # Get the subfolder name from the puzzle_id or use a specific subfolder field
+        subfolder = entry.get("subfolder", selected_puzzle)
+
+        # Include image paths in response - dynamically use the subfolder
+        image_paths = [f'/captcha_data/{puzzle_type}/{subfolder}/{img}' for img in images]
+
+        additional_data = {
+            "images": image_paths,
+            "grid_size": grid_size,
+            "question": entry.get("question", "Select matching images")
+        }
+    # For Bingo, include the grid size
+    elif puzzle_type == "Bingo":
+        # Get grid size from ground truth
+        grid_size = entry.get("grid_size", [3, 3])  # Default to 3x3 grid if not specified
+
+        additional_data = {
+            "grid_size": grid_size,
+            "solution_line": entry.get("solution_line", {}),
+            "answer": entry.get("answer", [])
+        }
+    # For Image_Matching, include the reference image and options
+    elif puzzle_type == "Image_Matching":
+        # Get the reference image and option images
+        reference_image = entry.get("reference_image")
+        option_images = entry.get("option_images", [])
+        correct_option_index = entry.get("correct_option_index", 0)
+
+        if not reference_image or not option_images:
+            return {'error': f'Invalid image matching data: {selected_puzzle}'}, 500
+
+        # Format paths for these images
+        ref_path = f'/captcha_data/{puzzle_type}/{reference_image}'
+        option_paths = [f'/captcha_data/{puzzle_type}/{img}' for img in option_images]
+
+        additional_data = {
+            "reference_image": ref_path,
+            "option_images": option_paths,
+            "current_option_index": 0,
+            "correct_option_index": correct_option_index
+        }
+    # For Patch_Select, include the grid size and target object
+    elif puzzle_type == "Patch_Select":
+        # Get grid size from ground truth, default to 6x6 grid
+        grid_size = entry.get("grid_size", [5, 5])
+        target_object = entry.get("target_object", "moon")
+        correct_patches = entry.get("correct_patches", [])
+
+        additional_data = {
+            "grid_size": grid_size,
+            "target_object": target_object,
+            "correct_patches": correct_patches
+        }
+    # For Dart_Count, include the reference image and options
+    elif puzzle_type == "Dart_Count":
+        # Get the reference image and option images
+        reference_image = entry.get("reference_image")
+        option_images = entry.get("option_images", [])
+        correct_option_index = entry.get("correct_option_index", 0)
+        reference_number = entry.get("reference_number", 0)
+
+        if not reference_image or not option_images:
+            return {'error': f'Invalid dart count data: {selected_puzzle}'}, 500
+
+        # Format paths for these images
+        ref_path = f'/captcha_data/{puzzle_type}/{reference_image}'
+        option_paths = [f'/captcha_data/{puzzle_type}/{img}' for img in option_images]
+
+        additional_data = {
+            "reference_image": ref_path,
+            "option_images": option_paths,
+            "current_option_index": 0,
+            "correct_option_index": correct_option_index,
+            "reference_number": reference_number
+        }
+    # For Object_Match, include the reference image and options
+    elif puzzle_type == "Object_Match":
+        # Get the reference image and option images
+        reference_image = entry.get("reference_image")
+        option_images = entry.get("option_images", [])
+        correct_option_index = entry.get("correct_option_index", 0)
+
+        if not reference_image or not option_images:
+            return {'error': f'Invalid object match data: {selected_puzzle}'}, 500
+
+        # Format paths for these images
+        ref_path = f'/captcha_data/{puzzle_type}/{reference_image}'
+        option_paths = [f'/captcha_data/{puzzle_type}/{img}' for img in option_images]
+
+        additional_data = {
+            "reference_image": ref_path,
+            "option_images": option_paths,
+            "current_option_index": 0,
+            "correct_option_index": correct_option_index
+        }
+    # For Select_Animal, include the grid size and target object
+    elif puzzle_type == "Select_Animal":
+        # Get grid size from ground truth, default to 2x3 grid
+        grid_size = entry.get("grid_size", [2, 3])
+        target_object = entry.get("target_object", "fox")
+        correct_patches = entry.get("correct_patches", [])
+
+        additional_data = {
+            "grid_size": grid_size,
+            "target_object": target_object,
+            "correct_patches": correct_patches
+        }
+    # For Coordinates, include the reference image and options
+    elif puzzle_type == "Coordinates":
+        # Get the reference image and option images
+        reference_image = entry.get("reference_image")
+        option_images = entry.get("option_images", [])
+        correct_option_index = entry.get("correct_option_index", 0)
+
+        if not reference_image or not option_images:
+            return {'error': f'Invalid coordinates data: {selected_puzzle}'}, 500
+
+        # Format paths for these images
+        ref_path = f'/captcha_data/{puzzle_type}/{reference_image}'
+        option_paths = [f'/captcha_data/{puzzle_type}/{img}' for img in option_images]
+
+        additional_data = {
+            "reference_image": ref_path,
+            "option_images": option_paths,
+            "current_option_index": 0,
+            "correct_option_index": correct_option_index
+        }
+    # For Path_Finder, include the reference image and options
+    elif puzzle_type == "Path_Finder":
+        # Get the reference image and option images
+        reference_image = entry.get("reference_image")
+        options = entry.get("options", [])
+        correct_option = entry.get("correct_option", 0)
+
+        if not reference_image or not options:
+            return {'error': f'Invalid path finder data: {selected_puzzle}'}, 500
+
+        # Format paths for these images
+        ref_path = f'/captcha_data/{puzzle_type}/{reference_image}'
+        option_paths = [f'/captcha_data/{puzzle_type}/{img}' for img in options]
+
+        additional_data = {
+            "reference_image": ref_path,
+            "option_images": option_paths,
+            "current_option_index": 0,
+            "correct_option_index": correct_option
+        }
+    # For Connect_icon, include the reference image and options
+    elif puzzle_type == "Connect_icon":
+        # Get the reference image and option images
+        reference_image = entry.get("reference_image")
+        options = entry.get("options", [])
+        correct_option = entry.get("correct_option", 0)
+
+        if not reference_image or not options:
+            return {'error': f'Invalid connect icons data: {selected_puzzle}'}, 500
+
+        # Format paths for these images
+        ref_path = f'/captcha_data/{puzzle_type}/{reference_image}'
+        option_paths = [f'/captcha_data/{puzzle_type}/{img}' for img in options]
+
+        additional_data = {
+            "reference_image": ref_path,
+            "option_images": option_paths,
+            "current_option_index": 0,
+            "correct_option_index": correct_option
+        }
+    # For Click_Order, include the order image path
+    elif puzzle_type == "Click_Order":
+        # Get the order image from ground truth
+        order_image = entry.get("order_image")
+
+        if not order_image:
+            return {'error': f'Invalid click order data: {selected_puzzle}'}, 500
+
+        # Format path for the order image
+        order_path = f'/captcha_data/{puzzle_type}/{order_image}'
+
+        additional_data = {
+            "order_image": order_path,
+            "tolerance": entry.get("tolerance", 20)
+        }
+    # For Hold_Button, include the hold time
+    elif puzzle_type == "Hold_Button":
+        # Get the required hold time from ground truth
+        hold_time = entry.get("hold_time", 3)  # Default to 3 seconds if not specified
+
+        additional_data = {
+            "hold_time": hold_time
+        }
+    # For Misleading_Click, include the area to avoid
+    elif puzzle_type == "Misleading_Click":
+        # Get the area to avoid from ground truth
+        avoid_area = entry.get("avoid_area", {"x": 0, "y": 0, "width": 0, "height": 0})
+
+        additional_data = {
+            "avoid_area": avoid_area
+        }
+    else:
+        prompt = entry.get("prompt", "Solve the CAPTCHA puzzle")
+
+    response_data = {
+        'puzzle_type': puzzle_type,
+        'image_path': f'/captcha_data/{puzzle_type}/{selected_puzzle}' if puzzle_type != "Rotation_Match" else None,
+        'puzzle_id': selected_puzzle,
+        'prompt': prompt,
+        'input_type': input_type,
+        'debug_info': f"Type: {puzzle_type}, Input: {input_type}, Puzzle: {selected_puzzle}"
+    }
+
+    # Add any additional data for specific puzzle types
+    if additional_data:
+        response_data.update(additional_data)
+
+    return response_data, 200
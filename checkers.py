@@ -0,0 +1,334 @@
+"""Answer checkers for every CAPTCHA type.
+
+Each checker is bound to the ground truth of one type and precomputes what it
+needs per puzzle (correct sets, area bounds, tolerances, ...), so checking an
+answer is a dict lookup plus a comparison. Checkers do not depend on Flask and
+can be used directly for offline scoring:
+
+    checkers = build_checkers(catalog.ground_truth)
+    result = checkers['Dice_Count'].check('dice1.png', 7)
+"""
+import math
+from functools import partial
+
+
+class InvalidAnswer(ValueError):
+    """The answer (or the puzzle's ground truth) has the wrong shape for its type"""
+
+
+class UnknownPuzzle(LookupError):
+    """The puzzle ID is not part of the checker's ground truth"""
+
+
+# Marker for puzzles whose ground truth could not be preprocessed
+_MALFORMED = object()
+
+
+def _area_bounds(area):
+    # Area is given as [[min_x, min_y], [max_x, max_y]]
+    top_left, bottom_right = area
+    min_x, min_y = top_left
+    max_x, max_y = bottom_right
+    return min_x, min_y, max_x, max_y
+
+
+class AnswerChecker:
+    """Base class: checks answers for one CAPTCHA type against its ground truth"""
+
+    # Ground truth field returned to the client as the correct answer
+    answer_key = 'answer'
+    # Exceptions raised by malformed answers, reported as InvalidAnswer
+    answer_errors = (ValueError, TypeError)
+
+    def __init__(self, puzzle_type, ground_truth, answer_key=None, error_message=None):
+        self.puzzle_type = puzzle_type
+        self.ground_truth = ground_truth
+        if answer_key is not None:
+            self.answer_key = answer_key
+        self.error_message = error_message or f'Invalid answer format for {puzzle_type}'
+
+        self._prepared = {}
+        for puzzle_id, entry in ground_truth.items():
+            try:
+                self._prepared[puzzle_id] = self.prepare(entry)
+            except (ValueError, TypeError, KeyError, AttributeError):
+                # Reported when the puzzle is checked, like any other bad answer
+                self._prepared[puzzle_id] = _MALFORMED
+
+    def prepare(self, entry):
+        """Precompute whatever is_correct() needs from one ground truth entry"""
+        return entry
+
+    def is_correct(self, prepared, answer, elapsed_time):
+        raise NotImplementedError
+
+    def check(self, puzzle_id, answer, elapsed_time=0):
+        """Check one answer and return the same fields as /api/check_answer"""
+        try:
+            prepared = self._prepared[puzzle_id]
+        except (KeyError, TypeError):
+            raise UnknownPuzzle(puzzle_id)
+        if prepared is _MALFORMED:
+            raise InvalidAnswer(self.error_message)
+
+        try:
+            correct = self.is_correct(prepared, answer, elapsed_time)
+        except self.answer_errors:
+            raise InvalidAnswer(self.error_message)
+
+        return {
+            'correct': correct,
+            'user_answer': answer,
+            'correct_answer': self.ground_truth[puzzle_id].get(self.answer_key)
+        }
+
+
+class ExactMatchChecker(AnswerChecker):
+    """Case-insensitive string comparison, used for types without a dedicated checker"""
+
+    answer_errors = ()
+
+    def prepare(self, entry):
+        return str(entry.get('answer')).lower()
+
+    def is_correct(self, prepared, answer, elapsed_time):
+        return str(answer).lower() == prepared
+
+
+class DiceCountChecker(AnswerChecker):
+    """The answer is the sum of all dice"""
+
+    answer_key = 'sum'
+
+    def prepare(self, entry):
+        return int(entry.get('sum'))
+
+    def is_correct(self, prepared, answer, elapsed_time):
+        return int(answer) == prepared
+
+
+class AreaClickChecker(AnswerChecker):
+    """The click must land inside the rectangular area of the answer.
+
+    Ground truth without an area either falls back to a point with a fixed
+    pixel tolerance (Geometry_Click) or is never correct (Pick_Area).
+    """
+
+    answer_errors = (ValueError, TypeError, KeyError)
+
+    def __init__(self, puzzle_type, ground_truth, point_tolerance=None, **kwargs):
+        self.point_tolerance = point_tolerance
+        super().__init__(puzzle_type, ground_truth, **kwargs)
+
+    def prepare(self, entry):
+        answer = entry.get('answer')
+        if isinstance(answer, dict) and 'area' in answer:
+            return ('area', _area_bounds(answer['area']))
+        if self.point_tolerance is None:
+            return None
+        correct_x, correct_y = answer
+        return ('point', (correct_x, correct_y))
+
+    def is_correct(self, prepared, answer, elapsed_time):
+        user_x, user_y = answer
+        if prepared is None:
+            return False
+        kind, value = prepared
+        if kind == 'area':
+            min_x, min_y, max_x, max_y = value
+            return (min_x <= user_x <= max_x) and (min_y <= user_y <= max_y)
+        correct_x, correct_y = value
+        return math.hypot(user_x - correct_x, user_y - correct_y) <= self.point_tolerance
+
+
+class RotationChecker(AnswerChecker):
+    """The rotation angle must equal the correct angle (modulo full turns)"""
+
+    def prepare(self, entry):
+        return entry.get('correct_angle') % 360
+
+    def is_correct(self, prepared, answer, elapsed_time):
+        return int(answer) % 360 == prepared
+
+
+class TargetPositionChecker(AnswerChecker):
+    """The position must be within `tolerance` pixels of `target_position`"""
+
+    answer_errors = (ValueError, TypeError, KeyError)
+
+    def __init__(self, puzzle_type, ground_truth, default_tolerance=10, **kwargs):
+        self.default_tolerance = default_tolerance
+        super().__init__(puzzle_type, ground_truth, **kwargs)
+
+    def prepare(self, entry):
+        target_x, target_y = entry.get('target_position')
+        return target_x, target_y, entry.get('tolerance', self.default_tolerance)
+
+    def is_correct(self, prepared, answer, elapsed_time):
+        user_x, user_y = answer
+        target_x, target_y, tolerance = prepared
+        return math.hypot(user_x - target_x, user_y - target_y) <= tolerance
+
+
+class SetMatchChecker(AnswerChecker):
+    """The selected cells/images/patches must match the correct set exactly"""
+
+    def __init__(self, puzzle_type, ground_truth, field='answer', **kwargs):
+        self.field = field
+        super().__init__(puzzle_type, ground_truth, **kwargs)
+
+    def prepare(self, entry):
+        return frozenset(entry.get(self.field, []))
+
+    def is_correct(self, prepared, answer, elapsed_time):
+        return set(answer) == prepared
+
+
+class SwapChecker(AnswerChecker):
+    """The swapped pair must match one of the possible correct swaps (order doesn't matter)"""
+
+    def prepare(self, entry):
+        return [frozenset(swap) for swap in entry.get('answer', [])]
+
+    def is_correct(self, prepared, answer, elapsed_time):
+        return any(set(answer) == swap for swap in prepared)
+
+
+class OptionIndexChecker(AnswerChecker):
+    """The selected option index must equal the correct one"""
+
+    def __init__(self, puzzle_type, ground_truth, field='correct_option_index', **kwargs):
+        self.field = field
+        super().__init__(puzzle_type, ground_truth, **kwargs)
+
+    def prepare(self, entry):
+        return entry.get(self.field)
+
+    def is_correct(self, prepared, answer, elapsed_time):
+        return int(answer) == prepared
+
+
+class ClickOrderChecker(AnswerChecker):
+    """Every click must be within `tolerance` pixels of the expected position, in order"""
+
+    answer_errors = (ValueError, TypeError, KeyError)
+
+    def prepare(self, entry):
+        positions = [(correct_x, correct_y) for correct_x, correct_y in entry.get('answer', [])]
+        return positions, entry.get('tolerance', 20)
+
+    def is_correct(self, prepared, answer, elapsed_time):
+        correct_positions, tolerance = prepared
+        if len(answer) != len(correct_positions):
+            return False
+        for (user_x, user_y), (correct_x, correct_y) in zip(answer, correct_positions):
+            if math.hypot(user_x - correct_x, user_y - correct_y) > tolerance:
+                return False
+        return True
+
+
+class HoldButtonChecker(AnswerChecker):
+    """The button must be held no longer than `hold_time`, without timing out"""
+
+    answer_key = 'hold_time'
+    # Seconds after which an unfinished hold counts as a timeout
+    timeout = 8
+
+    def prepare(self, entry):
+        return entry.get('hold_time', 3)
+
+    def is_correct(self, prepared, answer, elapsed_time):
+        user_hold_time = float(answer)
+        if elapsed_time > self.timeout and user_hold_time < prepared:
+            return False
+        return prepared >= user_hold_time >= 0
+
+
+class AvoidAreaChecker(AnswerChecker):
+    """The click must land outside `avoid_area`"""
+
+    answer_errors = (ValueError, TypeError, KeyError)
+
+    def prepare(self, entry):
+        area = entry.get('avoid_area', {'x': 0, 'y': 0, 'width': 0, 'height': 0})
+        return area['x'], area['y'], area['x'] + area['width'], area['y'] + area['height']
+
+    def is_correct(self, prepared, answer, elapsed_time):
+        user_x, user_y = answer
+        min_x, min_y, max_x, max_y = prepared
+        return not (min_x <= user_x <= max_x and min_y <= user_y <= max_y)
+
+
+# Checker factory for each CAPTCHA type; types not listed use ExactMatchChecker
+CHECKER_REGISTRY = {
+    'Dice_Count': partial(DiceCountChecker, error_message='Invalid answer format'),
+    'Geometry_Click': partial(AreaClickChecker, point_tolerance=25),
+    'Rotation_Match': RotationChecker,
+    'Slide_Puzzle': partial(TargetPositionChecker, default_tolerance=10),
+    'Unusual_Detection': partial(SetMatchChecker, field='answer'),
+    'Image_Recognition': partial(SetMatchChecker, field='correct_selections'),
+    'Bingo': SwapChecker,
+    'Image_Matching': OptionIndexChecker,
+    'Patch_Select': partial(SetMatchChecker, field='correct_patches', answer_key='correct_patches'),
+    'Dart_Count': OptionIndexChecker,
+    'Object_Match': OptionIndexChecker,
+    'Select_Animal': partial(SetMatchChecker, field='correct_patches', answer_key='correct_patches'),
+    'Coordinates': partial(OptionIndexChecker, answer_key='correct_option_index'),
+    'Path_Finder': partial(OptionIndexChecker, field='correct_option', answer_key='correct_option'),
+    'Place_Dot': partial(TargetPositionChecker, default_tolerance=15),
+    'Connect_icon': partial(OptionIndexChecker, field='correct_option', answer_key='correct_option'),
+    'Click_Order': ClickOrderChecker,
+    'Hold_Button': HoldButtonChecker,
+    'Misleading_Click': AvoidAreaChecker,
+    'Pick_Area': AreaClickChecker,
+}
+
+
+def register_checker(puzzle_type, factory):
+    """Register the checker factory for a new CAPTCHA type"""
+    CHECKER_REGISTRY[puzzle_type] = factory
+
+
+def build_checker(puzzle_type, ground_truth):
+    factory = CHECKER_REGISTRY.get(puzzle_type, ExactMatchChecker)
+    return factory(puzzle_type, ground_truth)
+
+
+def build_checkers(ground_truth_by_type):
+    """Build one checker per type from a {type: ground truth} mapping"""
+    return {puzzle_type: build_checker(puzzle_type, ground_truth)
+            for puzzle_type, ground_truth in ground_truth_by_type.items()}
+
+
+def find_checker(checkers, puzzle_type):
+    """The checker of `puzzle_type`, None for unknown types and for values that aren't strings"""
+    if not isinstance(puzzle_type, str):
+        return None
+    return checkers.get(puzzle_type)
+
+
+def score_answer(checker, data):
+    """Check one {puzzle_type, puzzle_id, answer, elapsed_time} record.
+
+    Returns (payload, status) exactly as /api/check_answer would respond.
+    """
+    puzzle_id = data.get('puzzle_id')
+    user_answer = data.get('answer')
+    try:
+        elapsed_time = float(data.get('elapsed_time', 0))
+    except (ValueError, TypeError):
+        return {'error': 'Invalid elapsed_time'}, 400
+
+    # Validate input
+    if not puzzle_id or user_answer is None:
+        return {'error': 'Missing puzzle_id or answer'}, 400
+
+    if checker is None:
+        return {'error': 'Invalid puzzle ID'}, 400
+
+    try:
+        return checker.check(puzzle_id, user_answer, elapsed_time), 200
+    except UnknownPuzzle:
+        return {'error': 'Invalid puzzle ID'}, 400
+    except InvalidAnswer as e:
+        return {'error': str(e)}, 400
@@ -0,0 +1,163 @@
+"""Where the CAPTCHA dataset is read from.
+
+A dataset is a tree of `<type>/ground_truth.json` files and images. It can
+be read from:
+
+- DirectorySource: the captcha_data directory itself
+- PackSource: a single pack file built by pack_dataset.py, memory-mapped,
+  so opening the dataset and reading any file costs no file handles or
+  filesystem lookups at all
+
+Paths are always relative to the dataset root and use '/' separators, e.g.
+'Dice_Count/ground_truth.json' or 'Image_Recognition/set1/0.png'.
+
+Pack file layout (all integers little-endian):
+
+    8 bytes   magic b'CWPACK1\\n'
+    8 bytes   offset of the index
+    8 bytes   length of the index
+    ...       file contents, back to back
+    index     JSON: {"files": {path: [offset, length, sha256], ...}}
+"""
+import os
+import json
+import mmap
+import struct
+
+from werkzeug.security import safe_join
+
+PACK_MAGIC = b'CWPACK1\n'
+PACK_HEADER = struct.Struct('<8sQQ')
+
+
+def _split(relpath):
+    """Validate a dataset path, returns its components"""
+    parts = relpath.split('/')
+    if '\\' in relpath or any(part in ('', '.', '..') for part in parts):
+        raise FileNotFoundError(relpath)
+    return parts
+
+
+class DirectorySource:
+    """Dataset files read straight from a directory"""
+
+    def __init__(self, base_dir):
+        self.base_dir = base_dir
+
+    def types(self):
+        if not os.path.isdir(self.base_dir):
+            return []
+        return sorted(d for d in os.listdir(self.base_dir)
+                      if os.path.isdir(os.path.join(self.base_dir, d)))
+
+    def _path(self, relpath):
+        path = safe_join(self.base_dir, *_split(relpath))
+        if path is None:
+            raise FileNotFoundError(relpath)
+        return path
+
+    def listdir(self, dirpath):
+        """Names in a dataset directory, or None if it doesn't exist"""
+        try:
+            path = self._path(dirpath)
+        except FileNotFoundError:
+            return None
+        if not os.path.isdir(path):
+            return None
+        return set(os.listdir(path))
+
+    def signature(self, relpath):
+        """A value that changes whenever the file changes, None if it doesn't exist"""
+        try:
+            stat = os.stat(self._path(relpath))
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def read(self, relpath):
+        """(signature, bytes) of a file; raises OSError if it can't be read"""
+        with open(self._path(relpath), 'rb') as f:
+            stat = os.fstat(f.fileno())
+            return (stat.st_mtime_ns, stat.st_size), f.read()
+
+    def digest(self, relpath):
+        """Precomputed SHA-256 of a file, None if unknown"""
+        return None
+
+    def refresh(self):
+        """Pick up a replaced dataset, returns True if anything changed"""
+        return False
+
+
+class PackSource:
+    """Dataset files read from a memory-mapped pack file"""
+
+    def __init__(self, path):
+        self.base_dir = path
+        self._open()
+
+    def _open(self):
+        with open(self.base_dir, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            # The mapping stays valid after the file is closed
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, index_offset, index_length = PACK_HEADER.unpack_from(mapped)
+        if magic != PACK_MAGIC:
+            mapped.close()
+            raise ValueError(f'{self.base_dir} is not a CAPTCHA dataset pack')
+        index = json.loads(mapped[index_offset:index_offset + index_length])
+
+        self._mmap = mapped
+        self._stat_signature = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        self.files = index['files']
+        # Directory path ('' for the root) -> names of its files and subdirectories
+        self.directories = {}
+        for relpath in self.files:
+            parts = relpath.split('/')
+            for depth in range(len(parts)):
+                self.directories.setdefault('/'.join(parts[:depth]), set()).add(parts[depth])
+
+    def types(self):
+        return sorted(name for name in self.directories.get('', ()) if name in self.directories)
+
+    def listdir(self, dirpath):
+        names = self.directories.get(dirpath)
+        return set(names) if names is not None else None
+
+    def signature(self, relpath):
+        entry = self.files.get(relpath)
+        if entry is None:
+            return None
+        # Content digests are part of the index, so the entry itself identifies the content
+        return tuple(entry)
+
+    def read(self, relpath):
+        entry = self.files.get(relpath)
+        if entry is None:
+            raise FileNotFoundError(relpath)
+        offset, length, _ = entry
+        return tuple(entry), self._mmap[offset:offset + length]
+
+    def digest(self, relpath):
+        entry = self.files.get(relpath)
+        return entry[2] if entry is not None else None
+
+    def refresh(self):
+        try:
+            stat = os.stat(self.base_dir)
+        except OSError:
+            return False
+        if (stat.st_ino, stat.st_mtime_ns, stat.st_size) == self._stat_signature:
+            return False
+        # A new pack was moved into place; the old mapping is released once unreferenced
+        self._open()
+        return True
+
+
+def open_source(path):
+    """Open a dataset directory or pack file"""
+    if isinstance(path, (DirectorySource, PackSource)):
+        return path
+    if os.path.isfile(path):
+        return PackSource(path)
+    return DirectorySource(path)
@@ -0,0 +1,656 @@
+"""Generate a synthetic captcha_data directory for every CAPTCHA type.
+
+    python generate_dataset.py --output captcha_data --puzzles 1000 --seed 0
+    python generate_dataset.py --output /data/big --puzzles 1000000 --types Dice_Count Bingo --workers 16
+
+Puzzles are drawn procedurally with Pillow (shapes, dice, grids, dotted
+areas, ...) and written with a `ground_truth.json` per type in exactly the
+schema get_puzzle and check_answer read, so the generated directory (or a
+pack of it built by pack_dataset.py) can be served like the real dataset.
+
+Every puzzle is drawn from its own random generator seeded with
+`<seed>:<type>:<index>`, so the output only depends on the seed and the
+puzzle count, never on the number of workers: puzzle i is the same whether
+10 or 10 million puzzles are generated. Puzzles are generated in chunks by a
+process pool; the ground truth is streamed to disk in index order as chunks
+finish, so memory stays flat however many puzzles are written. Existing
+files of a generated type are overwritten, others are left alone.
+"""
+import os
+import sys
+import json
+import math
+import time
+import random
+import argparse
+from multiprocessing import Pool
+
+from PIL import Image, ImageDraw
+
+# Shapes the generators draw, by the name used in prompts and target objects
+SHAPES = ('circle', 'square', 'triangle', 'diamond', 'star', 'hexagon', 'cross')
+COLORS = {
+    'red': (220, 50, 47),
+    'green': (60, 160, 60),
+    'blue': (38, 110, 210),
+    'orange': (240, 140, 20),
+    'purple': (130, 70, 180),
+    'teal': (30, 160, 160),
+    'brown': (140, 90, 50),
+    'black': (30, 30, 30),
+}
+# Pip positions of each die face, as fractions of the die size
+DICE_PIPS = {
+    1: [(0.5, 0.5)],
+    2: [(0.25, 0.25), (0.75, 0.75)],
+    3: [(0.25, 0.25), (0.5, 0.5), (0.75, 0.75)],
+    4: [(0.25, 0.25), (0.75, 0.25), (0.25, 0.75), (0.75, 0.75)],
+    5: [(0.25, 0.25), (0.75, 0.25), (0.5, 0.5), (0.25, 0.75), (0.75, 0.75)],
+    6: [(0.25, 0.25), (0.75, 0.25), (0.25, 0.5), (0.75, 0.5), (0.25, 0.75), (0.75, 0.75)],
+}
+# Rotation_Match frames are written every ROTATION_STEP degrees, like the web UI's arrows
+ROTATION_STEP = 45
+
+
+def _polygon(cx, cy, radius, sides, rotation=-90, inner=None):
+    # Regular polygon (or star, with an inner radius) centered on cx, cy
+    points = []
+    count = sides * 2 if inner else sides
+    for k in range(count):
+        r = inner if inner and k % 2 else radius
+        angle = math.radians(rotation + 360 * k / count)
+        points.append((cx + r * math.cos(angle), cy + r * math.sin(angle)))
+    return points
+
+
+def draw_shape(draw, shape, box, fill, outline=None):
+    """Draw one of SHAPES filling the square box (x1, y1, x2, y2)"""
+    x1, y1, x2, y2 = box
+    cx, cy = (x1 + x2) / 2, (y1 + y2) / 2
+    r = min(x2 - x1, y2 - y1) / 2
+    if shape == 'circle':
+        draw.ellipse(box, fill=fill, outline=outline)
+    elif shape == 'square':
+        draw.rectangle([cx - r * 0.85, cy - r * 0.85, cx + r * 0.85, cy + r * 0.85], fill=fill, outline=outline)
+    elif shape == 'triangle':
+        draw.polygon(_polygon(cx, cy + r * 0.15, r, 3), fill=fill, outline=outline)
+    elif shape == 'diamond':
+        draw.polygon(_polygon(cx, cy, r, 4), fill=fill, outline=outline)
+    elif shape == 'star':
+        draw.polygon(_polygon(cx, cy, r, 5, inner=r * 0.45), fill=fill, outline=outline)
+    elif shape == 'hexagon':
+        draw.polygon(_polygon(cx, cy, r, 6, rotation=0), fill=fill, outline=outline)
+    elif shape == 'cross':
+        w = r * 0.35
+        draw.polygon([(cx - w, cy - r), (cx + w, cy - r), (cx + w, cy - w), (cx + r, cy - w), (cx + r, cy + w),
+                      (cx + w, cy + w), (cx + w, cy + r), (cx - w, cy + r), (cx - w, cy + w), (cx - r, cy + w),
+                      (cx - r, cy - w), (cx - w, cy - w)], fill=fill, outline=outline)
+    else:
+        raise ValueError(f'Unknown shape: {shape}')
+
+
+def background(rng, size):
+    """A light, randomly tinted canvas with a few faint lines as noise"""
+    width, height = size
+    image = Image.new('RGB', size, tuple(rng.randint(215, 250) for _ in range(3)))
+    draw = ImageDraw.Draw(image)
+    for _ in range(6):
+        points = [(rng.randint(0, width), rng.randint(0, height)) for _ in range(2)]
+        draw.line(points, fill=tuple(rng.randint(185, 215) for _ in range(3)), width=2)
+    return image
+
+
+def scatter(rng, count, size, item, margin=10):
+    """Top-left corners of `count` non-overlapping item x item boxes inside size"""
+    cell = item + margin
+    cols = (size[0] - margin) // cell
+    rows = (size[1] - margin) // cell
+    if cols * rows < count:
+        raise ValueError(f'{count} items of {item}px do not fit in {size}')
+    return [(margin + (index % cols) * cell, margin + (index // cols) * cell)
+            for index in rng.sample(range(cols * rows), count)]
+
+
+def grid_cells(grid_size, cell):
+    """Top-left corners of the cells of a rows x cols grid, in row-major order"""
+    rows, cols = grid_size
+    return [(col * cell, row * cell) for row in range(rows) for col in range(cols)]
+
+
+def dotted_rectangle(draw, box, fill, dash=6, width=2):
+    x1, y1, x2, y2 = box
+    for x in range(x1, x2, dash * 2):
+        draw.line([(x, y1), (min(x + dash, x2), y1)], fill=fill, width=width)
+        draw.line([(x, y2), (min(x + dash, x2), y2)], fill=fill, width=width)
+    for y in range(y1, y2, dash * 2):
+        draw.line([(x1, y), (x1, min(y + dash, y2))], fill=fill, width=width)
+        draw.line([(x2, y), (x2, min(y + dash, y2))], fill=fill, width=width)
+
+
+def random_color(rng):
+    return COLORS[rng.choice(sorted(COLORS))]
+
+
+def save(image, directory, filename):
+    # Fast compression: generation time is dominated by PNG encoding otherwise
+    image.save(os.path.join(directory, filename), compress_level=1)
+
+
+def icon(shape, color, size=100):
+    image = Image.new('RGB', (size, size), (245, 245, 245))
+    draw_shape(ImageDraw.Draw(image), shape, (size * 0.15, size * 0.15, size * 0.85, size * 0.85), COLORS[color])
+    return image
+
+
+# Generators: generate(rng, index, directory) writes the images of one puzzle
+# into its type directory and returns (puzzle_id, ground truth entry)
+
+def generate_dice_count(rng, index, directory):
+    image = background(rng, (320, 200))
+    draw = ImageDraw.Draw(image)
+    dice = [rng.randint(1, 6) for _ in range(rng.randint(2, 5))]
+    for value, (x, y) in zip(dice, scatter(rng, len(dice), image.size, 56)):
+        draw.rounded_rectangle([x, y, x + 56, y + 56], radius=8, fill='white', outline=(60, 60, 60), width=2)
+        for px, py in DICE_PIPS[value]:
+            draw.ellipse([x + px * 56 - 5, y + py * 56 - 5, x + px * 56 + 5, y + py * 56 + 5], fill=(30, 30, 30))
+    puzzle_id = f'dice_{index}.png'
+    save(image, directory, puzzle_id)
+    return puzzle_id, {'sum': sum(dice)}
+
+
+def generate_geometry_click(rng, index, directory):
+    image = background(rng, (320, 240))
+    draw = ImageDraw.Draw(image)
+    shapes = rng.sample(SHAPES, 4)
+    boxes = scatter(rng, len(shapes), image.size, 60)
+    for shape, (x, y) in zip(shapes, boxes):
+        draw_shape(draw, shape, (x, y, x + 60, y + 60), random_color(rng))
+    x, y = boxes[0]
+    puzzle_id = f'geometry_{index}.png'
+    save(image, directory, puzzle_id)
+    return puzzle_id, {'answer': {'area': [[x, y], [x + 60, y + 60]]}, 'question': f'Click on the {shapes[0]}'}
+
+
+def generate_rotation_match(rng, index, directory, rotation_frames=True):
+    # An arrow with a dot on one side, so every orientation looks different
+    image = Image.new('RGBA', (120, 120), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(image)
+    color = random_color(rng)
+    draw.polygon([(60, 12), (92, 50), (72, 50), (72, 104), (48, 104), (48, 50), (28, 50)], fill=color)
+    draw.ellipse([82, 80, 100, 98], fill=color)
+    base_angle = rng.randrange(0, 360, ROTATION_STEP)
+    image = image.rotate(-base_angle, resample=Image.BICUBIC)
+    correct_angle = rng.randrange(ROTATION_STEP, 360, ROTATION_STEP)
+
+    object_base = f'object_{index}'
+    save(image, directory, f'{object_base}.png')
+    if rotation_frames:
+        for angle in range(0, 360, ROTATION_STEP):
+            # Clockwise, like rotation.RotationRenderer renders missing frames
+            frame = image.rotate(-angle, resample=Image.BICUBIC) if angle else image
+            save(frame, directory, f'{object_base}_{angle}.png')
+    reference = background(rng, (120, 120))
+    target = image.rotate(-correct_angle, resample=Image.BICUBIC)
+    reference.paste(target, (0, 0), target)
+    save(reference, directory, f'reference_{index}.png')
+    return f'rotation_{index}', {
+        'reference_image': f'reference_{index}.png',
+        'object_base_image': f'{object_base}.png',
+        'correct_angle': correct_angle
+    }
+
+
+def generate_slide_puzzle(rng, index, directory):
+    image = background(rng, (320, 200))
+    draw = ImageDraw.Draw(image)
+    for x, y in scatter(rng, 5, image.size, 50):
+        draw_shape(draw, rng.choice(SHAPES), (x, y, x + 50, y + 50), random_color(rng))
+    piece = 50
+    x, y = rng.randint(piece + 10, image.width - piece - 10), rng.randint(10, image.height - piece - 10)
+    puzzle_id = f'slide_{index}.png'
+    component_image = f'slide_{index}_piece.png'
+    component = image.crop((x, y, x + piece, y + piece))
+    ImageDraw.Draw(component).rectangle([0, 0, piece - 1, piece - 1], outline='white', width=2)
+    save(component, directory, component_image)
+    # The slot the component has to be dragged to
+    draw.rectangle([x, y, x + piece, y + piece], fill=(90, 90, 90), outline='white', width=2)
+    save(image, directory, puzzle_id)
+    return puzzle_id, {
+        'component_image': component_image,
+        'target_position': [x + piece // 2, y + piece // 2],
+        'tolerance': 10
+    }
+
+
+def generate_unusual_detection(rng, index, directory):
+    grid_size = [2, 3]
+    cell = 100
+    image = background(rng, (cell * grid_size[1], cell * grid_size[0]))
+    draw = ImageDraw.Draw(image)
+    usual, unusual = rng.sample(SHAPES, 2)
+    color = random_color(rng)
+    cells = grid_cells(grid_size, cell)
+    answer = sorted(rng.sample(range(len(cells)), rng.randint(1, 2)))
+    for i, (x, y) in enumerate(cells):
+        draw_shape(draw, unusual if i in answer else usual, (x + 20, y + 20, x + cell - 20, y + cell - 20), color)
+    puzzle_id = f'unusual_{index}.png'
+    save(image, directory, puzzle_id)
+    return puzzle_id, {'answer': answer, 'grid_size': grid_size}
+
+
+def generate_image_recognition(rng, index, directory):
+    puzzle_id = f'recognition_{index}'
+    os.makedirs(os.path.join(directory, puzzle_id), exist_ok=True)
+    target = rng.choice(SHAPES)
+    others = [shape for shape in SHAPES if shape != target]
+    correct = sorted(rng.sample(range(9), rng.randint(2, 4)))
+    images = []
+    for i in range(9):
+        filename = f'{i}.png'
+        shape = target if i in correct else rng.choice(others)
+        save(icon(shape, rng.choice(sorted(COLORS))), os.path.join(directory, puzzle_id), filename)
+        images.append(filename)
+    return puzzle_id, {'images': images, 'correct_selections': correct, 'question': f'Select all images with a {target}'}
+
+
+BINGO_LINES = {
+    'horizontal': [[0, 1, 2], [3, 4, 5], [6, 7, 8]],
+    'vertical': [[0, 3, 6], [1, 4, 7], [2, 5, 8]],
+    'diagonal': [[0, 4, 8], [2, 4, 6]],
+}
+
+
+def generate_bingo(rng, index, directory):
+    # Two cells of a line hold the target icon; swapping its third cell with the
+    # only other target icon completes the line. All other icons are distinct.
+    direction = rng.choice(sorted(BINGO_LINES))
+    line = rng.choice(BINGO_LINES[direction])
+    broken = rng.choice(line)
+    outside = rng.choice([i for i in range(9) if i not in line])
+    icons = rng.sample([(shape, color) for shape in SHAPES for color in sorted(COLORS)], 7)
+    target, others = icons[0], iter(icons[1:])
+    cells = [target if (i in line and i != broken) or i == outside else next(others) for i in range(9)]
+
+    cell = 100
+    image = Image.new('RGB', (cell * 3, cell * 3), 'white')
+    draw = ImageDraw.Draw(image)
+    for (shape, color), (x, y) in zip(cells, grid_cells([3, 3], cell)):
+        draw.rectangle([x, y, x + cell - 1, y + cell - 1], outline=(200, 200, 200))
+        draw_shape(draw, shape, (x + 18, y + 18, x + cell - 18, y + cell - 18), COLORS[color])
+    puzzle_id = f'bingo_{index}.png'
+    save(image, directory, puzzle_id)
+    return puzzle_id, {'answer': [[broken, outside]], 'grid_size': [3, 3], 'solution_line': {direction: line}}
+
+
+def _option_puzzle(index, directory, name, reference, options):
+    # The reference image doubles as the puzzle's main image
+    puzzle_id = f'{name}_{index}.png'
+    save(reference, directory, puzzle_id)
+    option_images = []
+    for k, option in enumerate(options):
+        filename = f'{name}_{index}_option_{k}.png'
+        save(option, directory, filename)
+        option_images.append(filename)
+    return puzzle_id, option_images
+
+
+def generate_image_matching(rng, index, directory):
+    icons = rng.sample([(shape, color) for shape in SHAPES for color in sorted(COLORS)], 4)
+    correct = rng.randrange(len(icons))
+    puzzle_id, option_images = _option_puzzle(index, directory, 'matching', icon(*icons[correct]),
+                                              [icon(*item) for item in icons])
+    return puzzle_id, {'reference_image': puzzle_id, 'option_images': option_images, 'correct_option_index': correct}
+
+
+def generate_patch_select(rng, index, directory):
+    grid_size = [5, 5]
+    cell = 60
+    image = background(rng, (cell * grid_size[1], cell * grid_size[0]))
+    draw = ImageDraw.Draw(image)
+    target = rng.choice(SHAPES)
+    others = [shape for shape in SHAPES if shape != target]
+    cells = grid_cells(grid_size, cell)
+    correct = sorted(rng.sample(range(len(cells)), rng.randint(2, 6)))
+    for i in correct + rng.sample([i for i in range(len(cells)) if i not in correct], 6):
+        x, y = cells[i]
+        shape = target if i in correct else rng.choice(others)
+        draw_shape(draw, shape, (x + 10, y + 10, x + cell - 10, y + cell - 10), random_color(rng))
+    for x, y in cells:
+        draw.rectangle([x, y, x + cell - 1, y + cell - 1], outline=(255, 255, 255))
+    puzzle_id = f'patch_{index}.png'
+    save(image, directory, puzzle_id)
+    return puzzle_id, {'grid_size': grid_size, 'target_object': target, 'correct_patches': correct}
+
+
+def _number_image(number, size=(120, 120)):
+    image = Image.new('RGB', size, (250, 245, 230))
+    draw = ImageDraw.Draw(image)
+    draw.ellipse([10, 10, size[0] - 10, size[1] - 10], outline=(120, 80, 40), width=3)
+    draw.text((size[0] / 2, size[1] / 2), str(number), fill=(30, 30, 30), anchor='mm')
+    return image
+
+
+def _dartboard(rng, scores, size=(120, 120)):
+    image = Image.new('RGB', size, (250, 245, 230))
+    draw = ImageDraw.Draw(image)
+    for r, color in ((55, (30, 30, 30)), (40, (220, 50, 47)), (25, (60, 160, 60))):
+        draw.ellipse([60 - r, 60 - r, 60 + r, 60 + r], fill=color)
+    for score, (x, y) in zip(scores, scatter(rng, len(scores), size, 28, margin=6)):
+        draw.rectangle([x, y, x + 28, y + 20], fill='white', outline='black')
+        draw.text((x + 14, y + 10), str(score), fill='black', anchor='mm')
+    return image
+
+
+def generate_dart_count(rng, index, directory):
+    options = [[rng.randint(1, 9) for _ in range(rng.randint(2, 3))] for _ in range(4)]
+    correct = rng.randrange(len(options))
+    reference_number = sum(options[correct])
+    # Distractors must not add up to the reference number as well
+    for k, scores in enumerate(options):
+        if k != correct and sum(scores) == reference_number:
+            scores[0] = scores[0] % 9 + 1
+    puzzle_id, option_images = _option_puzzle(index, directory, 'darts', _number_image(reference_number),
+                                              [_dartboard(rng, scores) for scores in options])
+    return puzzle_id, {
+        'reference_image': puzzle_id,
+        'option_images': option_images,
+        'correct_option_index': correct,
+        'reference_number': reference_number
+    }
+
+
+def _objects_image(rng, shape, color, count, size=(160, 120)):
+    image = Image.new('RGB', size, (245, 245, 245))
+    draw = ImageDraw.Draw(image)
+    for x, y in scatter(rng, count, size, 26, margin=8):
+        draw_shape(draw, shape, (x, y, x + 26, y + 26), COLORS[color])
+    return image
+
+
+def generate_object_match(rng, index, directory):
+    shape, color = rng.choice(SHAPES), rng.choice(sorted(COLORS))
+    counts = list(range(1, 7))
+    correct = rng.randrange(len(counts))
+    puzzle_id, option_images = _option_puzzle(
+        index, directory, 'objects', _objects_image(rng, shape, color, counts[correct]),
+        [_objects_image(rng, shape, color, count) for count in counts])
+    return puzzle_id, {'reference_image': puzzle_id, 'option_images': option_images, 'correct_option_index': correct}
+
+
+def generate_select_animal(rng, index, directory):
+    grid_size = [2, 3]
+    cell = 100
+    image = background(rng, (cell * grid_size[1], cell * grid_size[0]))
+    draw = ImageDraw.Draw(image)
+    shapes = rng.sample(SHAPES, grid_size[0] * grid_size[1])
+    for shape, (x, y) in zip(shapes, grid_cells(grid_size, cell)):
+        draw_shape(draw, shape, (x + 20, y + 20, x + cell - 20, y + cell - 20), random_color(rng))
+        draw.rectangle([x, y, x + cell - 1, y + cell - 1], outline=(255, 255, 255), width=2)
+    correct = rng.randrange(len(shapes))
+    puzzle_id = f'select_{index}.png'
+    save(image, directory, puzzle_id)
+    return puzzle_id, {
+        'grid_size': grid_size,
+        'target_object': shapes[correct],
+        'correct_patches': [correct],
+        'prompt': f'Pick a {shapes[correct]}'
+    }
+
+
+def _seat_grid(marker=None, piece=None, size=4, cell=30):
+    # A grid of seats; the marker cell gets a cross, the piece cell a filled circle
+    image = Image.new('RGB', (size * cell, size * cell), (240, 240, 235))
+    draw = ImageDraw.Draw(image)
+    for x, y in grid_cells([size, size], cell):
+        draw.rectangle([x + 3, y + 3, x + cell - 3, y + cell - 3], outline=(150, 150, 150))
+    if marker is not None:
+        x, y = grid_cells([size, size], cell)[marker]
+        draw.line([x + 6, y + 6, x + cell - 6, y + cell - 6], fill=(220, 50, 47), width=3)
+        draw.line([x + 6, y + cell - 6, x + cell - 6, y + 6], fill=(220, 50, 47), width=3)
+    if piece is not None:
+        x, y = grid_cells([size, size], cell)[piece]
+        draw.ellipse([x + 7, y + 7, x + cell - 7, y + cell - 7], fill=(38, 110, 210))
+    return image
+
+
+def generate_coordinates(rng, index, directory):
+    seats = rng.sample(range(16), 4)
+    correct = rng.randrange(len(seats))
+    puzzle_id, option_images = _option_puzzle(index, directory, 'coordinates',
+                                              _seat_grid(marker=seats[correct]),
+                                              [_seat_grid(piece=seat) for seat in seats])
+    return puzzle_id, {'reference_image': puzzle_id, 'option_images': option_images, 'correct_option_index': correct}
+
+
+def generate_path_finder(rng, index, directory):
+    spots = rng.sample(range(16), 4)
+    correct = rng.randrange(len(spots))
+    puzzle_id, options = _option_puzzle(index, directory, 'path', _seat_grid(marker=spots[correct]),
+                                        [_seat_grid(marker=spots[correct], piece=spot) for spot in spots])
+    return puzzle_id, {'reference_image': puzzle_id, 'options': options, 'correct_option': correct}
+
+
+def generate_place_dot(rng, index, directory):
+    image = background(rng, (320, 200))
+    draw = ImageDraw.Draw(image)
+    points = [(rng.randint(20, 60), rng.randint(20, 180))]
+    for _ in range(rng.randint(2, 4)):
+        points.append((min(300, points[-1][0] + rng.randint(50, 90)), rng.randint(20, 180)))
+    draw.line(points, fill=(120, 120, 120), width=6)
+    x, y = points[0]
+    draw.rectangle([x - 12, y - 8, x + 12, y + 8], fill=(220, 50, 47))
+    puzzle_id = f'place_dot_{index}.png'
+    save(image, directory, puzzle_id)
+    return puzzle_id, {'target_position': list(points[-1]), 'tolerance': 15}
+
+
+def _icon_pair(first, second, size=(160, 100)):
+    image = Image.new('RGB', size, (245, 245, 245))
+    draw = ImageDraw.Draw(image)
+    for x in range(50, 110, 10):
+        draw.line([(x, 50), (x + 5, 50)], fill=(80, 80, 80), width=2)
+    for (shape, color), x in ((first, 10), (second, 110)):
+        draw_shape(draw, shape, (x, 30, x + 40, 70), COLORS[color])
+    return image
+
+
+def generate_connect_icon(rng, index, directory):
+    icons = rng.sample([(shape, color) for shape in SHAPES for color in sorted(COLORS)], 5)
+    pair = (icons[0], icons[1])
+    correct = rng.randrange(4)
+    pairs = [pair if k == correct else (icons[0], icons[2 + (k if k < correct else k - 1)]) for k in range(4)]
+    puzzle_id, options = _option_puzzle(index, directory, 'connect', _icon_pair(*pair),
+                                        [_icon_pair(*item) for item in pairs])
+    return puzzle_id, {'reference_image': puzzle_id, 'options': options, 'correct_option': correct}
+
+
+def generate_click_order(rng, index, directory):
+    image = background(rng, (320, 240))
+    draw = ImageDraw.Draw(image)
+    shapes = rng.sample(SHAPES, rng.randint(3, 4))
+    colors = [random_color(rng) for _ in shapes]
+    boxes = scatter(rng, len(shapes), image.size, 50)
+    for shape, color, (x, y) in zip(shapes, colors, boxes):
+        draw_shape(draw, shape, (x, y, x + 50, y + 50), color)
+    order = Image.new('RGB', (50 * len(shapes), 50), 'white')
+    order_draw = ImageDraw.Draw(order)
+    for k, (shape, color) in enumerate(zip(shapes, colors)):
+        draw_shape(order_draw, shape, (k * 50 + 8, 8, k * 50 + 42, 42), color)
+    puzzle_id = f'click_order_{index}.png'
+    order_image = f'click_order_{index}_order.png'
+    save(image, directory, puzzle_id)
+    save(order, directory, order_image)
+    return puzzle_id, {
+        'order_image': order_image,
+        'answer': [[x + 25, y + 25] for x, y in boxes],
+        'tolerance': 20
+    }
+
+
+def generate_hold_button(rng, index, directory):
+    image = background(rng, (320, 160))
+    draw = ImageDraw.Draw(image)
+    draw.rounded_rectangle([90, 55, 230, 105], radius=12, fill=random_color(rng))
+    draw.text((160, 80), 'HOLD', fill='white', anchor='mm')
+    puzzle_id = f'hold_{index}.png'
+    save(image, directory, puzzle_id)
+    return puzzle_id, {'hold_time': rng.randint(1, 5)}
+
+
+def generate_misleading_click(rng, index, directory):
+    image = background(rng, (320, 240))
+    draw = ImageDraw.Draw(image)
+    width, height = rng.randint(80, 140), rng.randint(50, 90)
+    x, y = rng.randint(10, 310 - width), rng.randint(10, 230 - height)
+    draw.rounded_rectangle([x, y, x + width, y + height], radius=10, fill=random_color(rng))
+    draw.text((x + width / 2, y + height / 2), 'CLICK ME', fill='white', anchor='mm')
+    puzzle_id = f'misleading_{index}.png'
+    save(image, directory, puzzle_id)
+    return puzzle_id, {'avoid_area': {'x': x, 'y': y, 'width': width, 'height': height}}
+
+
+def generate_pick_area(rng, index, directory):
+    image = background(rng, (320, 240))
+    draw = ImageDraw.Draw(image)
+    # Areas in separate columns of the image, so they never overlap
+    areas = []
+    for x1, x2 in ((10, 100), (115, 205), (220, 310)):
+        width, height = rng.randint(30, x2 - x1), rng.randint(30, 220)
+        x, y = rng.randint(x1, x2 - width), rng.randint(10, 230 - height)
+        areas.append((width * height, [x, y, x + width, y + height]))
+    for _, box in areas:
+        dotted_rectangle(draw, box, (60, 60, 60))
+    # Ties are broken towards the first area, which is then the only correct one
+    _, (x1, y1, x2, y2) = max(areas, key=lambda area: area[0])
+    puzzle_id = f'pick_area_{index}.png'
+    save(image, directory, puzzle_id)
+    return puzzle_id, {'answer': {'area': [[x1, y1], [x2, y2]]}}
+
+
+# Generator of each CAPTCHA type, in the order of app.PUZZLE_TYPE_SEQUENCE
+GENERATORS = {
+    'Dice_Count': generate_dice_count,
+    'Geometry_Click': generate_geometry_click,
+    'Rotation_Match': generate_rotation_match,
+    'Slide_Puzzle': generate_slide_puzzle,
+    'Unusual_Detection': generate_unusual_detection,
+    'Image_Recognition': generate_image_recognition,
+    'Bingo': generate_bingo,
+    'Image_Matching': generate_image_matching,
+    'Patch_Select': generate_patch_select,
+    'Dart_Count': generate_dart_count,
+    'Object_Match': generate_object_match,
+    'Select_Animal': generate_select_animal,
+    'Coordinates': generate_coordinates,
+    'Path_Finder': generate_path_finder,
+    'Place_Dot': generate_place_dot,
+    'Connect_icon': generate_connect_icon,
+    'Click_Order': generate_click_order,
+    'Hold_Button': generate_hold_button,
+    'Misleading_Click': generate_misleading_click,
+    'Pick_Area': generate_pick_area,
+}
+
+
+def puzzle_rng(seed, puzzle_type, index):
+    """The random generator of one puzzle; string seeds are hashed with SHA-512, not hash()"""
+    return random.Random(f'{seed}:{puzzle_type}:{index}')
+
+
+def generate_chunk(task):
+    """Generate puzzles [start, stop) of one type; returns [(puzzle_id, entry), ...] in index order"""
+    output, puzzle_type, start, stop, seed, rotation_frames = task
+    directory = os.path.join(output, puzzle_type)
+    generate = GENERATORS[puzzle_type]
+    kwargs = {'rotation_frames': rotation_frames} if puzzle_type == 'Rotation_Match' else {}
+    return [generate(puzzle_rng(seed, puzzle_type, index), index, directory, **kwargs)
+            for index in range(start, stop)]
+
+
+class GroundTruthWriter:
+    """Streams one type's ground_truth.json entry by entry, moved into place on close()"""
+
+    def __init__(self, path):
+        self.path = path
+        self.tmp_path = f'{path}.{os.getpid()}.tmp'
+        self.count = 0
+        self._file = open(self.tmp_path, 'w')
+        self._file.write('{')
+
+    def write(self, puzzle_id, entry):
+        separator = ',\n' if self.count else '\n'
+        self._file.write(f'{separator}  {json.dumps(puzzle_id)}: {json.dumps(entry)}')
+        self.count += 1
+
+    def close(self):
+        self._file.write('\n}\n')
+        self._file.close()
+        os.replace(self.tmp_path, self.path)
+
+
+def generate_dataset(output, puzzles, seed=0, types=None, workers=None, chunk_size=200, rotation_frames=True,
+                     progress=None):
+    """Generate `puzzles` puzzles of each type into output; returns {type: puzzle count}"""
+    types = list(types or GENERATORS)
+    tasks = []
+    for puzzle_type in types:
+        os.makedirs(os.path.join(output, puzzle_type), exist_ok=True)
+        for start in range(0, puzzles, chunk_size):
+            tasks.append((output, puzzle_type, start, min(start + chunk_size, puzzles), seed, rotation_frames))
+
+    counts = {}
+    writer = None
+    with Pool(workers) as pool:
+        # imap keeps task order, so each type's chunks arrive consecutively and in index order
+        for task, entries in zip(tasks, pool.imap(generate_chunk, tasks)):
+            puzzle_type = task[1]
+            if writer is None or puzzle_type not in counts:
+                if writer is not None:
+                    writer.close()
+                writer = GroundTruthWriter(os.path.join(output, puzzle_type, 'ground_truth.json'))
+                counts[puzzle_type] = 0
+            for puzzle_id, entry in entries:
+                writer.write(puzzle_id, entry)
+            counts[puzzle_type] += len(entries)
+            if progress is not None:
+                progress(puzzle_type, counts[puzzle_type], puzzles)
+    if writer is not None:
+        writer.close()
+    # Types without puzzles still get an (empty) ground truth
+    for puzzle_type in types:
+        if puzzle_type not in counts:
+            GroundTruthWriter(os.path.join(output, puzzle_type, 'ground_truth.json')).close()
+            counts[puzzle_type] = 0
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate a synthetic CAPTCHA dataset for every puzzle type')
+    parser.add_argument('--output', default='captcha_data', help='Dataset directory to write')
+    parser.add_argument('--puzzles', type=int, default=100, help='Puzzles per type')
+    parser.add_argument('--seed', type=int, default=0, help='Seed the whole dataset is derived from')
+    parser.add_argument('--types', nargs='+', choices=sorted(GENERATORS), metavar='TYPE',
+                        help='Only generate these types (default: all)')
+    parser.add_argument('--workers', type=int, default=None, help='Generator processes (default: one per CPU)')
+    parser.add_argument('--chunk-size', type=int, default=200, help='Puzzles per task handed to a worker')
+    parser.add_argument('--no-rotation-frames', dest='rotation_frames', action='store_false',
+                        help='Only write Rotation_Match object images; the server renders the frames')
+    args = parser.parse_args(argv)
+    if args.puzzles < 0 or args.chunk_size < 1:
+        parser.error('--puzzles must be >= 0 and --chunk-size >= 1')
+
+    started = time.monotonic()
+
+    def progress(puzzle_type, done, total):
+        print(f'\r{puzzle_type}: {done}/{total}', end='' if done < total else '\n', file=sys.stderr, flush=True)
+
+    counts = generate_dataset(args.output, args.puzzles, args.seed, args.types, args.workers, args.chunk_size,
+                              args.rotation_frames, progress)
+    total = sum(counts.values())
+    elapsed = time.monotonic() - started
+    print(f'Generated {total} puzzles of {len(counts)} types in {args.output} '
+          f'({elapsed:.1f}s, {total / elapsed if elapsed else 0:.0f} puzzles/s)')
+
+
+if __name__ == '__main__':
+    main()
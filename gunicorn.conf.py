@@ -0,0 +1,67 @@
+"""Gunicorn settings for serving Open CaptchaWorld in production.
+
+    gunicorn -c gunicorn.conf.py app:app
+
+`python app.py` (and the Docker image) use this file too. The app and its
+catalog are loaded once in the master process and shared copy-on-write by
+the workers. `kill -HUP <master pid>` rebuilds the catalog and replaces the
+workers gracefully, without dropping requests.
+"""
+import os
+import gc
+import sys
+import multiprocessing
+
+bind = os.environ.get('BIND', f"0.0.0.0:{os.environ.get('PORT', '7860')}")
+# Each worker holds its own asset cache (ASSET_CACHE_MAX_BYTES, 128 MiB) and rotation frame
+# cache (32 MiB) on top of the shared catalog, so budget about 200 MiB per worker. The CPU
+# count is the host's inside most containers, hence the cap; set WEB_CONCURRENCY to go higher.
+workers = int(os.environ.get('WEB_CONCURRENCY', min(2 * multiprocessing.cpu_count() + 1, 4)))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+worker_class = 'gthread' if threads > 1 else 'sync'
+
+# Build the catalog before forking so its memory is shared between workers
+preload_app = True
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = 5
+# Recycle workers after this many requests (0 never recycles them)
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 0))
+max_requests_jitter = max_requests // 10
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG')
+
+# Workers only see each other's sampling state through the SQLite session store,
+# and each other's metrics through the files in METRICS_DIR
+if workers > 1:
+    os.environ.setdefault('SESSION_BACKEND', 'sqlite')
+    os.environ.setdefault('METRICS_DIR', 'metrics_data')
+
+
+def on_starting(server):
+    # Metrics of a previous run must not be added to this one's (see metrics.py)
+    metrics = sys.modules.get('metrics')
+    if metrics is not None:
+        metrics.REGISTRY.clear_directory()
+
+
+def when_ready(server):
+    # Keep the preloaded objects out of the garbage collector's generations, so
+    # collections in the workers don't write to (and un-share) those pages
+    gc.freeze()
+
+
+def post_worker_init(worker):
+    # `kill -USR2 <worker pid>` profiles that worker (the master uses USR2 for upgrades)
+    captcha_app = sys.modules.get('app')
+    if captcha_app is not None:
+        captcha_app.install_profile_signal()
+
+
+def on_reload(server):
+    # New workers are forked from the preloaded app, so refresh its catalog first
+    # (looked up by module: under UvicornWorker the preloaded app is the ASGI wrapper)
+    captcha_app = sys.modules.get('app')
+    if captcha_app is not None:
+        captcha_app.reload_catalog()
+    gc.freeze()
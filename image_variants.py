@@ -0,0 +1,196 @@
+"""Re-encoded and downscaled variants of the CAPTCHA images.
+
+A variant is an image re-encoded to another format and optionally shrunk to
+a maximum width:
+
+- webp-lossless: pixel-identical to the original, usually much smaller
+- webp: lossy WebP, smallest, for agents that don't need exact pixels
+- avif: lossy AVIF, only if a Pillow AVIF plugin (pillow-avif-plugin) is installed
+- png: the original format, only useful together with a width
+
+Downscaled variants change the image's coordinate system, so they are only
+ever served when a client asks for a width explicitly; answers must still be
+given in the original image's coordinates. Only a few configured widths are
+offered, so clients can't make the server render and store arbitrary sizes.
+
+Variants are kept in a disk cache keyed by the original's content digest,
+so an edited image never gets a stale variant. Explicitly requested variants
+are generated on demand; the lossless WebP picked by Accept negotiation is
+only served once it has been generated ahead of time:
+
+    python image_variants.py --formats webp-lossless,webp --widths 256,512
+"""
+import io
+import os
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image
+
+try:
+    # Registers the AVIF format with Pillow
+    import pillow_avif  # noqa: F401
+except ImportError:
+    pass
+
+# Variant name -> (Pillow format, save options, file extension, content type)
+VARIANT_FORMATS = {
+    'webp-lossless': ('WEBP', {'lossless': True, 'quality': 100, 'method': 4}, 'webp', 'image/webp'),
+    'webp': ('WEBP', {'quality': 80, 'method': 4}, 'webp', 'image/webp'),
+    'png': ('PNG', {'optimize': True}, 'png', 'image/png'),
+}
+if 'AVIF' in Image.SAVE:
+    VARIANT_FORMATS['avif'] = ('AVIF', {'quality': 60}, 'avif', 'image/avif')
+
+# Only these originals are re-encoded; anything else is always served as is
+SOURCE_CONTENT_TYPES = ('image/png', 'image/jpeg')
+
+
+def render_variant(data, variant, width=None):
+    """Re-encode image bytes as `variant`, shrunk to at most `width` pixels wide"""
+    pil_format, options, _, _ = VARIANT_FORMATS[variant]
+    with Image.open(io.BytesIO(data)) as image:
+        image.load()
+        # WebP only stores RGB(A), and palette images can't be resampled smoothly
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info or 'A' in image.mode else 'RGB')
+        if width and width < image.width:
+            height = max(1, round(image.height * width / image.width))
+            image = image.resize((width, height), Image.LANCZOS)
+        out = io.BytesIO()
+        image.save(out, pil_format, **options)
+        return out.getvalue()
+
+
+class VariantStore:
+    """Variants of the assets of an AssetStore, cached on disk and in its AssetCache"""
+
+    def __init__(self, asset_store, directory='image_variants', widths=(256, 512)):
+        self.asset_store = asset_store
+        self.directory = directory
+        # Maximum widths downscaled variants are offered at
+        self.widths = frozenset(widths)
+
+    def _path(self, digest, variant, width):
+        return os.path.join(self.directory, digest[:2], digest,
+                            f"{variant}-{width or 'full'}.{VARIANT_FORMATS[variant][2]}")
+
+    def parse_width(self, value):
+        """The width of a ?w= value (a string or an int), ValueError unless it is one of `widths`"""
+        if isinstance(value, str) and value.isascii() and value.isdecimal():
+            value = int(value)
+        if isinstance(value, bool) or value not in self.widths:
+            raise ValueError(f"Width must be one of {', '.join(str(w) for w in sorted(self.widths))}")
+        return value
+
+    def get(self, puzzle_type, relpath, variant, width=None, render=True):
+        """(etag, bytes, content type) of a variant, rendering it on first use.
+
+        With render=False a variant that hasn't been built yet isn't rendered
+        and its bytes are None. Raises OSError if the original is missing and
+        ValueError (with a message fit for clients) for an unknown variant, a
+        width that isn't offered or an image Pillow can't decode.
+        """
+        if variant not in VARIANT_FORMATS:
+            raise ValueError(f"Format must be one of {', '.join(VARIANT_FORMATS)}")
+        if width is not None:
+            width = self.parse_width(width)
+
+        digest, data = self.asset_store.load(puzzle_type, relpath)
+        etag = f"{digest}-{variant}-{width or 'full'}"
+        content_type = VARIANT_FORMATS[variant][3]
+        cache = self.asset_store.cache
+        key = (puzzle_type, relpath, variant, width)
+        if cache is not None:
+            cached = cache.get(key)
+            if cached is not None and cached[0] == etag:
+                return etag, cached[1], content_type
+
+        path = self._path(digest, variant, width)
+        try:
+            with open(path, 'rb') as f:
+                variant_data = f.read()
+        except FileNotFoundError:
+            if not render:
+                return etag, None, content_type
+            variant_data = self._render(data, variant, width, path)
+        if cache is not None:
+            cache.put(key, etag, variant_data)
+        return etag, variant_data, content_type
+
+    def _render(self, data, variant, width, path):
+        try:
+            variant_data = render_variant(data, variant, width)
+        except (OSError, SyntaxError) as e:
+            raise ValueError('Cannot re-encode image') from e
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temporary file first so other workers never read a partial variant
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(variant_data)
+        os.replace(tmp_path, path)
+        return variant_data
+
+
+def _build_one(args):
+    data_dir, directory, puzzle_type, relpath, variants, widths = args
+    from assets import AssetStore
+    store = VariantStore(AssetStore(data_dir), directory, [width for width in widths if width])
+    built = 0
+    for variant in variants:
+        for width in widths:
+            # A full-size PNG variant would just be the original
+            if variant == 'png' and width is None:
+                continue
+            try:
+                store.get(puzzle_type, relpath, variant, width)
+                built += 1
+            except (OSError, ValueError):
+                pass
+    return built
+
+
+def build_variants(data_dir='captcha_data', directory='image_variants', variants=('webp-lossless',),
+                   widths=(None,), workers=None):
+    """Generate the given variants of every image referenced by the catalog"""
+    from assets import AssetStore
+    from captcha_store import GroundTruthStore, CaptchaCatalog
+
+    catalog = CaptchaCatalog.build(GroundTruthStore(data_dir))
+    asset_store = AssetStore(data_dir)
+    tasks = []
+    for puzzle_type in catalog.types:
+        seen = set()
+        for puzzle_id in catalog.puzzle_ids[puzzle_type]:
+            for relpath in catalog.bundle_assets(puzzle_type, puzzle_id):
+                if relpath in seen or asset_store.content_type(relpath) not in SOURCE_CONTENT_TYPES:
+                    continue
+                seen.add(relpath)
+                tasks.append((data_dir, directory, puzzle_type, relpath, variants, widths))
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return sum(executor.map(_build_one, tasks, chunksize=16))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Pre-generate re-encoded and downscaled image variants')
+    parser.add_argument('--data-dir', default=os.environ.get('CAPTCHA_DATA_DIR', 'captcha_data'))
+    parser.add_argument('--output-dir', default=os.environ.get('IMAGE_VARIANT_DIR', 'image_variants'))
+    parser.add_argument('--formats', default='webp-lossless',
+                        help=f"Comma-separated variants: {', '.join(VARIANT_FORMATS)}")
+    parser.add_argument('--widths', default='',
+                        help='Comma-separated maximum widths (the full size is always built)')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: CPU count)')
+    args = parser.parse_args(argv)
+
+    variants = [v.strip() for v in args.formats.split(',') if v.strip()]
+    unknown = [v for v in variants if v not in VARIANT_FORMATS]
+    if unknown:
+        parser.error(f"Unknown formats: {', '.join(unknown)}")
+    widths = [None] + [int(w) for w in args.widths.split(',') if w.strip()]
+    built = build_variants(args.data_dir, args.output_dir, variants, widths, args.workers)
+    print(f'Built {built} variants in {args.output_dir}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,314 @@
+"""Streaming leaderboard of benchmark results.
+
+Every result is folded into per-(model, type) aggregates as it is recorded:
+counts, correct counts, a running mean and variance of elapsed_time
+(Welford) and a quantile sketch of it. All of them are mergeable, so each
+worker process accumulates the results it sees and periodically merges them
+into one shared snapshot file under a file lock. The snapshot survives
+restarts, and reading the leaderboard costs O(models x types) no matter how
+many results have been recorded.
+"""
+import os
+import json
+import math
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: no cross-process locking, run a single worker process there
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Latency percentiles reported on the leaderboard
+PERCENTILES = (50, 90, 95, 99)
+
+
+class QuantileSketch:
+    """Log-bucketed quantile sketch (DDSketch) with bounded relative error.
+
+    A value x > 0 falls in bucket ceil(log_gamma(x)), and every quantile is
+    answered within `relative_accuracy` of the true value. Zero and negative
+    values share one bucket. Sketches with the same accuracy merge by adding
+    bucket counts.
+    """
+
+    def __init__(self, relative_accuracy=0.01, max_buckets=2048):
+        self.relative_accuracy = relative_accuracy
+        self.max_buckets = max_buckets
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.zero_count = 0
+        self.buckets = {}
+
+    def add(self, value, count=1):
+        if value <= 0:
+            self.zero_count += count
+            return
+        index = math.ceil(math.log(value) / self._log_gamma)
+        self.buckets[index] = self.buckets.get(index, 0) + count
+        if len(self.buckets) > self.max_buckets:
+            self._collapse()
+
+    def _collapse(self):
+        # Fold the lowest buckets together; only the smallest quantiles lose accuracy
+        indices = sorted(self.buckets)
+        excess = indices[:len(indices) - self.max_buckets + 1]
+        self.buckets[excess[-1]] += sum(self.buckets.pop(index) for index in excess[:-1])
+
+    def merge(self, other):
+        self.zero_count += other.zero_count
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        while len(self.buckets) > self.max_buckets:
+            self._collapse()
+
+    @property
+    def count(self):
+        return self.zero_count + sum(self.buckets.values())
+
+    def quantile(self, q):
+        """Approximate q-quantile (0 <= q <= 1), None if the sketch is empty"""
+        total = self.count
+        if not total:
+            return None
+        rank = q * (total - 1)
+        seen = self.zero_count
+        if seen > rank:
+            return 0.0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen > rank:
+                # Midpoint (in relative terms) of the bucket (gamma^(i-1), gamma^i]
+                return 2 * self.gamma ** index / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.buckets) / (self.gamma + 1)
+
+    def to_dict(self):
+        return {
+            'relative_accuracy': self.relative_accuracy,
+            'zero_count': self.zero_count,
+            'buckets': {str(index): count for index, count in self.buckets.items()}
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data.get('relative_accuracy', 0.01))
+        sketch.zero_count = data.get('zero_count', 0)
+        sketch.buckets = {int(index): count for index, count in data.get('buckets', {}).items()}
+        return sketch
+
+
+class ResultStats:
+    """Aggregates of the results of one model on one CAPTCHA type"""
+
+    def __init__(self):
+        self.count = 0
+        # Results that say whether they were correct, and how many were
+        self.judged = 0
+        self.correct = 0
+        # Welford's running mean and sum of squared deviations of elapsed_time
+        self.timed = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = None
+        self.max = None
+        self.sketch = QuantileSketch()
+
+    def add(self, correct, elapsed_time):
+        self.count += 1
+        if correct is not None:
+            self.judged += 1
+            self.correct += int(bool(correct))
+        if elapsed_time is not None:
+            self.timed += 1
+            delta = elapsed_time - self.mean
+            self.mean += delta / self.timed
+            self.m2 += delta * (elapsed_time - self.mean)
+            self.min = elapsed_time if self.min is None else min(self.min, elapsed_time)
+            self.max = elapsed_time if self.max is None else max(self.max, elapsed_time)
+            self.sketch.add(elapsed_time)
+
+    def merge(self, other):
+        self.count += other.count
+        self.judged += other.judged
+        self.correct += other.correct
+        if other.timed:
+            # Chan et al.'s parallel combination of two (count, mean, M2) triples
+            timed = self.timed + other.timed
+            delta = other.mean - self.mean
+            self.mean += delta * other.timed / timed
+            self.m2 += other.m2 + delta * delta * self.timed * other.timed / timed
+            self.timed = timed
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+            self.sketch.merge(other.sketch)
+
+    def summary(self):
+        result = {
+            'count': self.count,
+            'correct': self.correct,
+            'accuracy': self.correct / self.judged if self.judged else 0.0
+        }
+        if self.timed:
+            result['elapsed_time'] = {
+                'mean': self.mean,
+                'stddev': math.sqrt(self.m2 / (self.timed - 1)) if self.timed > 1 else 0.0,
+                'min': self.min,
+                'max': self.max,
+                **{f'p{p}': self.sketch.quantile(p / 100) for p in PERCENTILES}
+            }
+        return result
+
+    def to_dict(self):
+        return {
+            'count': self.count, 'judged': self.judged, 'correct': self.correct,
+            'timed': self.timed, 'mean': self.mean, 'm2': self.m2, 'min': self.min, 'max': self.max,
+            'sketch': self.sketch.to_dict()
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        stats = cls()
+        for key in ('count', 'judged', 'correct', 'timed', 'mean', 'm2', 'min', 'max'):
+            setattr(stats, key, data[key])
+        stats.sketch = QuantileSketch.from_dict(data['sketch'])
+        return stats
+
+
+def _merge_all(into, stats_by_key):
+    for key, stats in stats_by_key.items():
+        target = into.get(key)
+        if target is None:
+            target = into[key] = ResultStats()
+        target.merge(stats)
+
+
+class Leaderboard:
+    """Per-(model, type) result aggregates, persisted in a shared snapshot file.
+
+    Also a results sink: BatchWriter calls write_batch() with every batch of
+    recorded results.
+    """
+
+    def __init__(self, path='leaderboard.json', snapshot_interval=10.0):
+        self.path = path
+        self.snapshot_interval = snapshot_interval
+        # Results seen by this process that are not in the snapshot file yet
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._last_snapshot = time.monotonic()
+        # Parsed snapshot file and the (mtime_ns, size) it was parsed at
+        self._snapshot = {}
+        self._snapshot_signature = None
+        self._snapshot_lock = threading.Lock()
+
+    def write_batch(self, records):
+        with self._lock:
+            for record in records:
+                key = (str(record.get('model') or 'unknown'), str(record.get('puzzle_type')))
+                stats = self._pending.get(key)
+                if stats is None:
+                    stats = self._pending[key] = ResultStats()
+                try:
+                    elapsed_time = float(record['elapsed_time'])
+                except (KeyError, ValueError, TypeError):
+                    elapsed_time = None
+                if elapsed_time is not None and not math.isfinite(elapsed_time):
+                    elapsed_time = None
+                stats.add(record.get('correct'), elapsed_time)
+        self.idle()
+
+    def idle(self):
+        """Snapshot if the last snapshot is older than snapshot_interval"""
+        if time.monotonic() - self._last_snapshot >= self.snapshot_interval:
+            self.snapshot()
+
+    @contextmanager
+    def _locked(self):
+        if fcntl is None:
+            yield
+            return
+        with open(f'{self.path}.lock', 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_snapshot(self):
+        # Re-parse the snapshot file only when it has changed
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return {}
+        signature = (stat.st_mtime_ns, stat.st_size)
+        with self._snapshot_lock:
+            if signature != self._snapshot_signature:
+                try:
+                    with open(self.path, 'r') as f:
+                        data = json.load(f)
+                    self._snapshot = {(entry['model'], entry['puzzle_type']): ResultStats.from_dict(entry['stats'])
+                                      for entry in data.get('entries', [])}
+                except (ValueError, KeyError, TypeError, AttributeError):
+                    # e.g. truncated by a full disk: start over rather than fail every read and snapshot
+                    logger.exception('Ignoring corrupt leaderboard snapshot %s, the next snapshot replaces it',
+                                     self.path)
+                    self._snapshot = {}
+                self._snapshot_signature = signature
+            return self._snapshot
+
+    def snapshot(self):
+        """Merge this process's pending results into the snapshot file"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_snapshot = time.monotonic()
+        if not pending:
+            return
+        try:
+            with self._locked():
+                merged = {}
+                _merge_all(merged, self._read_snapshot())
+                _merge_all(merged, pending)
+                entries = [{'model': model, 'puzzle_type': puzzle_type, 'stats': stats.to_dict()}
+                           for (model, puzzle_type), stats in sorted(merged.items())]
+                # Write to a temporary file first so readers never see a partial snapshot
+                tmp_path = f'{self.path}.{os.getpid()}.tmp'
+                with open(tmp_path, 'w') as f:
+                    json.dump({'updated': time.time(), 'entries': entries}, f)
+                os.replace(tmp_path, self.path)
+        except BaseException:
+            # Keep the results for the next snapshot
+            with self._lock:
+                _merge_all(pending, self._pending)
+                self._pending = pending
+            raise
+
+    def stats(self):
+        """{(model, type): ResultStats} of the snapshot plus this process's pending results"""
+        merged = {}
+        _merge_all(merged, self._read_snapshot())
+        with self._lock:
+            _merge_all(merged, self._pending)
+        return merged
+
+    def standings(self, model=None, puzzle_type=None):
+        """Models ranked by accuracy, each with overall and per-type summaries"""
+        by_model = {}
+        for (entry_model, entry_type), stats in self.stats().items():
+            if (model is not None and entry_model != model) or (puzzle_type is not None and entry_type != puzzle_type):
+                continue
+            overall, types = by_model.setdefault(entry_model, (ResultStats(), {}))
+            overall.merge(stats)
+            types[entry_type] = stats.summary()
+
+        standings = [dict(overall.summary(), model=entry_model, types=types)
+                     for entry_model, (overall, types) in by_model.items()]
+        standings.sort(key=lambda entry: (-entry['accuracy'], -entry['count'], entry['model']))
+        return standings
+
+    def close(self):
+        self.snapshot()
@@ -0,0 +1,450 @@
+"""Load test: N concurrent headless agents against a running server.
+
+Each agent plays the full loop over one keep-alive connection, as fast as the
+server allows:
+
+    GET  /api/get_puzzle             (session per agent)
+    GET  every image of the puzzle
+    POST /api/check_answer           (a random answer of the right shape)
+    POST /api/benchmark_results
+
+and requests/sec plus p50/p95/p99 latencies are reported per endpoint and per
+puzzle type. Results are saved as JSON (with the git commit) so runs can be
+compared:
+
+    python loadtest.py --url http://127.0.0.1:7860 --agents 32 --duration 30
+    python loadtest.py --serve --synthetic /tmp/loadtest_data --agents 32 --compare before.json
+
+--serve starts a local server (gunicorn, with gunicorn.conf.py) on a free
+port for the run; --synthetic first generates a dataset of every puzzle
+type for it with generate_dataset.py, so the test runs fully locally. Agents
+are threads; use --processes to spread them over several client processes
+when the client itself becomes the bottleneck.
+"""
+import os
+import sys
+import json
+import time
+import random
+import socket
+import tempfile
+import argparse
+import threading
+import subprocess
+import http.client
+from datetime import datetime
+from urllib.parse import urlsplit, urlencode
+from multiprocessing import Pool
+
+from generate_dataset import generate_dataset
+
+# Latency percentiles reported for every endpoint and type
+PERCENTILES = (50, 95, 99)
+ENDPOINTS = ('get_puzzle', 'asset', 'check_answer', 'benchmark_results')
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Answer shape of every type, for random answers that the checkers can score
+POINT_TYPES = ('Geometry_Click', 'Slide_Puzzle', 'Place_Dot', 'Misleading_Click', 'Pick_Area')
+SET_TYPES = ('Unusual_Detection', 'Image_Recognition', 'Patch_Select', 'Select_Animal')
+OPTION_TYPES = ('Image_Matching', 'Dart_Count', 'Object_Match', 'Coordinates', 'Path_Finder', 'Connect_icon')
+
+
+def random_answer(puzzle_type, rng):
+    if puzzle_type == 'Dice_Count':
+        return rng.randint(2, 30)
+    if puzzle_type in POINT_TYPES:
+        return [rng.randint(0, 400), rng.randint(0, 300)]
+    if puzzle_type == 'Rotation_Match':
+        return rng.randrange(0, 360, 45)
+    if puzzle_type in SET_TYPES:
+        return sorted(rng.sample(range(9), rng.randint(1, 3)))
+    if puzzle_type == 'Bingo':
+        return rng.sample(range(9), 2)
+    if puzzle_type in OPTION_TYPES:
+        return rng.randint(0, 3)
+    if puzzle_type == 'Click_Order':
+        return [[rng.randint(0, 400), rng.randint(0, 300)] for _ in range(4)]
+    if puzzle_type == 'Hold_Button':
+        return round(rng.uniform(1, 5), 2)
+    return 'answer'
+
+
+def puzzle_asset_urls(payload):
+    """Every image URL of a get_puzzle payload"""
+    urls = []
+    for value in payload.values():
+        for url in value if isinstance(value, list) else [value]:
+            # Image_Recognition's image_path names a directory, not an image
+            if (isinstance(url, str) and url.startswith('/captcha_data/')
+                    and os.path.splitext(url.split('?')[0])[1]):
+                urls.append(url)
+    return urls
+
+
+class Recorder:
+    """Latencies and errors of one agent thread, by (endpoint, puzzle type)"""
+
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self.bytes = 0
+        self.loops = 0
+
+    def add(self, endpoint, puzzle_type, elapsed, ok):
+        key = (endpoint, puzzle_type or '')
+        if ok:
+            self.latencies.setdefault(key, []).append(elapsed)
+        else:
+            self.errors[key] = self.errors.get(key, 0) + 1
+
+    def merge(self, other):
+        for key, values in other.latencies.items():
+            self.latencies.setdefault(key, []).extend(values)
+        for key, count in other.errors.items():
+            self.errors[key] = self.errors.get(key, 0) + count
+        self.bytes += other.bytes
+        self.loops += other.loops
+
+
+class Agent:
+    """One simulated agent with its own keep-alive connection and session"""
+
+    def __init__(self, url, agent_id, seed, puzzle_type=None, timeout=30):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.timeout = timeout
+        self.session = f'loadtest-{seed}-{agent_id}'
+        self.puzzle_type = puzzle_type
+        self.rng = random.Random(f'{seed}-{agent_id}')
+        self.recorder = Recorder()
+        self.conn = None
+
+    def request(self, method, path, body=None):
+        """(status, body bytes, seconds); reconnects once if the server closed the connection"""
+        headers = {'Content-Type': 'application/json'} if body is not None else {}
+        data = json.dumps(body).encode('utf-8') if body is not None else None
+        for attempt in range(2):
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            started = time.perf_counter()
+            try:
+                self.conn.request(method, path, body=data, headers=headers)
+                response = self.conn.getresponse()
+                payload = response.read()
+            except (http.client.HTTPException, OSError):
+                self.conn.close()
+                self.conn = None
+                if attempt:
+                    raise
+                continue
+            elapsed = time.perf_counter() - started
+            if response.will_close:
+                self.conn.close()
+                self.conn = None
+            self.recorder.bytes += len(payload)
+            return response.status, payload, elapsed
+
+    def _call(self, endpoint, puzzle_type, method, path, body=None):
+        try:
+            status, payload, elapsed = self.request(method, path, body)
+        except (http.client.HTTPException, OSError):
+            self.recorder.add(endpoint, puzzle_type, 0, False)
+            return None
+        self.recorder.add(endpoint, puzzle_type, elapsed, status < 400)
+        return payload if status < 400 else None
+
+    def run_loop(self):
+        query = {'session': self.session}
+        if self.puzzle_type:
+            query['type'] = self.puzzle_type
+        else:
+            query['random'] = 'true'
+        try:
+            status, payload, elapsed = self.request('GET', f'/api/get_puzzle?{urlencode(query)}')
+        except (http.client.HTTPException, OSError):
+            self.recorder.add('get_puzzle', self.puzzle_type, 0, False)
+            return
+        # With random types, the type is only known from the response
+        puzzle = json.loads(payload) if status < 400 else {}
+        puzzle_type = puzzle.get('puzzle_type', self.puzzle_type)
+        self.recorder.add('get_puzzle', puzzle_type, elapsed, status < 400)
+        if status >= 400:
+            return
+        for url in puzzle_asset_urls(puzzle):
+            self._call('asset', puzzle_type, 'GET', url)
+
+        answer = random_answer(puzzle_type, self.rng)
+        elapsed_time = round(self.rng.uniform(1, 20), 3)
+        result = self._call('check_answer', puzzle_type, 'POST', '/api/check_answer', {
+            'puzzle_type': puzzle_type, 'puzzle_id': puzzle['puzzle_id'],
+            'answer': answer, 'elapsed_time': elapsed_time
+        })
+        correct = json.loads(result).get('correct') if result is not None else None
+        self._call('benchmark_results', puzzle_type, 'POST', f'/api/benchmark_results?session={self.session}', {
+            'puzzle_type': puzzle_type, 'puzzle_id': puzzle['puzzle_id'], 'user_answer': answer,
+            'correct': correct, 'elapsed_time': elapsed_time, 'model': 'loadtest'
+        })
+        self.recorder.loops += 1
+
+    def run(self, deadline, max_loops=None):
+        while time.monotonic() < deadline and (max_loops is None or self.recorder.loops < max_loops):
+            self.run_loop()
+        if self.conn is not None:
+            self.conn.close()
+
+
+def run_agents(args):
+    """Run agents [first, first + count) in threads of this process, returns their merged Recorder"""
+    url, first, count, seed, puzzle_type, duration, loops_per_agent = args
+    deadline = time.monotonic() + duration
+    agents = [Agent(url, agent_id, seed, puzzle_type) for agent_id in range(first, first + count)]
+    threads = [threading.Thread(target=agent.run, args=(deadline, loops_per_agent), daemon=True)
+               for agent in agents]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    recorder = Recorder()
+    for agent in agents:
+        recorder.merge(agent.recorder)
+    return recorder
+
+
+def _percentile(sorted_values, percent):
+    # Nearest-rank percentile, like score_results.py
+    index = max(0, -(-len(sorted_values) * percent // 100) - 1)
+    return sorted_values[index]
+
+
+def _summarize(latencies, errors, wall_time):
+    latencies = sorted(latencies)
+    result = {
+        'count': len(latencies),
+        'errors': errors,
+        'requests_per_second': len(latencies) / wall_time if wall_time else 0.0
+    }
+    if latencies:
+        result['latency_ms'] = {
+            'mean': sum(latencies) / len(latencies) * 1000,
+            'max': latencies[-1] * 1000,
+            **{f'p{p}': _percentile(latencies, p) * 1000 for p in PERCENTILES}
+        }
+    return result
+
+
+def summarize(recorder, wall_time):
+    """Per-endpoint and per-type/endpoint summaries of a run"""
+    endpoints = {}
+    puzzle_types = {}
+    keys = set(recorder.latencies) | set(recorder.errors)
+    for endpoint in ENDPOINTS:
+        latencies = [v for (e, _), values in recorder.latencies.items() if e == endpoint for v in values]
+        errors = sum(count for (e, _), count in recorder.errors.items() if e == endpoint)
+        if latencies or errors:
+            endpoints[endpoint] = _summarize(latencies, errors, wall_time)
+    for endpoint, puzzle_type in sorted(keys):
+        if not puzzle_type:
+            continue
+        puzzle_types.setdefault(puzzle_type, {})[endpoint] = _summarize(
+            recorder.latencies.get((endpoint, puzzle_type), []),
+            recorder.errors.get((endpoint, puzzle_type), 0), wall_time)
+    requests = sum(len(values) for values in recorder.latencies.values())
+    errors = sum(recorder.errors.values())
+    return {
+        'totals': {
+            'requests': requests,
+            'errors': errors,
+            'requests_per_second': requests / wall_time if wall_time else 0.0,
+            'loops': recorder.loops,
+            'loops_per_second': recorder.loops / wall_time if wall_time else 0.0,
+            'bytes_received': recorder.bytes
+        },
+        'endpoints': endpoints,
+        'puzzle_types': puzzle_types
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=APP_DIR, capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run(url, agents=16, duration=30, processes=1, seed=0, puzzle_type=None, loops_per_agent=None):
+    """Run a load test, returns the report written by the CLI"""
+    processes = max(1, min(processes, agents))
+    per_process = [agents // processes + (1 if i < agents % processes else 0) for i in range(processes)]
+    tasks = []
+    first = 0
+    for count in per_process:
+        tasks.append((url, first, count, seed, puzzle_type, duration, loops_per_agent))
+        first += count
+
+    started_at = datetime.now().isoformat()
+    started = time.monotonic()
+    if processes == 1:
+        recorder = run_agents(tasks[0])
+    else:
+        with Pool(processes) as pool:
+            recorder = Recorder()
+            for partial in pool.map(run_agents, tasks):
+                recorder.merge(partial)
+    wall_time = time.monotonic() - started
+
+    return {
+        'started_at': started_at,
+        'commit': git_commit(),
+        'url': url,
+        'agents': agents,
+        'processes': processes,
+        'seed': seed,
+        'puzzle_type': puzzle_type,
+        'wall_time': wall_time,
+        **summarize(recorder, wall_time)
+    }
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(data_dir, scratch, workers=1, threads=4):
+    """Start a local server for data_dir on a free port; returns (process, url).
+
+    Everything the server writes goes to the `scratch` directory, which the
+    caller removes after the run.
+    """
+    port = _free_port()
+    env = dict(os.environ,
+               CAPTCHA_DATA_DIR=os.path.abspath(data_dir),
+               BIND=f'127.0.0.1:{port}', WEB_CONCURRENCY=str(workers), GUNICORN_THREADS=str(threads),
+               # Keep the run's results, state and caches out of the working and data directories
+               RESULTS_PATH=os.path.join(scratch, 'benchmark_results.json'),
+               RESULTS_DB_PATH=os.path.join(scratch, 'benchmark_results.db'),
+               LEADERBOARD_PATH=os.path.join(scratch, 'leaderboard.json'),
+               SESSION_DB_PATH=os.path.join(scratch, 'sessions.db'),
+               EPISODE_DIR=os.path.join(scratch, 'episodes'),
+               IMAGE_VARIANT_DIR=os.path.join(scratch, 'image_variants'),
+               PROFILE_DIR=os.path.join(scratch, 'profiles'),
+               METRICS_DIR=os.path.join(scratch, 'metrics'))
+    try:
+        import gunicorn  # noqa: F401
+        command = [sys.executable, '-m', 'gunicorn', '-c', os.path.join(APP_DIR, 'gunicorn.conf.py'),
+                   '--pythonpath', APP_DIR, 'app:app']
+    except ImportError:
+        command = [sys.executable, '-c',
+                   f"import app; app.app.run(host='127.0.0.1', port={port}, threaded=True)"]
+    process = subprocess.Popen(command, cwd=APP_DIR, env=env)
+
+    url = f'http://127.0.0.1:{port}'
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError('The server exited during startup')
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            conn.request('GET', '/api/types')
+            if conn.getresponse().status == 200:
+                conn.close()
+                return process, url
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    process.wait()
+    raise RuntimeError('The server did not start within 60 seconds')
+
+
+def print_report(report, baseline=None, out=sys.stdout):
+    totals = report['totals']
+    print(f"{totals['requests']} requests ({totals['errors']} errors) in {report['wall_time']:.1f}s: "
+          f"{totals['requests_per_second']:.1f} req/s, {totals['loops_per_second']:.1f} puzzles/s", file=out)
+    header = f"{'Endpoint':<20} {'Count':>8} {'Errors':>7} {'req/s':>9} {'p50(ms)':>9} {'p95(ms)':>9} {'p99(ms)':>9}"
+    print(header, file=out)
+    print('-' * len(header), file=out)
+
+    def row(name, result, indent=''):
+        latency = result.get('latency_ms', {})
+        cells = [f"{latency[f'p{p}']:.2f}" if latency else '-' for p in PERCENTILES]
+        print(f"{indent + name:<20} {result['count']:>8} {result['errors']:>7} "
+              f"{result['requests_per_second']:>9.1f} {cells[0]:>9} {cells[1]:>9} {cells[2]:>9}", file=out)
+
+    for endpoint, result in report['endpoints'].items():
+        row(endpoint, result)
+    for puzzle_type, endpoints in report['puzzle_types'].items():
+        print(puzzle_type, file=out)
+        for endpoint, result in endpoints.items():
+            row(endpoint, result, '  ')
+
+    if baseline:
+        print(f"\nCompared with {baseline.get('commit') or 'baseline'} ({baseline.get('started_at')}):", file=out)
+        for endpoint, result in report['endpoints'].items():
+            before = baseline.get('endpoints', {}).get(endpoint)
+            if not before or 'latency_ms' not in before or 'latency_ms' not in result:
+                continue
+            changes = [f"req/s {_change(before['requests_per_second'], result['requests_per_second'])}"]
+            changes += [f"p{p} {_change(before['latency_ms'][f'p{p}'], result['latency_ms'][f'p{p}'])}"
+                        for p in PERCENTILES]
+            print(f"  {endpoint:<18} " + ', '.join(changes), file=out)
+
+
+def _change(before, after):
+    return f'{(after - before) / before * 100:+.1f}%' if before else 'n/a'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Load-test a running Open CaptchaWorld server')
+    parser.add_argument('--url', default='http://127.0.0.1:7860', help='Server to test (ignored with --serve)')
+    parser.add_argument('--agents', type=int, default=16, help='Concurrent simulated agents')
+    parser.add_argument('--duration', type=float, default=30, help='Seconds to run')
+    parser.add_argument('--loops', type=int, default=None, help='Stop each agent after this many puzzles')
+    parser.add_argument('--processes', type=int, default=1, help='Client processes the agents are spread over')
+    parser.add_argument('--type', dest='puzzle_type', help='Only request this puzzle type (default: random types)')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the agents (and of --synthetic)')
+    parser.add_argument('--serve', action='store_true', help='Start a local server for the run')
+    parser.add_argument('--data-dir', default=os.environ.get('CAPTCHA_DATA_DIR', 'captcha_data'),
+                        help='Dataset served with --serve')
+    parser.add_argument('--synthetic', metavar='DIR', help='Write a synthetic dataset to DIR and serve it')
+    parser.add_argument('--synthetic-puzzles', type=int, default=50, help='Puzzles per type of --synthetic')
+    parser.add_argument('--server-workers', type=int, default=1, help='gunicorn workers with --serve')
+    parser.add_argument('--server-threads', type=int, default=4, help='Threads per gunicorn worker with --serve')
+    parser.add_argument('--output', help='Report file (default: loadtest-<timestamp>.json)')
+    parser.add_argument('--compare', metavar='REPORT', help='Print changes relative to an earlier report')
+    args = parser.parse_args(argv)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    server = None
+    url = args.url
+    if args.synthetic:
+        generate_dataset(args.synthetic, args.synthetic_puzzles, args.seed)
+        args.data_dir = args.synthetic
+        args.serve = True
+    scratch = tempfile.TemporaryDirectory(prefix='loadtest-') if args.serve else None
+    try:
+        if args.serve:
+            server, url = start_server(args.data_dir, scratch.name, args.server_workers, args.server_threads)
+        report = run(url, args.agents, args.duration, args.processes, args.seed, args.puzzle_type, args.loops)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+        if scratch is not None:
+            scratch.cleanup()
+
+    print_report(report, baseline)
+    output = args.output or f"loadtest-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'\nReport written to {output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,298 @@
+"""Prometheus-style metrics, rendered in the text exposition format.
+
+Counters and histograms are updated without locks: every thread increments
+its own shard (a plain dict), and shards are only summed when /metrics is
+scraped. Shards of exited threads are folded into one retired total, so a
+server starting a thread per connection doesn't accumulate them. Gauges are
+read from collector callbacks at scrape time, so they cost nothing between
+scrapes.
+
+With several worker processes, set METRICS_DIR (gunicorn.conf.py does): each process then writes
+its totals to `<METRICS_DIR>/metrics-<pid>.json` every few seconds from a
+background thread, and a
+scrape answered by any worker sums the files of all of them. Counters of
+exited workers keep counting; their gauges are dropped.
+"""
+import os
+import json
+import time
+import bisect
+import atexit
+import threading
+
+# Default latency buckets, in seconds
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Counter:
+    """Monotonic counter with a fixed set of label names"""
+
+    type = 'counter'
+
+    def __init__(self, registry, name, documentation, labelnames=()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def inc(self, *labelvalues, amount=1):
+        values = self.registry._shard()
+        key = (self.name, labelvalues)
+        values[key] = values.get(key, 0) + amount
+
+
+class Histogram:
+    """Distribution of observed values over fixed buckets"""
+
+    type = 'histogram'
+
+    def __init__(self, registry, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, *labelvalues):
+        values = self.registry._shard()
+        key = (self.name, labelvalues)
+        # Per-bucket (not cumulative) counts, then +Inf, sum and count
+        state = values.get(key)
+        if state is None:
+            state = values[key] = [0] * (len(self.buckets) + 3)
+        state[bisect.bisect_left(self.buckets, value)] += 1
+        state[-2] += value
+        state[-1] += 1
+
+
+def _merge(totals, key, value):
+    if isinstance(value, list):
+        current = totals.get(key)
+        totals[key] = list(value) if current is None else [a + b for a, b in zip(current, value)]
+    else:
+        totals[key] = totals.get(key, 0) + value
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class MetricsRegistry:
+    """Metrics of this process (and, with a directory, of its sibling workers)"""
+
+    def __init__(self, directory=None, dump_interval=5.0):
+        self.metrics = {}
+        # name -> (type, documentation, labelnames, callback returning {labelvalues: value})
+        self.collectors = {}
+        self.directory = directory
+        self.dump_interval = dump_interval
+        self._local = threading.local()
+        # (thread, shard) of every thread that recorded a value and may still be running
+        self._shards = []
+        # Summed shards of threads that have exited
+        self._retired = {}
+        self._lock = threading.Lock()
+        # Process whose dump thread is running
+        self._dump_pid = None
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            atexit.register(self.dump)
+            # A forked worker starts from zero; the parent's totals are in the parent's own file
+            if hasattr(os, 'register_at_fork'):
+                os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self._local = threading.local()
+        self._shards = []
+        self._retired = {}
+        self._lock = threading.Lock()
+
+    def _shard(self):
+        values = getattr(self._local, 'values', None)
+        if values is None:
+            values = self._local.values = {}
+            # Only registering a new thread's shard takes the lock
+            with self._lock:
+                self._retire_exited()
+                self._shards.append((threading.current_thread(), values))
+        return values
+
+    def _retire_exited(self):
+        # With the lock held: an exited thread can't write its shard anymore, so fold it in
+        running = []
+        for thread, values in self._shards:
+            if thread.is_alive():
+                running.append((thread, values))
+            else:
+                for key, value in values.items():
+                    _merge(self._retired, key, value)
+        self._shards = running
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.metrics.setdefault(name, Counter(self, name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.metrics.setdefault(name, Histogram(self, name, documentation, labelnames, buckets))
+
+    def gauge(self, name, documentation, labelnames, callback):
+        """Register a gauge whose values callback() returns as {labelvalues tuple: value}"""
+        self.collectors[name] = ('gauge', documentation, tuple(labelnames), callback)
+
+    def collected_counter(self, name, documentation, labelnames, callback):
+        """Like gauge(), for a monotonic total kept elsewhere (e.g. cache hits)"""
+        self.collectors[name] = ('counter', documentation, tuple(labelnames), callback)
+
+    def values(self):
+        """{(name, labelvalues): value} summed over the shards of this process"""
+        totals = {}
+        with self._lock:
+            self._retire_exited()
+            shards = [values for _, values in self._shards]
+            for key, value in self._retired.items():
+                _merge(totals, key, value)
+        for shard in shards:
+            # Copying a dict is atomic under the GIL, so owners may keep writing
+            for key, value in list(shard.items()):
+                _merge(totals, key, value)
+        return totals
+
+    def collect(self):
+        """{(name, labelvalues): value} of the collector callbacks"""
+        collected = {}
+        for name, (_, _, _, callback) in self.collectors.items():
+            for labelvalues, value in callback().items():
+                collected[(name, tuple(labelvalues))] = value
+        return collected
+
+    def _dump_path(self, pid):
+        return os.path.join(self.directory, f'metrics-{pid}.json')
+
+    def dump(self):
+        """Write this process's totals to the metrics directory"""
+        if not self.directory:
+            return
+        data = {
+            'values': [[name, list(labels), value] for (name, labels), value in self.values().items()],
+            'collected': [[name, list(labels), value] for (name, labels), value in self.collect().items()]
+        }
+        path = self._dump_path(os.getpid())
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    def clear_directory(self):
+        """Remove the totals of other processes, e.g. of a previous server run"""
+        if not self.directory:
+            return
+        for filename in os.listdir(self.directory):
+            if filename.startswith('metrics-'):
+                try:
+                    os.remove(os.path.join(self.directory, filename))
+                except FileNotFoundError:
+                    pass
+        self.dump()
+
+    def start_dumping(self):
+        """Start this process's thread that dump()s every dump_interval; cheap enough to call per request"""
+        # Threads don't survive fork(), so each worker process starts its own
+        if not self.directory or self._dump_pid == os.getpid():
+            return
+        with self._lock:
+            if self._dump_pid == os.getpid():
+                return
+            self._dump_pid = os.getpid()
+            threading.Thread(target=self._dump_loop, name='metrics-dump', daemon=True).start()
+
+    def _dump_loop(self):
+        while True:
+            time.sleep(self.dump_interval)
+            try:
+                self.dump()
+            except OSError:
+                # e.g. the directory was removed; try again next time
+                pass
+
+    def _sibling_totals(self):
+        values, collected = {}, {}
+        own = os.path.basename(self._dump_path(os.getpid()))
+        for filename in os.listdir(self.directory):
+            if not filename.startswith('metrics-') or not filename.endswith('.json') or filename == own:
+                continue
+            try:
+                with open(os.path.join(self.directory, filename)) as f:
+                    data = json.load(f)
+                pid = int(filename[len('metrics-'):-len('.json')])
+            except (OSError, ValueError):
+                continue
+            for name, labels, value in data['values']:
+                _merge(values, (name, tuple(labels)), value)
+            if _alive(pid):
+                for name, labels, value in data['collected']:
+                    _merge(collected, (name, tuple(labels)), value)
+        return values, collected
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format (version 0.0.4)"""
+        values = self.values()
+        collected = self.collect()
+        if self.directory:
+            sibling_values, sibling_collected = self._sibling_totals()
+            for key, value in sibling_values.items():
+                _merge(values, key, value)
+            for key, value in sibling_collected.items():
+                _merge(collected, key, value)
+
+        by_name = {}
+        for (name, labels), value in list(values.items()) + list(collected.items()):
+            by_name.setdefault(name, []).append((labels, value))
+
+        lines = []
+        for name, metric in self.metrics.items():
+            lines.append(f'# HELP {name} {metric.documentation}')
+            lines.append(f'# TYPE {name} {metric.type}')
+            for labels, value in sorted(by_name.get(name, [])):
+                if metric.type == 'counter':
+                    lines.append(f'{name}{_labels(metric.labelnames, labels)} {_number(value)}')
+                    continue
+                cumulative = 0
+                for bound, count in zip(metric.buckets + (float('inf'),), value):
+                    cumulative += count
+                    le = _labels(metric.labelnames, labels, [('le', _number(bound))])
+                    lines.append(f'{name}_bucket{le} {cumulative}')
+                lines.append(f'{name}_sum{_labels(metric.labelnames, labels)} {_number(value[-2])}')
+                lines.append(f'{name}_count{_labels(metric.labelnames, labels)} {value[-1]}')
+        for name, (metric_type, documentation, labelnames, _) in self.collectors.items():
+            lines.append(f'# HELP {name} {documentation}')
+            lines.append(f'# TYPE {name} {metric_type}')
+            for labels, value in sorted(by_name.get(name, [])):
+                lines.append(f'{name}{_labels(labelnames, labels)} {_number(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        # e.g. PermissionError: the process exists but belongs to someone else
+        return True
+    return True
+
+
+# Metrics of the server process, shared by the modules that record them
+REGISTRY = MetricsRegistry(os.environ.get('METRICS_DIR') or None)
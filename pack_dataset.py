@@ -0,0 +1,95 @@
+"""Pack a captcha_data directory into a single dataset pack file.
+
+    python pack_dataset.py captcha_data captcha_data.pack
+    CAPTCHA_DATA_DIR=captcha_data.pack python app.py
+
+The pack holds every file of the dataset (images and ground truth) plus an
+index of their offsets and SHA-256 digests; its layout is described in
+dataset_source.py. Serving from a pack opens one file at startup instead of
+listing and stat-ing thousands, and images are read from the memory-mapped
+pack, which every worker process shares through the page cache.
+
+Hidden files are skipped. The pack is written to a temporary file and moved
+into place, so a running server can pick up a new pack with
+/api/reload_catalog (or SIGHUP) without ever reading a partial one.
+"""
+import os
+import json
+import hashlib
+import argparse
+
+from dataset_source import PACK_MAGIC, PACK_HEADER, PackSource
+
+
+def dataset_files(base_dir):
+    """Sorted dataset paths ('<type>/<relative path>') of every file below base_dir"""
+    paths = []
+    for root, dirs, files in os.walk(base_dir):
+        dirs[:] = [d for d in dirs if not d.startswith('.')]
+        relroot = os.path.relpath(root, base_dir)
+        for filename in files:
+            if filename.startswith('.'):
+                continue
+            relpath = filename if relroot == '.' else os.path.join(relroot, filename)
+            paths.append(relpath.replace(os.sep, '/'))
+    return sorted(paths)
+
+
+def write_pack(base_dir, pack_path):
+    """Write every file below base_dir into a pack at pack_path, returns the file count"""
+    paths = dataset_files(base_dir)
+    files = {}
+    tmp_path = f'{pack_path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as out:
+        # The header is rewritten once the index position is known
+        out.write(PACK_HEADER.pack(PACK_MAGIC, 0, 0))
+        for relpath in paths:
+            with open(os.path.join(base_dir, *relpath.split('/')), 'rb') as f:
+                data = f.read()
+            files[relpath] = [out.tell(), len(data), hashlib.sha256(data).hexdigest()]
+            out.write(data)
+
+        index = json.dumps({'files': files}, separators=(',', ':')).encode('utf-8')
+        index_offset = out.tell()
+        out.write(index)
+        out.seek(0)
+        out.write(PACK_HEADER.pack(PACK_MAGIC, index_offset, len(index)))
+        out.flush()
+        os.fsync(out.fileno())
+    os.replace(tmp_path, pack_path)
+    return len(files)
+
+
+def verify_pack(base_dir, pack_path):
+    """Paths whose pack contents differ from the files below base_dir"""
+    pack = PackSource(pack_path)
+    expected = set(dataset_files(base_dir))
+    mismatched = sorted(expected.symmetric_difference(pack.files))
+    for relpath in sorted(expected.intersection(pack.files)):
+        with open(os.path.join(base_dir, *relpath.split('/')), 'rb') as f:
+            if f.read() != pack.read(relpath)[1]:
+                mismatched.append(relpath)
+    return mismatched
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Pack a CAPTCHA data directory into one indexed file')
+    parser.add_argument('data_dir', nargs='?', default='captcha_data')
+    parser.add_argument('pack_path', nargs='?', default='captcha_data.pack')
+    parser.add_argument('--verify', action='store_true', help='Compare the pack with the directory afterwards')
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.data_dir):
+        parser.error(f'{args.data_dir} is not a directory')
+    count = write_pack(args.data_dir, args.pack_path)
+    print(f'Packed {count} files into {args.pack_path} ({os.path.getsize(args.pack_path)} bytes)')
+    if args.verify:
+        mismatched = verify_pack(args.data_dir, args.pack_path)
+        if mismatched:
+            print(f"{len(mismatched)} files differ: {', '.join(mismatched[:10])}")
+            raise SystemExit(1)
+        print('Pack verified')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,211 @@
+"""On-demand profiling of a running server.
+
+A capture profiles this process for a number of seconds and/or requests and
+writes two files to the profile directory:
+
+- `<name>.pstats`: cProfile statistics of the requests handled during the
+  capture, merged (open with `python -m pstats` or snakeviz)
+- `<name>.collapsed`: stacks of every thread, sampled every few
+  milliseconds, in the collapsed format of flamegraph.pl and speedscope
+  ("frame;frame;frame count" per line, outermost frame first)
+
+Each request is profiled by its own cProfile.Profile, so requests handled by
+other threads don't mix into each other's call stacks. The sampler also sees
+time spent outside views (e.g. the BatchWriter thread).
+"""
+import os
+import sys
+import time
+import signal
+import pstats
+import cProfile
+import threading
+from datetime import datetime
+
+
+def _frame_label(code):
+    return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+
+class StackSampler:
+    """Counts the call stacks of threads, sampled every `interval` seconds by a daemon thread"""
+
+    def __init__(self, interval=0.005, thread_ids=None):
+        self.interval = interval
+        # Only these threads are sampled, all of them if None
+        self.thread_ids = thread_ids
+        self.counts = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id or (self.thread_ids is not None and thread_id not in self.thread_ids):
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                key = ';'.join(reversed(stack))
+                self.counts[key] = self.counts.get(key, 0) + 1
+
+    def collapsed(self):
+        return ''.join(f'{stack} {count}\n' for stack, count in sorted(self.counts.items()))
+
+
+class ProfileCapture:
+    """One profiling run, ended after `seconds` and/or `requests`, whichever comes first"""
+
+    def __init__(self, directory, name, seconds=None, requests=None, interval=0.005, thread_ids=None):
+        self.directory = directory
+        self.name = name
+        self.deadline = time.monotonic() + seconds if seconds else None
+        self.max_requests = requests
+        self.requests = 0
+        self.stats = None
+        self.paths = None
+        self.sampler = StackSampler(interval, thread_ids)
+        self._lock = threading.Lock()
+        self._finished = threading.Event()
+
+    def start(self):
+        self.sampler.start()
+        if self.deadline is not None:
+            threading.Thread(target=self._finish_at_deadline, name='profile-capture', daemon=True).start()
+        return self
+
+    def _finish_at_deadline(self):
+        if not self._finished.wait(self.deadline - time.monotonic()):
+            self.finish()
+
+    @property
+    def active(self):
+        return not self._finished.is_set()
+
+    def add(self, profile):
+        """Merge the profile of one finished request; finishes the capture after the last request"""
+        profile.create_stats()
+        with self._lock:
+            if self._finished.is_set():
+                return
+            if self.stats is None:
+                self.stats = pstats.Stats(profile)
+            else:
+                self.stats.add(profile)
+            self.requests += 1
+            done = self.max_requests is not None and self.requests >= self.max_requests
+        if done:
+            self.finish()
+
+    def finish(self):
+        """Stop sampling and write the output files; returns their paths"""
+        with self._lock:
+            if self._finished.is_set():
+                return self.paths
+            self._finished.set()
+        self.sampler.stop()
+        os.makedirs(self.directory, exist_ok=True)
+        base = os.path.join(self.directory, self.name)
+        paths = []
+        if self.stats is not None:
+            self.stats.dump_stats(f'{base}.pstats')
+            paths.append(f'{base}.pstats')
+        with open(f'{base}.collapsed', 'w') as f:
+            f.write(self.sampler.collapsed())
+        paths.append(f'{base}.collapsed')
+        self.paths = paths
+        return paths
+
+    def info(self):
+        return {
+            'name': self.name,
+            'active': self.active,
+            'requests': self.requests,
+            'max_requests': self.max_requests,
+            'seconds_left': max(0.0, self.deadline - time.monotonic()) if self.deadline and self.active else None,
+            'files': self.paths
+        }
+
+
+class Profiler:
+    """Starts captures and profiles the requests handled while one is active"""
+
+    def __init__(self, directory='profiles', interval=0.005):
+        self.directory = directory
+        self.interval = interval
+        self.capture = None
+        self._lock = threading.Lock()
+
+    def _name(self, label):
+        return f"{label}-{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}-{os.getpid()}"
+
+    def start(self, seconds=None, requests=None):
+        """Start a capture; returns None if one is already running"""
+        if not seconds and not requests:
+            raise ValueError('A capture needs a number of seconds and/or requests')
+        with self._lock:
+            if self.capture is not None and self.capture.active:
+                return None
+            self.capture = ProfileCapture(self.directory, self._name('capture'), seconds, requests,
+                                          self.interval)
+            return self.capture.start()
+
+    def stop(self):
+        """End the running capture early; returns its info, None if none ran"""
+        capture = self.capture
+        if capture is None:
+            return None
+        capture.finish()
+        return capture.info()
+
+    def begin_request(self, single=False):
+        """Start profiling the current request if a capture is active (or `single` is set).
+
+        Returns a token for end_request, or None if the request isn't profiled.
+        """
+        capture = self.capture
+        if single:
+            # A capture of its own, sampling only the thread handling the request
+            capture = ProfileCapture(self.directory, self._name('request'), interval=self.interval,
+                                     thread_ids={threading.get_ident()}).start()
+        elif capture is None or not capture.active:
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler is already active in this thread
+            if single:
+                capture.finish()
+            return None
+        return capture, profile, single
+
+    @staticmethod
+    def end_request(token):
+        """Stop profiling a request; returns the output paths of a single-request capture"""
+        capture, profile, single = token
+        profile.disable()
+        capture.add(profile)
+        if single:
+            return capture.finish()
+        return None
+
+
+def install_signal_handler(profiler, signum, seconds):
+    """Start a `seconds` long capture whenever the process receives `signum`"""
+    def handle(signum, frame):
+        # Not in the handler itself: the interrupted code may hold the profiler's lock
+        threading.Thread(target=profiler.start, kwargs={'seconds': seconds}, daemon=True).start()
+
+    signal.signal(signum, handle)
@@ -0,0 +1,370 @@
+"""Buffered storage of benchmark results.
+
+/api/benchmark_results hands each result to a BatchWriter, which queues it and
+lets a background thread flush the queue in batches (every `batch_size`
+results or `flush_interval` seconds, whichever comes first) to one or more
+sinks. JsonLinesSink appends a batch to benchmark_results.json with a single
+write through a long-lived O_APPEND handle, under an exclusive file lock, so
+lines from several worker processes never interleave or tear.
+SQLiteResultsSink inserts each batch into a local SQLite database in one
+transaction, indexed so that summaries are SQL aggregations instead of
+rescans of the JSON lines file.
+"""
+import os
+import json
+import time
+import queue
+import sqlite3
+import atexit
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: no cross-process locking, run a single worker process there
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class JsonLinesSink:
+    """Appends results to a JSON lines file, rotating it by size and/or date"""
+
+    def __init__(self, path='benchmark_results.json', max_bytes=0, rotate_daily=False):
+        self.path = path
+        # Rotate once the file would grow beyond this many bytes (0 disables size rotation)
+        self.max_bytes = max_bytes
+        # Rotate when the first write of a new day arrives
+        self.rotate_daily = rotate_daily
+        self._fd = None
+        # The lock file lives next to the results file and is never rotated
+        self._lock_fd = None
+
+    def _open(self):
+        self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+
+    @contextmanager
+    def _locked(self):
+        if fcntl is None:
+            yield
+            return
+        if self._lock_fd is None:
+            self._lock_fd = os.open(f'{self.path}.lock', os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def _reopen_if_rotated(self):
+        # Another process may have rotated the file since we opened it
+        try:
+            same_file = os.stat(self.path).st_ino == os.fstat(self._fd).st_ino
+        except FileNotFoundError:
+            same_file = False
+        if not same_file:
+            os.close(self._fd)
+            self._open()
+
+    def _needs_rotation(self, incoming_bytes):
+        stat = os.fstat(self._fd)
+        if stat.st_size == 0:
+            return False
+        if self.max_bytes and stat.st_size + incoming_bytes > self.max_bytes:
+            return True
+        if self.rotate_daily and datetime.fromtimestamp(stat.st_mtime).date() != datetime.now().date():
+            return True
+        return False
+
+    def _rotate(self):
+        rotated_path = f"{self.path}.{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+        suffix = 1
+        while os.path.exists(rotated_path):
+            rotated_path = f"{self.path}.{datetime.now().strftime('%Y%m%d-%H%M%S')}.{suffix}"
+            suffix += 1
+        os.rename(self.path, rotated_path)
+        os.close(self._fd)
+        self._open()
+
+    def write_batch(self, records):
+        data = ''.join(json.dumps(record) + '\n' for record in records).encode('utf-8')
+        with self._locked():
+            if self._fd is None:
+                self._open()
+            else:
+                self._reopen_if_rotated()
+            if self._needs_rotation(len(data)):
+                self._rotate()
+            # One write per batch; O_APPEND plus the lock keep batches from interleaving
+            view = memoryview(data)
+            while view:
+                written = os.write(self._fd, view)
+                view = view[written:]
+
+    def close(self):
+        for fd in (self._fd, self._lock_fd):
+            if fd is not None:
+                os.close(fd)
+        self._fd = self._lock_fd = None
+
+
+class SQLiteResultsSink:
+    """Stores results in an indexed SQLite table and answers summary queries"""
+
+    # Latency percentiles reported by summary()
+    PERCENTILES = (50, 90, 95, 99)
+
+    INSERT = ('INSERT INTO results (model, session, puzzle_type, puzzle_id, correct, '
+              'elapsed_time, timestamp, data) VALUES (?, ?, ?, ?, ?, ?, ?, ?)')
+
+    def __init__(self, path='benchmark_results.db'):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS results ('
+                         'id INTEGER PRIMARY KEY, model TEXT, session TEXT, puzzle_type TEXT, '
+                         'puzzle_id TEXT, correct INTEGER, elapsed_time REAL, timestamp TEXT, '
+                         'data TEXT NOT NULL)')
+            conn.execute('CREATE INDEX IF NOT EXISTS results_model ON results (model, puzzle_type)')
+            conn.execute('CREATE INDEX IF NOT EXISTS results_session ON results (session)')
+            conn.execute('CREATE INDEX IF NOT EXISTS results_type ON results (puzzle_type, elapsed_time)')
+            conn.execute('CREATE INDEX IF NOT EXISTS results_timestamp ON results (timestamp)')
+
+    def _connect(self):
+        # One connection per thread and per process (connections must not cross a fork)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @staticmethod
+    def _text(value):
+        # Clients may send any JSON value; keep the indexed columns scalar
+        if value is None or isinstance(value, str):
+            return value
+        if isinstance(value, (dict, list)):
+            return json.dumps(value, sort_keys=True)
+        return str(value)
+
+    @classmethod
+    def _row(cls, record):
+        correct = record.get('correct')
+        try:
+            elapsed_time = float(record['elapsed_time'])
+        except (KeyError, ValueError, TypeError):
+            elapsed_time = None
+        return (cls._text(record.get('model')), cls._text(record.get('session')),
+                cls._text(record.get('puzzle_type')), cls._text(record.get('puzzle_id')),
+                None if correct is None else int(bool(correct)), elapsed_time,
+                cls._text(record.get('timestamp')), json.dumps(record))
+
+    def write_batch(self, records):
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            try:
+                conn.executemany(self.INSERT, [self._row(record) for record in records])
+            except (sqlite3.Error, ValueError, TypeError, OverflowError):
+                # One bad record must not cost the batch: retry row by row, skipping failures
+                conn.execute('ROLLBACK')
+                conn.execute('BEGIN IMMEDIATE')
+                for record in records:
+                    try:
+                        conn.execute(self.INSERT, self._row(record))
+                    except (sqlite3.Error, ValueError, TypeError, OverflowError):
+                        logger.exception('Dropping unstorable benchmark result %r', record)
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+    def summary(self, model=None, session=None, puzzle_type=None, since=None, until=None):
+        """Per-type (and 'overall') counts, accuracy and elapsed_time statistics.
+
+        Percentiles are nearest-rank, like score_results.py, computed with
+        window functions over the rows that have an elapsed_time.
+        """
+        conditions, params = [], []
+        for column, op, value in (('model', '=', model), ('session', '=', session),
+                                  ('puzzle_type', '=', puzzle_type),
+                                  ('timestamp', '>=', since), ('timestamp', '<', until)):
+            if value is not None:
+                conditions.append(f'{column} {op} ?')
+                params.append(value)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+
+        percentile_columns = ', '.join(
+            f'MIN(CASE WHEN rank = MAX(1, (n * {p} + 99) / 100) THEN elapsed_time END) AS p{p}'
+            for p in self.PERCENTILES)
+        query = f"""
+            WITH filtered AS (
+                SELECT puzzle_type, correct, elapsed_time FROM results {where}
+            ), grouped AS (
+                SELECT COALESCE(puzzle_type, '<unknown>') AS puzzle_type, correct, elapsed_time FROM filtered
+                UNION ALL
+                SELECT 'overall', correct, elapsed_time FROM filtered
+            ), totals AS (
+                SELECT puzzle_type, COUNT(*) AS count, SUM(correct) AS correct,
+                       COUNT(correct) AS judged, AVG(elapsed_time) AS mean, MAX(elapsed_time) AS max
+                FROM grouped GROUP BY puzzle_type
+            ), ranked AS (
+                SELECT puzzle_type, elapsed_time,
+                       ROW_NUMBER() OVER (PARTITION BY puzzle_type ORDER BY elapsed_time) AS rank,
+                       COUNT(*) OVER (PARTITION BY puzzle_type) AS n
+                FROM grouped WHERE elapsed_time IS NOT NULL
+            ), percentiles AS (
+                SELECT puzzle_type, {percentile_columns} FROM ranked GROUP BY puzzle_type
+            )
+            SELECT totals.*, percentiles.* FROM totals
+            LEFT JOIN percentiles ON percentiles.puzzle_type = totals.puzzle_type
+            ORDER BY totals.puzzle_type = 'overall', totals.puzzle_type
+        """
+        summary = {}
+        for row in self._connect().execute(query, params):
+            puzzle_type, count, correct, judged, mean, max_elapsed = row[:6]
+            result = {
+                'count': count,
+                'correct': correct or 0,
+                'accuracy': (correct or 0) / judged if judged else 0.0
+            }
+            if mean is not None:
+                result['elapsed_time'] = {
+                    'mean': mean,
+                    'max': max_elapsed,
+                    **{f'p{p}': value for p, value in zip(self.PERCENTILES, row[7:])}
+                }
+            summary[puzzle_type] = result
+        return summary
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            conn.close()
+            self._local.conn = None
+
+
+class BatchWriter:
+    """Queues results and writes them to sinks in batches from a background thread"""
+
+    def __init__(self, sinks, batch_size=500, flush_interval=1.0, max_queue=100000):
+        self.sinks = sinks
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self._pid = None
+        self._start_lock = threading.Lock()
+        atexit.register(self.close)
+
+    def _ensure_started(self):
+        # Threads don't survive fork(), so each worker process starts its own
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(self.max_queue)
+            self._thread = threading.Thread(target=self._run, name='benchmark-writer', daemon=True)
+            self._pid = os.getpid()
+            self._thread.start()
+
+    def submit(self, record):
+        """Queue one result; blocks only if the queue is full"""
+        self._ensure_started()
+        self._queue.put(record)
+
+    def full(self):
+        """True if submit() would block"""
+        self._ensure_started()
+        return self._queue.full()
+
+    def _run(self):
+        while True:
+            # Collect up to batch_size records, for at most flush_interval seconds.
+            # Flush requests (Events) and the stop sentinel end the batch early.
+            records = []
+            waiters = []
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                self._idle()
+                continue
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if item is _STOP or isinstance(item, threading.Event):
+                    waiters.append(item)
+                    break
+                records.append(item)
+                timeout = deadline - time.monotonic()
+                if len(records) >= self.batch_size or timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+
+            if records:
+                self._write(records)
+            for waiter in waiters:
+                if waiter is _STOP:
+                    return
+                waiter.set()
+
+    def _write(self, records):
+        for sink in self.sinks:
+            try:
+                sink.write_batch(records)
+            except Exception:
+                # Never let one failing sink kill the writer thread
+                logger.exception('Failed to write %d benchmark results to %r', len(records), sink)
+
+    def _idle(self):
+        # Give sinks with periodic work (like leaderboard snapshots) a chance to run
+        for sink in self.sinks:
+            idle = getattr(sink, 'idle', None)
+            if idle is not None:
+                try:
+                    idle()
+                except Exception:
+                    logger.exception('Idle task of %r failed', sink)
+
+    def flush(self, timeout=None):
+        """Wait until everything submitted so far has been written"""
+        if self._pid != os.getpid():
+            return
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait(timeout)
+
+    def close(self):
+        """Write out the queue and stop the background thread"""
+        if self._pid != os.getpid():
+            return
+        self._queue.put(_STOP)
+        self._thread.join()
+        self._pid = None
+        for sink in self.sinks:
+            sink.close()
+
+
+# Sentinel telling the writer thread to stop
+_STOP = object()
+
+
+def create_sinks(backend='jsonl', path='benchmark_results.json', db_path='benchmark_results.db',
+                 max_bytes=0, rotate_daily=False):
+    """Create the sinks selected by RESULTS_BACKEND ('jsonl', 'sqlite' or 'both')"""
+    if backend not in ('jsonl', 'sqlite', 'both'):
+        raise ValueError(f'Unknown results backend: {backend}')
+    sinks = []
+    if backend in ('jsonl', 'both'):
+        sinks.append(JsonLinesSink(path, max_bytes, rotate_daily))
+    if backend in ('sqlite', 'both'):
+        sinks.append(SQLiteResultsSink(db_path))
+    return sinks
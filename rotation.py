@@ -0,0 +1,88 @@
+"""Server-side rendering of Rotation_Match objects.
+
+Instead of shipping one `<object_base>_<angle>.png` file per angle, the object
+image is rotated with Pillow on demand. Renders are kept in a byte-bounded
+LRU cache, and a whole turn can be downloaded at once as a sprite sheet: one
+horizontal strip of equally sized frames, frame i showing the object rotated
+by i * step degrees.
+
+Angles are clockwise, like the CSS rotate() the web UI applies on top of the
+frames.
+"""
+import io
+import threading
+from collections import OrderedDict
+
+from PIL import Image
+
+from assets import AssetCache
+
+
+class RotationRenderer:
+    """Renders rotated Rotation_Match objects from their base images"""
+
+    def __init__(self, asset_store, max_bytes=32 * 1024 * 1024, max_sources=64):
+        self.asset_store = asset_store
+        # Rendered PNGs by (type, base image, angle or sprite step)
+        self.cache = AssetCache(max_bytes)
+        # Decoded base images by digest, least recently used first
+        self.max_sources = max_sources
+        self._sources = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _source(self, puzzle_type, relpath):
+        digest, data = self.asset_store.load(puzzle_type, relpath)
+        with self._lock:
+            image = self._sources.get(digest)
+            if image is not None:
+                self._sources.move_to_end(digest)
+                return digest, image
+        with Image.open(io.BytesIO(data)) as opened:
+            image = opened.convert('RGBA')
+        with self._lock:
+            self._sources[digest] = image
+            if len(self._sources) > self.max_sources:
+                self._sources.popitem(last=False)
+        return digest, image
+
+    @staticmethod
+    def _rotate(image, angle):
+        # Pillow rotates counterclockwise; corners uncovered by the rotation stay transparent
+        return image.rotate(-angle, resample=Image.BICUBIC) if angle else image
+
+    @staticmethod
+    def _encode(image):
+        out = io.BytesIO()
+        image.save(out, 'PNG')
+        return out.getvalue()
+
+    def render(self, puzzle_type, relpath, angle):
+        """(etag, PNG bytes) of the object rotated clockwise by `angle` degrees"""
+        angle = int(angle) % 360
+        digest, image = self._source(puzzle_type, relpath)
+        etag = f'{digest}-rot{angle}'
+        key = (puzzle_type, relpath, 'angle', angle)
+        cached = self.cache.get(key)
+        if cached is not None and cached[0] == etag:
+            return etag, cached[1]
+        data = self._encode(self._rotate(image, angle))
+        self.cache.put(key, etag, data)
+        return etag, data
+
+    def sprite(self, puzzle_type, relpath, step):
+        """(etag, PNG bytes, frame count) of a strip with one frame every `step` degrees"""
+        if not 0 < step <= 360 or 360 % step:
+            raise ValueError('step must divide 360')
+        digest, image = self._source(puzzle_type, relpath)
+        frames = 360 // step
+        etag = f'{digest}-sprite{step}'
+        key = (puzzle_type, relpath, 'sprite', step)
+        cached = self.cache.get(key)
+        if cached is not None and cached[0] == etag:
+            return etag, cached[1], frames
+        sheet = Image.new('RGBA', (image.width * frames, image.height))
+        for i in range(frames):
+            sheet.paste(self._rotate(image, i * step), (i * image.width, 0))
+        data = self._encode(sheet)
+        self.cache.put(key, etag, data)
+        return etag, data, frames
@@ -0,0 +1,389 @@
+"""Per-session puzzle sampling state.
+
+Every agent (session token) gets its own non-repeating puzzle history, recent
+type list and PUZZLE_TYPE_SEQUENCE position, so concurrent agents no longer
+interfere with each other. State is kept in a session store:
+
+- MemorySessionStore: in-process, for a single worker
+- SQLiteSessionStore: a local SQLite file shared by every worker on the host
+  (point it at /dev/shm to keep it in shared memory)
+
+Both stores evict sessions that have been idle for longer than the TTL and
+keep at most `max_sessions` sessions, dropping the least recently used.
+
+Puzzles are drawn without replacement by walking a shuffled permutation of
+each type's puzzle IDs with a per-session cursor. The permutation is derived
+from the session's seed and computed one index at a time, so it is never
+materialized, and a session started with a given seed always sees the same
+puzzles in the same order.
+
+Episodes freeze such a sequence into a manifest, an ordered list of
+(type, puzzle_id), that can be exported, cached and replayed step by step by
+any number of workers without coordination.
+"""
+import os
+import json
+import time
+import hashlib
+import random
+import sqlite3
+import itertools
+import threading
+from collections import OrderedDict
+
+
+class SeededPermutation:
+    """A pseudorandom bijection over range(n), computed per index without materializing it.
+
+    A balanced Feistel network over the smallest even number of bits covering
+    n maps an index to another one; values outside range(n) are mapped again
+    ("cycle walking") until they fall inside it, which takes fewer than four
+    rounds on average. The round keys are derived from `key`, so the same key
+    gives the same order in every process.
+    """
+
+    ROUNDS = 4
+    _MASK64 = (1 << 64) - 1
+
+    def __init__(self, n, key):
+        self.n = n
+        bits = max(2, (n - 1).bit_length())
+        self.half_bits = (bits + 1) // 2
+        self.half_mask = (1 << self.half_bits) - 1
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=8 * self.ROUNDS).digest()
+        self.round_keys = [int.from_bytes(digest[8 * i:8 * i + 8], 'little') for i in range(self.ROUNDS)]
+
+    def _round(self, value, round_key):
+        # 64-bit multiply-xorshift mix (splitmix64 finalizer) of the half block and the key
+        value = ((value ^ round_key) * 0x9E3779B97F4A7C15) & self._MASK64
+        value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & self._MASK64
+        value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & self._MASK64
+        return (value ^ (value >> 31)) & self.half_mask
+
+    def __len__(self):
+        return self.n
+
+    def __getitem__(self, index):
+        if not 0 <= index < self.n:
+            raise IndexError('permutation index out of range')
+        value = index
+        while True:
+            left, right = value >> self.half_bits, value & self.half_mask
+            for round_key in self.round_keys:
+                left, right = right, left ^ self._round(right, round_key)
+            value = (left << self.half_bits) | right
+            if value < self.n:
+                return value
+
+
+class PuzzleOrder:
+    """A type's puzzle IDs in the order of a SeededPermutation"""
+
+    __slots__ = ('puzzle_ids', 'permutation')
+
+    def __init__(self, puzzle_ids, key):
+        self.puzzle_ids = puzzle_ids
+        self.permutation = SeededPermutation(len(puzzle_ids), key)
+
+    def __len__(self):
+        return len(self.puzzle_ids)
+
+    def __getitem__(self, position):
+        return self.puzzle_ids[self.permutation[position]]
+
+
+class PuzzleSampler:
+    """Shuffled orders of each type's puzzle IDs, shared by all sessions of a catalog.
+
+    An order depends only on (type, seed, epoch), so every worker process
+    derives the same order for the same seed. Orders are computed index by
+    index, so a draw is O(1) in time and memory however many puzzles and
+    sessions there are.
+    """
+
+    def __init__(self, puzzle_ids):
+        self.puzzle_ids = puzzle_ids
+
+    def permutation(self, puzzle_type, seed, epoch):
+        return PuzzleOrder(self.puzzle_ids.get(puzzle_type, ()), f'{seed}:{puzzle_type}:{epoch}')
+
+
+class SamplingState:
+    """Sampling history of one session"""
+
+    __slots__ = ('seed', 'draws', 'recent_types', 'cursors', 'sequential_index', 'episode_steps')
+
+    def __init__(self, seed=None, draws=0, recent_types=None, cursors=None, sequential_index=0,
+                 episode_steps=None):
+        # Seed of every random choice made for this session
+        self.seed = seed if seed is not None else random.getrandbits(64)
+        # Number of random type choices made so far
+        self.draws = draws
+        # Recently used CAPTCHA types, to avoid repetition in random mode
+        self.recent_types = recent_types if recent_types is not None else []
+        # Per CAPTCHA type: [epoch, cursor] into that epoch's shuffled permutation
+        self.cursors = cursors if cursors is not None else {}
+        # Position in PUZZLE_TYPE_SEQUENCE for sequential mode
+        self.sequential_index = sequential_index
+        # Next step of each episode replayed by this session
+        self.episode_steps = episode_steps if episode_steps is not None else {}
+
+    def to_dict(self):
+        return {
+            'seed': self.seed,
+            'draws': self.draws,
+            'recent_types': self.recent_types,
+            'cursors': self.cursors,
+            'sequential_index': self.sequential_index,
+            'episode_steps': self.episode_steps
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data.get('seed'),
+                   data.get('draws', 0),
+                   data.get('recent_types', []),
+                   data.get('cursors', {}),
+                   data.get('sequential_index', 0),
+                   data.get('episode_steps', {}))
+
+    def reset(self, seed):
+        """Start over with a new seed, so the session replays a reproducible sequence"""
+        self.__init__(seed)
+
+    def next_random_type(self, captcha_types, max_recent):
+        """Pick a random type, avoiding the `max_recent` most recently used ones if possible"""
+        available_types = [t for t in captcha_types if t not in self.recent_types]
+
+        # If all types have been used recently, reset the tracking
+        if not available_types:
+            self.recent_types = []
+            available_types = captcha_types
+
+        puzzle_type = random.Random(f'{self.seed}:type:{self.draws}').choice(available_types)
+        self.draws += 1
+
+        # Add to recent types and maintain maximum length
+        self.recent_types.append(puzzle_type)
+        if len(self.recent_types) > max_recent:
+            self.recent_types.pop(0)
+        return puzzle_type
+
+    def next_sequential_type(self, sequence):
+        puzzle_type = sequence[self.sequential_index % len(sequence)]
+        self.sequential_index += 1
+        return puzzle_type
+
+    def next_episode_step(self, episode_id):
+        step = self.episode_steps.get(episode_id, 0)
+        self.episode_steps[episode_id] = step + 1
+        return step
+
+    def next_puzzle(self, puzzle_type, sampler):
+        """Return the next puzzle of a type that this session has not seen yet"""
+        epoch, cursor = self.cursors.get(puzzle_type, (0, 0))
+        order = sampler.permutation(puzzle_type, self.seed, epoch)
+
+        # If all puzzles have been seen, start a new pass in a new order
+        if cursor >= len(order):
+            epoch, cursor = epoch + 1, 0
+            order = sampler.permutation(puzzle_type, self.seed, epoch)
+        if not order:
+            return None
+
+        self.cursors[puzzle_type] = [epoch, cursor + 1]
+        return order[cursor]
+
+
+def build_episode(sampler, seed, length, mode='random', types=None, sequence=None, max_recent=5):
+    """Build an episode manifest: the puzzles a new session with this seed would get.
+
+    mode='random' mirrors get_puzzle?random=true (optionally restricted to
+    `types`), mode='sequential' mirrors get_puzzle?mode=sequential. Types
+    without puzzles are skipped.
+    """
+    types = [t for t in (types or sorted(sampler.puzzle_ids)) if sampler.puzzle_ids.get(t)]
+    if mode == 'sequential':
+        sequence = [t for t in (sequence or types) if sampler.puzzle_ids.get(t)]
+    elif mode != 'random':
+        raise ValueError(f'Unknown episode mode: {mode}')
+
+    state = SamplingState(seed)
+    puzzles = []
+    if types and (mode == 'random' or sequence):
+        for _ in range(length):
+            if mode == 'sequential':
+                puzzle_type = state.next_sequential_type(sequence)
+            else:
+                puzzle_type = state.next_random_type(types, max_recent)
+            puzzles.append([puzzle_type, state.next_puzzle(puzzle_type, sampler)])
+
+    return make_manifest(puzzles, seed=seed, mode=mode)
+
+
+def make_manifest(puzzles, **info):
+    """Wrap an ordered list of [type, puzzle_id] into a manifest with a content-derived ID"""
+    digest = hashlib.sha256(json.dumps(puzzles, separators=(',', ':')).encode('utf-8')).hexdigest()
+    return dict(info, episode_id=digest[:16], length=len(puzzles), puzzles=puzzles)
+
+
+class EpisodeStore:
+    """Episode manifests cached in memory and persisted as JSON files.
+
+    The directory is shared by every worker, so an episode created or uploaded
+    through one worker can be replayed through any other.
+    """
+
+    def __init__(self, directory='episodes', max_cached=256):
+        self.directory = directory
+        self.max_cached = max_cached
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _path(self, episode_id):
+        return os.path.join(self.directory, f'{episode_id}.json')
+
+    def save(self, manifest):
+        episode_id = manifest['episode_id']
+        os.makedirs(self.directory, exist_ok=True)
+        # Write to a temporary file first so readers never see a partial manifest
+        tmp_path = f'{self._path(episode_id)}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self._path(episode_id))
+        self._remember(episode_id, manifest)
+        return manifest
+
+    def get(self, episode_id):
+        """Return a manifest by ID, or None if it is unknown"""
+        with self._lock:
+            manifest = self._cache.get(episode_id)
+            if manifest is not None:
+                self._cache.move_to_end(episode_id)
+                return manifest
+        # Episode IDs are hex digests; anything else can't be a file we wrote
+        if not episode_id or not all(c in '0123456789abcdef' for c in episode_id):
+            return None
+        try:
+            with open(self._path(episode_id), 'r') as f:
+                manifest = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+        self._remember(episode_id, manifest)
+        return manifest
+
+    def _remember(self, episode_id, manifest):
+        with self._lock:
+            self._cache[episode_id] = manifest
+            self._cache.move_to_end(episode_id)
+            if len(self._cache) > self.max_cached:
+                self._cache.popitem(last=False)
+
+
+class MemorySessionStore:
+    """Session states kept in this process, with LRU and TTL eviction"""
+
+    def __init__(self, max_sessions=10000, ttl=3600):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        # token -> (last used time, SamplingState), least recently used first
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def update(self, token, fn):
+        """Call fn(state) with the session's state under a lock and return its result"""
+        now = time.time()
+        with self._lock:
+            entry = self._sessions.pop(token, None)
+            if entry is None or now - entry[0] > self.ttl:
+                state = SamplingState()
+            else:
+                state = entry[1]
+            try:
+                return fn(state)
+            finally:
+                # Put the session back (moved to the end) even if fn raised
+                self._sessions[token] = (now, state)
+                self._evict(now)
+
+    def _evict(self, now):
+        while self._sessions:
+            token, (last_used, _) = next(iter(self._sessions.items()))
+            if len(self._sessions) <= self.max_sessions and now - last_used <= self.ttl:
+                break
+            del self._sessions[token]
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+class SQLiteSessionStore:
+    """Session states in a local SQLite database, shared by all worker processes"""
+
+    # Run the (cheap, but not free) eviction query once every this many updates
+    EVICT_EVERY = 256
+
+    def __init__(self, path='sessions.db', max_sessions=10000, ttl=3600):
+        self.path = path
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._local = threading.local()
+        # next() of a count is atomic, so threads sharing the store never skip an eviction
+        self._updates = itertools.count(1)
+        with self._connect() as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS sessions ('
+                         'token TEXT PRIMARY KEY, state TEXT NOT NULL, last_used REAL NOT NULL)')
+            conn.execute('CREATE INDEX IF NOT EXISTS sessions_last_used ON sessions (last_used)')
+
+    def _connect(self):
+        # One connection per thread and per process (connections must not cross a fork)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def update(self, token, fn):
+        """Call fn(state) inside a write transaction and return its result"""
+        now = time.time()
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT state, last_used FROM sessions WHERE token = ?',
+                               (token,)).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                state = SamplingState()
+            else:
+                state = SamplingState.from_dict(json.loads(row[0]))
+            result = fn(state)
+            conn.execute('INSERT OR REPLACE INTO sessions (token, state, last_used) VALUES (?, ?, ?)',
+                         (token, json.dumps(state.to_dict()), now))
+
+            if next(self._updates) % self.EVICT_EVERY == 0:
+                self._evict(conn, now)
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return result
+
+    def _evict(self, conn, now):
+        conn.execute('DELETE FROM sessions WHERE last_used < ?', (now - self.ttl,))
+        conn.execute('DELETE FROM sessions WHERE token IN ('
+                     'SELECT token FROM sessions ORDER BY last_used DESC LIMIT -1 OFFSET ?)',
+                     (self.max_sessions,))
+
+    def __len__(self):
+        return self._connect().execute('SELECT COUNT(*) FROM sessions').fetchone()[0]
+
+
+def create_session_store(backend='memory', path='sessions.db', max_sessions=10000, ttl=3600):
+    """Create the session store selected by SESSION_BACKEND ('memory' or 'sqlite')"""
+    if backend == 'sqlite':
+        return SQLiteSessionStore(path, max_sessions, ttl)
+    if backend == 'memory':
+        return MemorySessionStore(max_sessions, ttl)
+    raise ValueError(f'Unknown session backend: {backend}')
@@ -0,0 +1,206 @@
+"""Score recorded answers offline, without starting the Flask server.
+
+Reads one or more JSONL files (benchmark_results.json, an agent's output log,
+...) where each line has puzzle_type, puzzle_id, answer (or user_answer) and
+optionally elapsed_time, re-checks every answer with the same checkers as
+/api/check_answer and prints per-type accuracy and latency summaries.
+
+Usage:
+    python score_results.py benchmark_results.json
+    python score_results.py run1.jsonl run2.jsonl --workers 8 --output summary.json
+    cat answers.jsonl | python score_results.py -
+"""
+import os
+import sys
+import json
+import argparse
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from captcha_store import GroundTruthStore
+from checkers import build_checkers, find_checker, score_answer
+
+# Checkers of the current worker process, built once by _init_worker
+_checkers = None
+
+# Latency percentiles reported for every type
+PERCENTILES = (50, 90, 95, 99)
+
+
+def _init_worker(data_dir):
+    global _checkers
+    _checkers = build_checkers(GroundTruthStore(data_dir).load_all())
+
+
+def _new_totals():
+    return {'count': 0, 'correct': 0, 'errors': 0, 'mismatches': 0, 'elapsed_times': []}
+
+
+def score_lines(lines):
+    """Score a chunk of JSONL lines, returns {puzzle_type: partial totals}"""
+    totals = {}
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            record = None
+        # Records without a string type (e.g. a list) can't be attributed to a type
+        if not isinstance(record, dict) or not isinstance(record.get('puzzle_type', ''), str):
+            type_totals = totals.setdefault('<invalid>', _new_totals())
+            type_totals['count'] += 1
+            type_totals['errors'] += 1
+            continue
+
+        # benchmark_results.json stores the answer as user_answer
+        if 'answer' not in record:
+            record['answer'] = record.get('user_answer')
+        puzzle_type = record.get('puzzle_type', 'Dice_Count')
+        type_totals = totals.get(puzzle_type)
+        if type_totals is None:
+            type_totals = totals[puzzle_type] = _new_totals()
+
+        payload, status = score_answer(find_checker(_checkers, puzzle_type), record)
+        type_totals['count'] += 1
+        if status != 200:
+            type_totals['errors'] += 1
+            continue
+        if payload['correct']:
+            type_totals['correct'] += 1
+        # Answers whose recorded verdict disagrees with the re-scored one
+        if 'correct' in record and bool(record['correct']) != payload['correct']:
+            type_totals['mismatches'] += 1
+        try:
+            elapsed_time = float(record['elapsed_time'])
+        except (KeyError, ValueError, TypeError):
+            continue
+        type_totals['elapsed_times'].append(elapsed_time)
+    return totals
+
+
+def merge_totals(into, partial):
+    for puzzle_type, type_totals in partial.items():
+        target = into.get(puzzle_type)
+        if target is None:
+            into[puzzle_type] = type_totals
+            continue
+        for key in ('count', 'correct', 'errors', 'mismatches'):
+            target[key] += type_totals[key]
+        target['elapsed_times'].extend(type_totals['elapsed_times'])
+
+
+def _percentile(sorted_values, percent):
+    # Nearest-rank percentile
+    index = max(0, -(-len(sorted_values) * percent // 100) - 1)
+    return sorted_values[index]
+
+
+def summarize(totals):
+    """Turn merged totals into the per-type summary written by the CLI"""
+    summary = {}
+    overall = _new_totals()
+    for puzzle_type in sorted(totals):
+        type_totals = totals[puzzle_type]
+        summary[puzzle_type] = _summarize_one(type_totals)
+        for key in ('count', 'correct', 'errors', 'mismatches'):
+            overall[key] += type_totals[key]
+        overall['elapsed_times'].extend(type_totals['elapsed_times'])
+    summary['overall'] = _summarize_one(overall)
+    return summary
+
+
+def _summarize_one(type_totals):
+    scored = type_totals['count'] - type_totals['errors']
+    result = {
+        'count': type_totals['count'],
+        'correct': type_totals['correct'],
+        'errors': type_totals['errors'],
+        'mismatches': type_totals['mismatches'],
+        'accuracy': type_totals['correct'] / scored if scored else 0.0
+    }
+    elapsed_times = sorted(type_totals['elapsed_times'])
+    if elapsed_times:
+        result['elapsed_time'] = {
+            'mean': sum(elapsed_times) / len(elapsed_times),
+            'max': elapsed_times[-1],
+            **{f'p{p}': _percentile(elapsed_times, p) for p in PERCENTILES}
+        }
+    return result
+
+
+def _read_chunks(paths, chunk_size):
+    chunk = []
+    for path in paths:
+        f = sys.stdin if path == '-' else open(path, 'r')
+        try:
+            for line in f:
+                chunk.append(line)
+                if len(chunk) >= chunk_size:
+                    yield chunk
+                    chunk = []
+        finally:
+            if f is not sys.stdin:
+                f.close()
+    if chunk:
+        yield chunk
+
+
+def score_files(paths, data_dir='captcha_data', workers=None, chunk_size=20000):
+    """Score every line of the given JSONL files, returns merged per-type totals"""
+    workers = workers or os.cpu_count() or 1
+    totals = {}
+    if workers == 1:
+        _init_worker(data_dir)
+        for chunk in _read_chunks(paths, chunk_size):
+            merge_totals(totals, score_lines(chunk))
+        return totals
+
+    # Keep a bounded number of chunks in flight so huge files are streamed, not loaded
+    max_pending = workers * 2
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(data_dir,)) as executor:
+        pending = set()
+        for chunk in _read_chunks(paths, chunk_size):
+            if len(pending) >= max_pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    merge_totals(totals, future.result())
+            pending.add(executor.submit(score_lines, chunk))
+        for future in pending:
+            merge_totals(totals, future.result())
+    return totals
+
+
+def print_summary(summary, out=sys.stdout):
+    header = f"{'Type':<20} {'Count':>9} {'Correct':>9} {'Errors':>7} {'Accuracy':>9} {'Mean(s)':>9} {'p50(s)':>8} {'p95(s)':>8}"
+    print(header, file=out)
+    print('-' * len(header), file=out)
+    for puzzle_type, result in summary.items():
+        latency = result.get('elapsed_time', {})
+        mean = f"{latency['mean']:.2f}" if latency else '-'
+        p50 = f"{latency['p50']:.2f}" if latency else '-'
+        p95 = f"{latency['p95']:.2f}" if latency else '-'
+        print(f"{puzzle_type:<20} {result['count']:>9} {result['correct']:>9} {result['errors']:>7} "
+              f"{result['accuracy'] * 100:>8.1f}% {mean:>9} {p50:>8} {p95:>8}", file=out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Score recorded CAPTCHA answers offline')
+    parser.add_argument('inputs', nargs='+', help="JSONL files to score ('-' reads stdin)")
+    parser.add_argument('--data-dir', default=os.environ.get('CAPTCHA_DATA_DIR', 'captcha_data'),
+                        help='Directory containing the CAPTCHA types and ground truth')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: CPU count)')
+    parser.add_argument('--chunk-size', type=int, default=20000, help='Lines scored per task')
+    parser.add_argument('--output', help='Write the summary as JSON to this file')
+    args = parser.parse_args(argv)
+
+    summary = summarize(score_files(args.inputs, args.data_dir, args.workers, args.chunk_size))
+    print_summary(summary)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,8 @@
 let puzzleStartTime = null;
+// Per-tab session token, so parallel browser agents each get their own puzzle sequence
+const SESSION_TOKEN = (window.crypto && crypto.randomUUID)
+    ? crypto.randomUUID()
+    : Math.random().toString(36).slice(2) + Date.now().toString(36);
 
 document.addEventListener('DOMContentLoaded', () => {
     // DOM elements
@@ -1555,7 +1559,7 @@ document.addEventListener('DOMContentLoaded', () => {
         userAnswerInput.style.display = 'block';
         
         // Construct URL with debug type parameter if set
-        let url = '/api/get_puzzle?mode=sequential';
+        let url = `/api/get_puzzle?mode=sequential&session=${encodeURIComponent(SESSION_TOKEN)}`;
         // // Function to set up the debug mode selector
         // if (debugPuzzleType) {
         //     url = `/api/get_puzzle?debug_type=${encodeURIComponent(debugPuzzleType)}`;
@@ -2209,7 +2213,7 @@ document.addEventListener('DOMContentLoaded', () => {
         }
         
         // Send the benchmark result to be recorded
-        fetch('/api/benchmark_results', {
+        fetch(`/api/benchmark_results?session=${encodeURIComponent(SESSION_TOKEN)}`, {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json'
@@ -4197,11 +4201,11 @@ document.addEventListener('DOMContentLoaded', () => {
 
     // Function to get a new puzzle
     function getPuzzle(callback) {
-        let queryParams = '';
+        let queryParams = `?session=${encodeURIComponent(SESSION_TOKEN)}`;
         
         // Check if debug mode is active and add the debug_type parameter if it is
         if (DEBUG_MODE && DEBUG_TYPE) {
-            queryParams = `?debug_type=${encodeURIComponent(DEBUG_TYPE)}`;
+            queryParams += `&debug_type=${encodeURIComponent(DEBUG_TYPE)}`;
         }
         
         fetch('/api/get_puzzle' + queryParams)
@@ -0,0 +1,30 @@
+import os
+import sys
+
+import pytest
+
+# The modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope='session')
+def captcha_app(tmp_path_factory):
+    """The app module, serving a small generated dataset with all its files in a scratch directory"""
+    from generate_dataset import generate_dataset
+
+    scratch = tmp_path_factory.mktemp('app')
+    data_dir = str(scratch / 'captcha_data')
+    generate_dataset(data_dir, 3, seed=11, workers=1)
+    with pytest.MonkeyPatch.context() as patch:
+        # app reads its settings when it is imported
+        for name, value in (('CAPTCHA_DATA_DIR', data_dir),
+                            ('RESULTS_PATH', str(scratch / 'benchmark_results.json')),
+                            ('RESULTS_DB_PATH', str(scratch / 'benchmark_results.db')),
+                            ('LEADERBOARD_PATH', str(scratch / 'leaderboard.json')),
+                            ('SESSION_DB_PATH', str(scratch / 'sessions.db')),
+                            ('EPISODE_DIR', str(scratch / 'episodes')),
+                            ('IMAGE_VARIANT_DIR', str(scratch / 'image_variants')),
+                            ('PROFILE_DIR', str(scratch / 'profiles'))):
+            patch.setenv(name, value)
+        import app
+    return app
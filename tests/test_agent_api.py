@@ -0,0 +1,53 @@
+import base64
+import hashlib
+
+import pytest
+
+from agent_api import CaptchaEnv, agent_puzzle_payload
+from assets import AssetStore
+from captcha_store import CaptchaCatalog, GroundTruthStore
+from generate_dataset import generate_dataset
+from rotation import RotationRenderer
+
+
+@pytest.fixture
+def frameless_dataset(tmp_path):
+    # Rotation_Match object images only: frames are rendered on request
+    generate_dataset(str(tmp_path), 3, seed=1, types=['Rotation_Match'], workers=1, rotation_frames=False)
+    return str(tmp_path)
+
+
+def test_env_renders_missing_rotation_frames(frameless_dataset):
+    env = CaptchaEnv(frameless_dataset, seed=3)
+    puzzle = env.next_puzzle('Rotation_Match')
+    frame = puzzle['assets'][puzzle['object_image']]
+    assert frame['content_type'] == 'image/png'
+    assert frame['sha256'] == hashlib.sha256(frame['data']).hexdigest()
+
+    entry = env.catalog.ground_truth['Rotation_Match'][puzzle['puzzle_id']]
+    assert env.submit(entry['correct_angle'])['correct']
+
+
+@pytest.mark.parametrize('embed', [None, 'base64'])
+def test_payload_of_frameless_rotation_puzzle(frameless_dataset, embed):
+    catalog = CaptchaCatalog.build(GroundTruthStore(frameless_dataset))
+    asset_store = AssetStore(frameless_dataset)
+    puzzle_id = catalog.puzzle_ids['Rotation_Match'][0]
+
+    payload, status = agent_puzzle_payload(catalog, asset_store, 'Rotation_Match', puzzle_id, embed,
+                                           RotationRenderer(asset_store))
+    assert status == 200
+    frame = payload['assets'][payload['object_image']]
+    if embed is None:
+        # Not a dataset file, so it is fetched from the URL that renders it
+        assert frame['url'] == payload['object_image']
+    else:
+        assert hashlib.sha256(base64.b64decode(frame['data'])).hexdigest() == frame['sha256']
+
+
+def test_payload_without_renderer_reports_missing_frame(frameless_dataset):
+    catalog = CaptchaCatalog.build(GroundTruthStore(frameless_dataset))
+    puzzle_id = catalog.puzzle_ids['Rotation_Match'][0]
+    payload, status = agent_puzzle_payload(catalog, AssetStore(frameless_dataset), 'Rotation_Match', puzzle_id)
+    assert status == 500
+    assert 'Missing asset' in payload['error']
@@ -0,0 +1,65 @@
+import asyncio
+import json
+
+import pytest
+
+
+@pytest.fixture
+def asgi(captcha_app):
+    import asgi_app
+    return asgi_app
+
+
+def request(asgi, method, path, query=b'', body=b'', headers=()):
+    """Drive the ASGI application like a server: (status, {header: value}, body)"""
+    scope = {'type': 'http', 'method': method, 'path': path, 'query_string': query,
+             'headers': [(b'host', b'testserver')] + list(headers), 'http_version': '1.1'}
+    # The body arrives in two chunks, like a slow upload
+    messages = [{'type': 'http.request', 'body': body[:5], 'more_body': True},
+                {'type': 'http.request', 'body': body[5:], 'more_body': False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(asgi.application(scope, receive, send))
+    start, response = sent
+    assert start['type'] == 'http.response.start' and response['type'] == 'http.response.body'
+    return start['status'], dict(start['headers']), response['body']
+
+
+def test_round_trip_matches_the_wsgi_app(asgi, captcha_app):
+    status, headers, body = request(asgi, 'GET', '/api/types')
+    expected = captcha_app.app.test_client().get('/api/types')
+    assert status == 200
+    assert headers[b'content-type'] == b'application/json'
+    assert json.loads(body) == expected.json
+
+    status, _, body = request(asgi, 'GET', '/api/get_puzzle', query=b'type=Dice_Count')
+    puzzle = json.loads(body)
+    assert status == 200 and puzzle['puzzle_type'] == 'Dice_Count'
+
+    path, _, query = puzzle['image_path'].partition('?')
+    status, headers, image = request(asgi, 'GET', path, query=query.encode())
+    assert status == 200 and headers[b'content-type'] == b'image/png'
+    assert image.startswith(b'\x89PNG')
+
+
+def test_post_body_reaches_the_view(asgi, captcha_app):
+    puzzle_id = captcha_app.get_catalog().puzzle_ids['Dice_Count'][0]
+    answer = captcha_app.get_catalog().ground_truth['Dice_Count'][puzzle_id]['sum']
+    body = json.dumps({'puzzle_type': 'Dice_Count', 'puzzle_id': puzzle_id, 'answer': answer}).encode()
+    status, _, response = request(asgi, 'POST', '/api/check_answer', body=body,
+                                  headers=[(b'content-type', b'application/json')])
+    assert status == 200
+    assert json.loads(response)['correct'] is True
+
+
+def test_oversized_body_is_rejected(asgi, monkeypatch):
+    monkeypatch.setattr(asgi, 'ASGI_MAX_BODY_BYTES', 8)
+    status, _, _ = request(asgi, 'POST', '/api/benchmark_results', body=b'{"model": "too long"}',
+                           headers=[(b'content-type', b'application/json')])
+    assert status == 413
@@ -0,0 +1,36 @@
+import hashlib
+
+
+def test_versioned_urls_are_immutable_and_revalidate_by_etag(captcha_app):
+    client = captcha_app.app.test_client()
+    puzzle = client.get('/api/get_puzzle?type=Dice_Count').json
+    path, _, version = puzzle['image_path'].partition('?v=')
+
+    response = client.get(puzzle['image_path'])
+    digest = hashlib.sha256(response.data).hexdigest()
+    assert response.status_code == 200
+    assert version == digest[:captcha_app.ASSET_VERSION_LENGTH]
+    assert response.headers['ETag'] == f'"{digest}"'
+    assert response.cache_control.immutable and response.cache_control.max_age == captcha_app.IMMUTABLE_MAX_AGE
+
+    revalidated = client.get(puzzle['image_path'], headers={'If-None-Match': f'"{digest}"'})
+    assert revalidated.status_code == 304 and revalidated.data == b''
+
+
+def test_unversioned_and_stale_urls_are_not_immutable(captcha_app):
+    client = captcha_app.app.test_client()
+    path = client.get('/api/get_puzzle?type=Dice_Count').json['image_path'].partition('?')[0]
+    for url in (path, f'{path}?v=0000000000000000'):
+        response = client.get(url)
+        assert response.status_code == 200
+        assert not response.cache_control.immutable
+        assert response.headers['ETag'] == f'"{hashlib.sha256(response.data).hexdigest()}"'
+
+
+def test_assets_by_digest(captcha_app):
+    client = captcha_app.app.test_client()
+    data = client.get(client.get('/api/get_puzzle?type=Bingo').json['image_path']).data
+    response = client.get(f'/api/asset/{hashlib.sha256(data).hexdigest()}')
+    assert response.status_code == 200 and response.data == data
+    assert response.cache_control.immutable
+    assert client.get(f"/api/asset/{'0' * 64}").status_code == 404
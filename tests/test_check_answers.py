@@ -0,0 +1,51 @@
+import pytest
+
+
+@pytest.fixture
+def client(captcha_app):
+    return captcha_app.app.test_client()
+
+
+def _answer(captcha_app, puzzle_type, field, index=0, **extra):
+    catalog = captcha_app.get_catalog()
+    puzzle_id = catalog.puzzle_ids[puzzle_type][index]
+    return dict({'puzzle_type': puzzle_type, 'puzzle_id': puzzle_id,
+                 'answer': catalog.ground_truth[puzzle_type][puzzle_id][field]}, **extra)
+
+
+def test_batch_matches_single_checks_in_order(captcha_app, client):
+    records = [
+        _answer(captcha_app, 'Dice_Count', 'sum'),
+        _answer(captcha_app, 'Bingo', 'answer', answer=[0, 0]),
+        _answer(captcha_app, 'Rotation_Match', 'correct_angle', index=1),
+        {'puzzle_type': 'Dice_Count', 'puzzle_id': 'missing.png', 'answer': 1},
+        {'puzzle_type': 'Dice_Count', 'answer': 1},
+        _answer(captcha_app, 'Dice_Count', 'sum', index=2, answer='many'),
+        _answer(captcha_app, 'Patch_Select', 'correct_patches'),
+    ]
+    response = client.post('/api/check_answers', json={'answers': records})
+    assert response.status_code == 200
+    batch = response.json
+    singles = [client.post('/api/check_answer', json=record).json for record in records]
+    assert batch['results'] == singles
+    assert batch['total'] == len(records)
+    assert batch['correct'] == 3
+
+
+def test_bare_list_and_invalid_records(client):
+    response = client.post('/api/check_answers', json=[None, 'x', {'puzzle_type': ['Dice_Count']},
+                                                         {'puzzle_type': {'a': 1}}])
+    assert response.status_code == 200
+    assert response.json['results'] == [{'error': 'Invalid answer record'}] * 4
+    assert response.json['correct'] == 0
+
+
+@pytest.mark.parametrize('body', [{'answers': 'x'}, {'nothing': []}, 3])
+def test_body_without_a_list_is_rejected(client, body):
+    response = client.post('/api/check_answers', json=body)
+    assert response.status_code == 400
+    assert response.json == {'error': 'Expected a list of answers'}
+
+
+def test_empty_batch(client):
+    assert client.post('/api/check_answers', json=[]).json == {'results': [], 'total': 0, 'correct': 0}
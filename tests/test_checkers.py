@@ -0,0 +1,166 @@
+import pytest
+
+from captcha_store import GroundTruthStore
+from checkers import InvalidAnswer, build_checkers, find_checker, score_answer
+from generate_dataset import generate_dataset
+
+
+def _distance(a, b):
+    return ((a[0] - b[0]) ** 2 + (a[1] - b[1]) ** 2) ** 0.5
+
+
+def _in_area(area, user_x, user_y):
+    (min_x, min_y), (max_x, max_y) = area
+    return (min_x <= user_x <= max_x) and (min_y <= user_y <= max_y)
+
+
+def _legacy_geometry_click(entry, answer, elapsed_time):
+    user_x, user_y = answer
+    correct = entry.get('answer')
+    if isinstance(correct, dict) and 'area' in correct:
+        return _in_area(correct['area'], user_x, user_y)
+    return _distance((user_x, user_y), correct) <= 25
+
+
+def _legacy_pick_area(entry, answer, elapsed_time):
+    user_x, user_y = answer
+    correct = entry.get('answer')
+    return isinstance(correct, dict) and 'area' in correct and _in_area(correct['area'], user_x, user_y)
+
+
+def _legacy_bingo(entry, answer, elapsed_time):
+    for swap in entry.get('answer', []):
+        if set(answer) == set(swap) or (set(answer) == set(swap[::-1]) if len(swap) == 2 else False):
+            return True
+    return False
+
+
+def _legacy_click_order(entry, answer, elapsed_time):
+    correct = entry.get('answer', [])
+    if len(answer) != len(correct):
+        return False
+    return all(_distance(user_pos, correct_pos) <= entry.get('tolerance', 20)
+               for user_pos, correct_pos in zip(answer, correct))
+
+
+def _legacy_hold_button(entry, answer, elapsed_time):
+    hold_time = entry.get('hold_time', 3)
+    user_hold_time = float(answer)
+    if elapsed_time > 8 and user_hold_time < hold_time:
+        return False
+    return hold_time >= user_hold_time >= 0
+
+
+def _legacy_misleading_click(entry, answer, elapsed_time):
+    user_x, user_y = answer
+    area = entry.get('avoid_area', {'x': 0, 'y': 0, 'width': 0, 'height': 0})
+    return not (area['x'] <= user_x <= area['x'] + area['width']
+                and area['y'] <= user_y <= area['y'] + area['height'])
+
+
+def _option(field):
+    return lambda entry, answer, elapsed_time: int(answer) == entry.get(field)
+
+
+def _selection(field):
+    return lambda entry, answer, elapsed_time: set(answer) == set(entry.get(field, []))
+
+
+def _target(default_tolerance):
+    return lambda entry, answer, elapsed_time: \
+        _distance(answer, entry.get('target_position')) <= entry.get('tolerance', default_tolerance)
+
+
+# The branches of the original check_answer if/elif chain: (is_correct, caught exceptions, answer field)
+LEGACY = {
+    'Dice_Count': (lambda entry, answer, elapsed_time: int(answer) == int(entry.get('sum')),
+                   (ValueError,), 'sum'),
+    'Geometry_Click': (_legacy_geometry_click, (ValueError, TypeError, KeyError), 'answer'),
+    'Rotation_Match': (lambda entry, answer, elapsed_time: int(answer) % 360 == entry.get('correct_angle') % 360,
+                       (ValueError, TypeError), 'answer'),
+    'Slide_Puzzle': (_target(10), (ValueError, TypeError), 'answer'),
+    'Unusual_Detection': (_selection('answer'), (ValueError, TypeError), 'answer'),
+    'Image_Recognition': (_selection('correct_selections'), (ValueError, TypeError), 'answer'),
+    'Bingo': (_legacy_bingo, (ValueError, TypeError), 'answer'),
+    'Image_Matching': (_option('correct_option_index'), (ValueError, TypeError), 'answer'),
+    'Patch_Select': (_selection('correct_patches'), (ValueError, TypeError), 'correct_patches'),
+    'Dart_Count': (_option('correct_option_index'), (ValueError, TypeError), 'answer'),
+    'Place_Dot': (_target(15), (ValueError, TypeError, KeyError), 'answer'),
+    'Object_Match': (_option('correct_option_index'), (ValueError, TypeError), 'answer'),
+    'Select_Animal': (_selection('correct_patches'), (ValueError, TypeError), 'correct_patches'),
+    'Coordinates': (_option('correct_option_index'), (ValueError, TypeError), 'correct_option_index'),
+    'Path_Finder': (_option('correct_option'), (ValueError, TypeError), 'correct_option'),
+    'Connect_icon': (_option('correct_option'), (ValueError, TypeError), 'correct_option'),
+    'Click_Order': (_legacy_click_order, (ValueError, TypeError, KeyError), 'answer'),
+    'Hold_Button': (_legacy_hold_button, (ValueError, TypeError), 'hold_time'),
+    'Misleading_Click': (_legacy_misleading_click, (ValueError, TypeError, KeyError), 'answer'),
+    'Pick_Area': (_legacy_pick_area, (ValueError, TypeError, KeyError), 'answer'),
+}
+
+
+def legacy_check(puzzle_type, entry, answer, elapsed_time):
+    """The old chain's response as 'invalid' or (correct, correct_answer), None where it raised a 500"""
+    if puzzle_type not in LEGACY:
+        return str(answer).lower() == str(entry.get('answer')).lower(), entry.get('answer')
+    is_correct, caught, answer_key = LEGACY[puzzle_type]
+    try:
+        return is_correct(entry, answer, elapsed_time), entry.get(answer_key)
+    except caught:
+        return 'invalid'
+    except Exception:
+        return None
+
+
+def candidate_answers(entry):
+    """Answers taken from the ground truth (mostly correct ones) plus assorted wrong and malformed ones"""
+    answers = [0, 3, -1, '2', 'abc', 4.5, [], [0], [1, 2], [0, 4], [150, 100], [[215, 95]], {'x': 1}]
+    for value in entry.values():
+        answers.append(value)
+        if isinstance(value, list) and value:
+            answers.append(value[0])
+        if isinstance(value, dict) and 'area' in value:
+            (min_x, min_y), (max_x, max_y) = value['area']
+            answers.append([(min_x + max_x) / 2, (min_y + max_y) / 2])
+    return answers
+
+
+@pytest.fixture(scope='module')
+def ground_truth(tmp_path_factory):
+    data_dir = tmp_path_factory.mktemp('data')
+    generate_dataset(str(data_dir), 4, seed=5, workers=1, rotation_frames=False)
+    ground_truth = GroundTruthStore(str(data_dir)).load_all()
+    # Formats the generator doesn't produce but the old chain handled
+    ground_truth['Geometry_Click']['point.png'] = {'answer': [100, 100]}
+    ground_truth['Pick_Area']['no_area.png'] = {'answer': [10, 10]}
+    ground_truth['Free_Text'] = {'text.png': {'answer': 'Hello'}}
+    return ground_truth
+
+
+def test_checkers_match_the_original_if_elif_chain(ground_truth):
+    checkers = build_checkers(ground_truth)
+    outcomes = set()
+    for puzzle_type, entries in ground_truth.items():
+        for puzzle_id, entry in entries.items():
+            for answer in candidate_answers(entry) + ['HELLO']:
+                for elapsed_time in (0, 10):
+                    expected = legacy_check(puzzle_type, entry, answer, elapsed_time)
+                    if expected is None:
+                        # Crashed the old endpoint; any 400 is an improvement
+                        continue
+                    try:
+                        result = checkers[puzzle_type].check(puzzle_id, answer, elapsed_time)
+                    except InvalidAnswer:
+                        actual = 'invalid'
+                    else:
+                        assert result['user_answer'] == answer
+                        actual = result['correct'], result['correct_answer']
+                    assert actual == expected, (puzzle_type, entry, answer, elapsed_time)
+                    outcomes.add(actual if actual == 'invalid' else actual[0])
+    assert outcomes == {True, False, 'invalid'}
+
+
+@pytest.mark.parametrize('puzzle_type', [['Dice_Count'], {'a': 1}, 3, None])
+def test_non_string_puzzle_types_have_no_checker(ground_truth, puzzle_type):
+    checker = find_checker(build_checkers(ground_truth), puzzle_type)
+    assert checker is None
+    assert score_answer(checker, {'puzzle_id': 'dice0.png', 'answer': 1}) == ({'error': 'Invalid puzzle ID'}, 400)
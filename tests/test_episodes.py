@@ -0,0 +1,27 @@
+def test_uploaded_manifest_keeps_only_puzzles_and_mode(captcha_app):
+    client = captcha_app.app.test_client()
+    exported = client.get('/api/episode?seed=7&length=5').json
+    upload = dict(exported, mode='random', note='x' * 1000, extra={'nested': [1, 2]}, episode_id='forged')
+
+    response = client.post('/api/episode', json=upload)
+    assert response.status_code == 200
+    manifest = response.json
+    assert set(manifest) == {'episode_id', 'length', 'puzzles', 'mode'}
+    assert manifest['episode_id'] == exported['episode_id']
+    assert client.get(f"/api/episode/{manifest['episode_id']}").json == manifest
+
+
+def test_uploaded_manifest_drops_unknown_modes(captcha_app):
+    client = captcha_app.app.test_client()
+    puzzles = client.get('/api/episode?seed=8&length=3').json['puzzles']
+    manifest = client.post('/api/episode', json={'puzzles': puzzles, 'mode': ['random']}).json
+    assert set(manifest) == {'episode_id', 'length', 'puzzles'}
+
+
+def test_uploaded_manifest_length_is_limited(captcha_app, monkeypatch):
+    monkeypatch.setattr(captcha_app, 'MAX_EPISODE_LENGTH', 3)
+    client = captcha_app.app.test_client()
+    puzzles = client.get('/api/episode?seed=9&length=3').json['puzzles']
+    response = client.post('/api/episode', json={'puzzles': puzzles * 2})
+    assert response.status_code == 400
+    assert response.json == {'error': 'Episodes have at most 3 puzzles'}
@@ -0,0 +1,39 @@
+import io
+import os
+
+import pytest
+from PIL import Image
+
+
+@pytest.fixture
+def image_url(captcha_app):
+    puzzle = captcha_app.app.test_client().get('/api/get_puzzle?type=Dice_Count').json
+    return puzzle['image_path'].partition('?')[0]
+
+
+@pytest.mark.parametrize('width', ['256', '512'])
+def test_configured_widths_are_served(captcha_app, image_url, width):
+    response = captcha_app.app.test_client().get(f'{image_url}?format=webp&w={width}')
+    assert response.status_code == 200
+    assert response.content_type == 'image/webp'
+    with Image.open(io.BytesIO(response.data)) as image:
+        assert image.width <= int(width)
+
+
+@pytest.mark.parametrize('width', ['300', '0', '4096', '-256', '²', 'abc', '256.0'])
+def test_other_widths_are_rejected_without_rendering(captcha_app, image_url, width):
+    before = _files(captcha_app.variant_store.directory)
+    response = captcha_app.app.test_client().get(f'{image_url}?w={width}')
+    assert response.status_code == 400
+    assert response.json == {'error': 'Width must be one of 256, 512'}
+    assert _files(captcha_app.variant_store.directory) == before
+
+
+def test_unknown_format_is_rejected(captcha_app, image_url):
+    response = captcha_app.app.test_client().get(f'{image_url}?format=gif')
+    assert response.status_code == 400
+    assert response.json['error'].startswith('Format must be one of webp-lossless')
+
+
+def _files(directory):
+    return sorted(os.path.join(root, name) for root, _, names in os.walk(directory) for name in names)
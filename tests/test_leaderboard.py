@@ -0,0 +1,74 @@
+import json
+import math
+import random
+import statistics
+
+import pytest
+
+from leaderboard import Leaderboard, QuantileSketch, ResultStats
+
+
+def test_sketch_quantiles_are_within_relative_accuracy():
+    rng = random.Random(3)
+    values = sorted(rng.lognormvariate(0, 1.5) for _ in range(20000))
+    sketch = QuantileSketch(relative_accuracy=0.01)
+    for value in values:
+        sketch.add(value)
+
+    for q in (0.01, 0.25, 0.5, 0.9, 0.95, 0.99, 0.999):
+        exact = values[int(q * (len(values) - 1))]
+        assert sketch.quantile(q) == pytest.approx(exact, rel=0.01)
+
+
+def test_merged_sketches_equal_one_sketch_of_all_values():
+    rng = random.Random(4)
+    values = [rng.expovariate(2) for _ in range(5000)] + [0.0] * 10
+    whole, parts = QuantileSketch(), [QuantileSketch() for _ in range(4)]
+    for i, value in enumerate(values):
+        whole.add(value)
+        parts[i % 4].add(value)
+    merged = QuantileSketch()
+    for part in parts:
+        merged.merge(part)
+    assert merged.zero_count == whole.zero_count == 10
+    assert merged.buckets == whole.buckets
+
+
+def test_merged_stats_match_exact_statistics():
+    rng = random.Random(5)
+    times = [rng.uniform(0.5, 30) for _ in range(3000)]
+    whole, left, right = ResultStats(), ResultStats(), ResultStats()
+    for i, elapsed_time in enumerate(times):
+        whole.add(i % 3 == 0, elapsed_time)
+        (left if i < 1000 else right).add(i % 3 == 0, elapsed_time)
+    left.merge(right)
+
+    for stats in (whole, left):
+        summary = stats.summary()
+        assert summary['count'] == 3000 and summary['correct'] == 1000
+        assert summary['elapsed_time']['mean'] == pytest.approx(statistics.fmean(times))
+        assert summary['elapsed_time']['stddev'] == pytest.approx(statistics.stdev(times))
+        assert (summary['elapsed_time']['min'], summary['elapsed_time']['max']) == (min(times), max(times))
+
+
+def test_snapshot_survives_restarts(tmp_path):
+    path = str(tmp_path / 'leaderboard.json')
+    leaderboard = Leaderboard(path, snapshot_interval=math.inf)
+    leaderboard.write_batch([{'model': 'm', 'puzzle_type': 'Bingo', 'correct': True, 'elapsed_time': 2}])
+    leaderboard.close()
+
+    standings = Leaderboard(path).standings()
+    assert [(entry['model'], entry['count'], entry['correct']) for entry in standings] == [('m', 1, 1)]
+
+
+@pytest.mark.parametrize('content', ['{"entries": [{"model": "m", "puzz', '[]', '{"entries": [{}]}'])
+def test_corrupt_snapshot_is_replaced(tmp_path, content):
+    path = tmp_path / 'leaderboard.json'
+    path.write_text(content)
+    leaderboard = Leaderboard(str(path), snapshot_interval=math.inf)
+    assert leaderboard.standings() == []
+
+    leaderboard.write_batch([{'model': 'm', 'puzzle_type': 'Bingo', 'correct': False}])
+    leaderboard.snapshot()
+    entries = json.loads(path.read_text())['entries']
+    assert [(entry['model'], entry['stats']['count']) for entry in entries] == [('m', 1)]
@@ -0,0 +1,79 @@
+import multiprocessing
+import threading
+
+from metrics import MetricsRegistry
+
+
+def test_shards_of_exited_threads_are_retired():
+    registry = MetricsRegistry()
+    requests = registry.counter('requests_total', 'Requests', ['status'])
+    duration = registry.histogram('duration_seconds', 'Duration', buckets=(0.1, 1.0))
+
+    def handle():
+        for _ in range(5):
+            requests.inc('200')
+        duration.observe(0.5)
+
+    # A thread per connection, like the threaded werkzeug server
+    for _ in range(50):
+        threads = [threading.Thread(target=handle) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(registry._shards) <= 11
+
+    values = registry.values()
+    assert values[('requests_total', ('200',))] == 2500
+    assert values[('duration_seconds', ())] == [0, 500, 0, 250.0, 500]
+    assert len(registry._shards) == 0
+    assert 'requests_total{status="200"} 2500' in registry.render()
+
+
+def test_running_threads_keep_their_shards():
+    registry = MetricsRegistry()
+    counter = registry.counter('events_total', 'Events')
+    counter.inc()
+    started, stop = threading.Event(), threading.Event()
+
+    def worker():
+        counter.inc(amount=2)
+        started.set()
+        stop.wait()
+        counter.inc(amount=3)
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    started.wait()
+    assert registry.values()[('events_total', ())] == 3
+    stop.set()
+    thread.join()
+    assert registry.values()[('events_total', ())] == 6
+
+
+def test_counters_are_summed_across_worker_processes(tmp_path):
+    directory = str(tmp_path)
+    registry = MetricsRegistry(directory)
+    requests = registry.counter('requests_total', 'Requests', ['status'])
+    requests.inc('200')
+
+    def worker(count):
+        # Like a gunicorn worker forked from the preloaded app
+        for _ in range(count):
+            requests.inc('200')
+        registry.dump()
+
+    context = multiprocessing.get_context('fork')
+    processes = [context.Process(target=worker, args=(count,)) for count in (10, 20, 30)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    assert all(process.exitcode == 0 for process in processes)
+
+    # The exited workers' counts still count
+    assert 'requests_total{status="200"} 61' in registry.render()
+
+    # A restarted server starts from its own totals
+    registry.clear_directory()
+    assert 'requests_total{status="200"} 1' in registry.render()
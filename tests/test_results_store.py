@@ -0,0 +1,45 @@
+import json
+
+from results_store import BatchWriter, JsonLinesSink, SQLiteResultsSink
+
+
+def test_sqlite_sink_stores_non_scalar_fields_as_text(tmp_path):
+    sink = SQLiteResultsSink(str(tmp_path / 'results.db'))
+    sink.write_batch([{'model': {'x': 1}, 'puzzle_type': ['Dice_Count'], 'puzzle_id': 7, 'correct': True}])
+    row = sink._connect().execute('SELECT model, puzzle_type, puzzle_id, correct FROM results').fetchone()
+    assert row == ('{"x": 1}', '["Dice_Count"]', '7', 1)
+
+
+def test_sqlite_sink_keeps_good_records_of_a_failing_batch(tmp_path):
+    sink = SQLiteResultsSink(str(tmp_path / 'results.db'))
+    good = [{'model': 'm', 'puzzle_type': 'Dice_Count', 'correct': i % 2 == 0, 'elapsed_time': i}
+            for i in range(4)]
+    # Not JSON serializable, so its row can't be built
+    bad = {'model': 'm', 'puzzle_type': 'Dice_Count', 'correct': True, 'extra': {1, 2}}
+    sink.write_batch(good[:2] + [bad] + good[2:])
+
+    summary = sink.summary(model='m')
+    assert summary['Dice_Count']['count'] == 4
+    assert summary['Dice_Count']['correct'] == 2
+
+
+class FailingSink:
+    def write_batch(self, records):
+        raise OSError('disk full')
+
+    def close(self):
+        pass
+
+
+def test_batch_writer_survives_a_failing_sink(tmp_path):
+    path = tmp_path / 'results.json'
+    writer = BatchWriter([FailingSink(), JsonLinesSink(str(path))], batch_size=10, flush_interval=0.05)
+    for i in range(25):
+        writer.submit({'puzzle_id': i})
+    writer.flush(timeout=5)
+    # The writer thread is still alive after the failures
+    writer.submit({'puzzle_id': 25})
+    writer.close()
+
+    with open(path) as f:
+        assert [json.loads(line)['puzzle_id'] for line in f] == list(range(26))
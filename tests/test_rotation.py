@@ -0,0 +1,51 @@
+import pytest
+
+from agent_api import rendered_frame
+from assets import AssetStore
+from captcha_store import CaptchaCatalog, GroundTruthStore, parse_rotation_frame
+from generate_dataset import generate_dataset
+from rotation import RotationRenderer
+
+
+@pytest.mark.parametrize('filename, expected', [
+    ('object_1_90.png', ('object_1', 90)),
+    ('object_1_-45.png', ('object_1', -45)),
+    ('object_1_0.png', ('object_1', 0)),
+    ('object_1_².png', None),
+    ('object_1_٥.png', None),
+    ('object_1_--5.png', None),
+    ('object_1_-.png', None),
+    ('object_1_90.jpg', None),
+    ('90.png', None),
+])
+def test_parse_rotation_frame(filename, expected):
+    assert parse_rotation_frame(filename) == expected
+
+
+def test_frames_with_non_ascii_angles_are_not_rendered(tmp_path):
+    generate_dataset(str(tmp_path), 1, seed=1, types=['Rotation_Match'], workers=1, rotation_frames=False)
+    catalog = CaptchaCatalog.build(GroundTruthStore(str(tmp_path)))
+    renderer = RotationRenderer(AssetStore(str(tmp_path)))
+    object_base = next(iter(catalog.rotation_objects))
+
+    assert rendered_frame(catalog, renderer, f'{object_base}_².png') is None
+    assert rendered_frame(catalog, renderer, f'{object_base}_90.png') is not None
+
+
+@pytest.mark.parametrize('step, status, error', [
+    ('45', 200, None),
+    ('7', 400, 'step must be a divisor of 360'),
+    ('0', 400, 'step must be a divisor of 360'),
+    ('abc', 400, 'step must be a positive integer'),
+    ('-45', 400, 'step must be a positive integer'),
+    ('²', 400, 'step must be a positive integer'),
+])
+def test_rotation_sprite_step(captcha_app, step, status, error):
+    puzzle_id = captcha_app.get_catalog().puzzle_ids['Rotation_Match'][0]
+    response = captcha_app.app.test_client().get('/api/rotation_sprite',
+                                                 query_string={'puzzle_id': puzzle_id, 'step': step})
+    assert response.status_code == status
+    if error is None:
+        assert response.headers['X-Frame-Count'] == '8'
+    else:
+        assert response.json == {'error': error}
@@ -0,0 +1,105 @@
+import threading
+import tracemalloc
+
+import pytest
+
+from sampling import MemorySessionStore, PuzzleSampler, SamplingState, SeededPermutation, SQLiteSessionStore
+
+
+def test_seeded_permutation_is_a_bijection():
+    for n in (0, 1, 2, 3, 5, 64, 1000, 4097):
+        permutation = SeededPermutation(n, 'key')
+        assert sorted(permutation[i] for i in range(n)) == list(range(n))
+
+
+def test_seeded_permutation_depends_only_on_key():
+    assert [SeededPermutation(100, 'a')[i] for i in range(100)] == \
+        [SeededPermutation(100, 'a')[i] for i in range(100)]
+    assert [SeededPermutation(100, 'a')[i] for i in range(100)] != \
+        [SeededPermutation(100, 'b')[i] for i in range(100)]
+
+
+def test_session_draws_every_puzzle_once_per_pass():
+    sampler = PuzzleSampler({'Dice_Count': [f'dice{i}.png' for i in range(50)]})
+    state = SamplingState(seed=7)
+    first_pass = [state.next_puzzle('Dice_Count', sampler) for _ in range(50)]
+    second_pass = [state.next_puzzle('Dice_Count', sampler) for _ in range(50)]
+    assert sorted(first_pass) == sorted(second_pass) == sorted(sampler.puzzle_ids['Dice_Count'])
+    assert first_pass != second_pass
+
+
+class CountingIDs(list):
+    """Puzzle IDs that count how many of them are read"""
+
+    reads = 0
+
+    def __getitem__(self, index):
+        CountingIDs.reads += len(range(len(self))[index]) if isinstance(index, slice) else 1
+        return super().__getitem__(index)
+
+    def __iter__(self):
+        CountingIDs.reads += len(self)
+        return super().__iter__()
+
+
+def test_many_sessions_draw_in_constant_memory_and_work(monkeypatch):
+    puzzle_ids = {puzzle_type: CountingIDs(f'{puzzle_type}_{i}.png' for i in range(200000))
+                  for puzzle_type in ('Dice_Count', 'Bingo')}
+    sampler = PuzzleSampler(puzzle_ids)
+    states = [SamplingState(seed=seed) for seed in range(2000)]
+    draws = len(states) * len(puzzle_ids)
+
+    rounds = 0
+    original_round = SeededPermutation._round
+
+    def counting_round(self, value, round_key):
+        nonlocal rounds
+        rounds += 1
+        return original_round(self, value, round_key)
+
+    monkeypatch.setattr(SeededPermutation, '_round', counting_round)
+    CountingIDs.reads = 0
+
+    tracemalloc.start()
+    for state in states:
+        for puzzle_type in puzzle_ids:
+            assert state.next_puzzle(puzzle_type, sampler) is not None
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # A per-session copy of the IDs would take 1.6 MB per draw
+    assert peak < 2 * 1024 * 1024
+    # Each draw reads one ID, instead of copying or shuffling all 200k
+    assert CountingIDs.reads == draws
+    # and evaluates a few Feistel passes (cycle walking needs 1.3 on average for 200k of 2**18)
+    assert rounds < 2 * SeededPermutation.ROUNDS * draws
+
+
+@pytest.mark.parametrize('backend', ['memory', 'sqlite'])
+def test_session_survives_a_failing_update(backend, tmp_path):
+    store = MemorySessionStore() if backend == 'memory' else SQLiteSessionStore(str(tmp_path / 'sessions.db'))
+    seed = store.update('token', lambda state: state.seed)
+
+    def fail(state):
+        raise RuntimeError('view failed')
+
+    with pytest.raises(RuntimeError):
+        store.update('token', fail)
+    assert store.update('token', lambda state: state.seed) == seed
+
+
+def test_sqlite_store_evicts_on_schedule_from_many_threads(tmp_path, monkeypatch):
+    store = SQLiteSessionStore(str(tmp_path / 'sessions.db'), max_sessions=1000)
+    evictions = []
+    monkeypatch.setattr(store, '_evict', lambda conn, now: evictions.append(now))
+
+    def update(thread):
+        for i in range(64):
+            store.update(f'{thread}-{i}', lambda state: None)
+
+    threads = [threading.Thread(target=update, args=(thread,)) for thread in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(evictions) == 8 * 64 // store.EVICT_EVERY
@@ -0,0 +1,23 @@
+import json
+
+import score_results
+from generate_dataset import generate_dataset
+
+
+def test_records_with_invalid_types_are_counted_as_invalid(tmp_path):
+    generate_dataset(str(tmp_path), 2, types=['Dice_Count'], workers=1)
+    score_results._init_worker(str(tmp_path))
+    with open(tmp_path / 'Dice_Count' / 'ground_truth.json') as f:
+        ground_truth = json.load(f)
+    puzzle_id, entry = next(iter(ground_truth.items()))
+
+    lines = [
+        json.dumps({'puzzle_type': 'Dice_Count', 'puzzle_id': puzzle_id, 'answer': entry['sum']}),
+        json.dumps({'puzzle_type': ['Dice_Count'], 'puzzle_id': puzzle_id, 'answer': 1}),
+        json.dumps({'puzzle_type': None, 'puzzle_id': puzzle_id, 'answer': 1}),
+        'not json',
+    ]
+    totals = score_results.score_lines(lines)
+    assert totals['Dice_Count']['correct'] == 1
+    assert totals['<invalid>']['count'] == totals['<invalid>']['errors'] == 3
+    assert score_results.summarize(totals)['overall']['count'] == 4